@@ -0,0 +1,131 @@
+# Libraries
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+
+# Modules
+from bench.run import RESULTS_DIR, git_commit
+from bench.synthetic import SCALES, STATION_FIELDS, make_stations
+from datetime import date, datetime
+from db.engine import get_engine
+from db.migrations import migrate
+from pathlib import Path
+from scripts.initial_bulk import (
+    load_dim_brand,
+    load_dim_date,
+    load_dim_moment,
+    load_dim_product,
+    load_dim_station,
+)
+from typing import Any, Dict
+
+
+def write_baseline(path: Path, scale: str, stations_per_province: int) -> int:
+    """
+    Writes a baseline CSV of the stations of a scale, like `data/init/baseline_master.csv`.
+
+    Args:
+        path (Path): The CSV file.
+        scale (str): The provinces to cover ('canarias' or 'spain').
+        stations_per_province (int): The stations of each synthetic province.
+
+    Returns:
+        int: The number of stations.
+    """
+    import pandas as pd
+
+    stations = make_stations(SCALES[scale], stations_per_province)
+    pd.DataFrame(stations, columns=STATION_FIELDS).to_csv(path, sep=";", index=False)
+    return len(stations)
+
+
+def run_bootstrap(scale: str, years: int, stations_per_province: int) -> Dict[str, Any]:
+    """
+    Times the load of every dimension into a new database, then loading them again.
+
+    Args:
+        scale (str): The provinces of the station baseline ('canarias' or 'spain').
+        years (int): The years of the date dimension.
+        stations_per_province (int): The stations of each synthetic province.
+
+    Returns:
+        Dict[str, Any]: The 'meta' data of the run and the seconds and rows written by
+                        dimension, for the 'first' load and the 'rerun'.
+    """
+    results = {"first": {}, "rerun": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = Path(tmp) / "baseline.csv"
+        stations = write_baseline(baseline, scale, stations_per_province)
+        engine = get_engine(f"sqlite:///{Path(tmp) / 'bootstrap.db'}")
+        migrate(engine)
+
+        loaders = {
+            "DimDate": lambda: load_dim_date(engine, date(2000, 1, 1), 365 * years),
+            "DimProduct": lambda: load_dim_product(engine),
+            "DimMoment": lambda: load_dim_moment(engine),
+            "DimBrand": lambda: load_dim_brand(engine),
+            "DimStation": lambda: load_dim_station(engine, str(baseline)),
+        }
+        for run in results:
+            for name, loader in loaders.items():
+                started = time.perf_counter()
+                rows = loader()
+                results[run][name] = {
+                    "seconds": round(time.perf_counter() - started, 6),
+                    "rows": rows,
+                }
+            results[run]["total_seconds"] = round(
+                sum(result["seconds"] for result in results[run].values()), 6
+            )
+        engine.dispose()
+
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "scale": scale,
+        "stations": stations,
+        "dates": 365 * years,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    return {"meta": meta, "results": results}
+
+
+def main() -> None:
+    """
+    Times the bootstrap of the dimensions from the command line and stores the results
+    as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Times the load of the dimension tables into a new database."
+    )
+    parser.add_argument("--scale", choices=list(SCALES), default="spain")
+    parser.add_argument("--years", type=int, default=50, help="Years of dates.")
+    parser.add_argument("--stations-per-province", type=int, default=235)
+    parser.add_argument("--out", help="Results file. Defaults to bench/results/<timestamp>.json.")
+    args = parser.parse_args()
+
+    report = run_bootstrap(args.scale, args.years, args.stations_per_province)
+
+    if args.out:
+        out = Path(args.out)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = RESULTS_DIR / f"{stamp}_bootstrap_{args.scale}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+
+    for run, results in report["results"].items():
+        for name, result in results.items():
+            if name == "total_seconds":
+                print(f"{run + ' total':<20}{result:>12.4f}s")
+            else:
+                print(f"{run + ' ' + name:<20}{result['seconds']:>12.4f}s{result['rows']:>10}")
+    print(f"Results stored in {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Libraries
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Modules
+from bench.run import RESULTS_DIR, git_commit, load_dashboard, measure
+from datetime import datetime, timedelta
+from db.archive import FactArchive, read_facts
+from db.changelog import delete_slots, load_price_changes
+from db.engine import connect, get_engine
+from db.layouts import FACT_LAYOUTS, convert_facts, load_wide_facts
+from db.models import FactData
+from etl.dates import date_key
+from etl.load import load_facts
+from etl.rollups import read_slot
+from pathlib import Path
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional
+
+
+# B-trees holding the facts in each layout
+FACT_BTREES = {
+    "long": ["factdata"] + [index.name for index in FactData.__table__.indexes],
+    "wide": ["factwide"],
+    "changes": ["pricechange", "lastprice", "priceslot"],
+}
+
+# Tables whose rows are counted, and the date of the last loaded facts
+FACT_TABLES = {"long": "factdata", "wide": "factwide", "changes": "pricechange"}
+SLOT_TABLES = {"long": "factdata", "wide": "factwide", "changes": "priceslot"}
+LOADERS = {"long": load_facts, "wide": load_wide_facts, "changes": load_price_changes}
+
+
+def btree_bytes(conn: sqlite3.Connection, names: List[str]) -> Optional[Dict[str, int]]:
+    """
+    Measures the size of some tables and indexes with the `dbstat` virtual table.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+        names (List[str]): The table and index names.
+
+    Returns:
+        Optional[Dict[str, int]]: The bytes by name, or None if SQLite lacks `dbstat`.
+    """
+    try:
+        rows = conn.execute(
+            f"SELECT name, SUM(pgsize) FROM dbstat "
+            f"WHERE name IN ({', '.join('?' * len(names))}) GROUP BY name",
+            names,
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {name: int(size) for name, size in rows}
+
+
+def benchmark_layout(db_path: str, layout: str, repeats: int) -> Dict[str, Any]:
+    """
+    Runs the storage, ingest and dashboard benchmarks of a database in one layout.
+
+    Args:
+        db_path (str): The SQLite database, already in the layout.
+        layout (str): The layout ('long', 'wide' or 'changes').
+        repeats (int): The timed runs of each benchmark.
+
+    Returns:
+        Dict[str, Any]: The 'storage' figures and the 'results' by benchmark.
+    """
+    import pandas as pd
+
+    engine = get_engine(f"sqlite:///{db_path}")
+    conn = connect(db_path)
+    try:
+        table = FACT_TABLES[layout]
+        storage = {
+            "database_bytes": os.path.getsize(db_path),
+            "facts": conn.execute("SELECT COUNT(*) FROM factdata").fetchone()[0],
+            "rows": conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+            "btree_bytes": btree_bytes(conn, FACT_BTREES[layout]),
+        }
+        last_date_key = conn.execute(
+            f"SELECT MAX(DateKey) FROM {SLOT_TABLES[layout]}"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    dims = {
+        name: pd.read_sql_query(f"SELECT * FROM {name};", engine)
+        for name in ["dimstation", "dimproduct", "dimmoment"]
+    }
+    moment_key = int(dims["dimmoment"]["MomentKey"].iloc[-1])
+    results = {}
+
+    # Ingest: the moments of the last date loaded again, in order, at the next dates
+    # (removed afterwards), so prices change between moments as in the database
+    day_facts = pd.read_sql_query(
+        f"SELECT * FROM factdata WHERE DateKey = {last_date_key}", engine
+    ).assign(RunKey=None)
+    moments = sorted(day_facts["MomentKey"].unique())
+    last_day = datetime.strptime(str(last_date_key), "%Y%m%d")
+    slots = [
+        (date_key(last_day + timedelta(days=n)), moment)
+        for n in range(1, repeats + 2)
+        for moment in moments
+    ]
+    queue = iter(slots)
+
+    def load_next() -> None:
+        day_key, moment = next(queue)
+        facts = day_facts[day_facts["MomentKey"] == moment].assign(DateKey=day_key)
+        LOADERS[layout](facts, engine)
+
+    rows_before = storage["rows"]
+    first = day_facts[day_facts["MomentKey"] == moments[0]].assign(DateKey=slots[0][0])
+    try:
+        results["load_insert"] = measure(load_next, repeats)
+        conn = connect(db_path)
+        try:
+            rows_after = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+        results["load_rerun"] = measure(lambda: LOADERS[layout](first, engine), repeats)
+    finally:
+        with engine.begin() as conn:
+            if layout == "changes":
+                delete_slots(conn.connection.driver_connection, last_date_key + 1)
+            else:
+                conn.execute(
+                    text(f"DELETE FROM {table} WHERE DateKey > :key"),
+                    {"key": last_date_key},
+                )
+    # Write amplification: the b-tree entries written per loaded moment. Each stored
+    # change also updates `lastprice`, and each moment adds its `priceslot` row
+    loads = repeats + 1
+    facts = len(day_facts) / len(moments)
+    if layout == "changes":
+        written = 2 * (rows_after - rows_before) / loads + 1
+    else:
+        written = (rows_after - rows_before) / loads * len(FACT_BTREES[layout])
+    results["load_insert"]["facts"] = round(facts)
+    results["load_insert"]["btree_entries"] = round(written)
+
+    # Dashboard: the 7 days query, the rollup slot read and a month of history
+    dashboard = load_dashboard()
+    results["retrieve_data_app"] = measure(
+        lambda: dashboard.retrieve_data_app(moment_key, db_path), repeats
+    )
+    results["retrieve_data_app"]["rows"] = len(
+        dashboard.retrieve_data_app(moment_key, db_path)
+    )
+    results["read_slot"] = measure(
+        lambda: read_slot(engine, last_date_key, moment_key, []), repeats
+    )
+    first_key = date_key(last_day - timedelta(days=29))
+    archive = FactArchive(Path(db_path).with_name("empty_archive"))
+    results["read_facts_month"] = measure(
+        lambda: read_facts(db_path, first_key, last_date_key, archive=archive), repeats
+    )
+    return {"storage": storage, "results": results}
+
+
+def run_comparison(db_path: str, repeats: int) -> Dict[str, Any]:
+    """
+    Benchmarks a database in every layout, on copies converted from it.
+
+    Args:
+        db_path (str): The SQLite database (e.g., generated by `bench.synthetic`).
+        repeats (int): The timed runs of each benchmark.
+
+    Returns:
+        Dict[str, Any]: The 'meta' data of the run and the figures by layout.
+    """
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "database": str(Path(db_path).resolve()),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        }
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in FACT_LAYOUTS:
+            copy = str(Path(tmp) / f"{layout}.db")
+            conn = connect(db_path)
+            try:
+                conn.execute("VACUUM INTO ?", (copy,))
+            finally:
+                conn.close()
+
+            started = time.perf_counter()
+            convert_facts(copy, layout)
+            conversion = time.perf_counter() - started
+            conn = connect(copy)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+
+            report[layout] = benchmark_layout(copy, layout, repeats)
+            report[layout]["storage"]["conversion_seconds"] = round(conversion, 3)
+    return report
+
+
+def main() -> None:
+    """
+    Compares the fact layouts from the command line and stores the results as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compares the fact layouts on storage, ingest and dashboard queries."
+    )
+    parser.add_argument("--db", required=True, help="SQLite database to benchmark.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", help="Results file. Defaults to bench/results/<timestamp>.json.")
+    args = parser.parse_args()
+
+    report = run_comparison(args.db, args.repeats)
+
+    if args.out:
+        out = Path(args.out)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = RESULTS_DIR / f"{stamp}_{Path(args.db).stem}_layouts.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+
+    print(f"{'':<24}" + "".join(f"{layout:>14}" for layout in FACT_LAYOUTS))
+    for name in ["database_bytes", "rows"]:
+        values = [report[layout]["storage"][name] for layout in FACT_LAYOUTS]
+        print(f"{name:<24}" + "".join(f"{value:>14}" for value in values))
+    values = [report[layout]["results"]["load_insert"]["btree_entries"] for layout in FACT_LAYOUTS]
+    print(f"{'load_btree_entries':<24}" + "".join(f"{value:>14}" for value in values))
+    for name in report["long"]["results"]:
+        values = [report[layout]["results"][name]["median"] for layout in FACT_LAYOUTS]
+        print(f"{name:<24}" + "".join(f"{value:>13.4f}s" for value in values))
+    print(f"Results stored in {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Libraries
+import argparse
+import re
+import sqlite3
+import sys
+
+# Modules
+from bench.run import load_dashboard
+from db.engine import connect
+from db.partitions import FactPartitions, partition_dir
+from etl.dashboard import build_dashboard_query
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Tables too large to be read whole by a hot query, the facts and their rollups
+FACT_TABLES = ["factdata", "factwide", "pricechange", "pricerollup"]
+
+
+def hot_queries(dashboard: Any) -> Dict[str, Callable[[], Tuple[str, list]]]:
+    """
+    Lists the hot queries whose plans are checked, as builders of the SQL and parameters.
+
+    Args:
+        dashboard (Any): The `frontend/utils.py` module.
+
+    Returns:
+        Dict[str, Callable[[], Tuple[str, list]]]: The query builders by name.
+    """
+    return {
+        "dashboard": lambda: build_dashboard_query(1),
+        "dashboard_province": lambda: build_dashboard_query(1, [35]),
+        "kpi_rollups": lambda: dashboard.build_kpi_rollup_query(
+            1, "StationAC", "CANARIAS", "TODAS", "GASOLINA 95"
+        ),
+    }
+
+
+def explain(
+    conn: sqlite3.Connection, query: str, params: Optional[Sequence[Any]] = None
+) -> List[str]:
+    """
+    Returns the steps of the plan of a query.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+        query (str): The query.
+        params (Optional[Sequence[Any]]): The query parameters.
+
+    Returns:
+        List[str]: The `EXPLAIN QUERY PLAN` details, in order.
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or []).fetchall()
+    return [row[3] for row in rows]
+
+
+def full_scans(plan: List[str], tables: Sequence[str] = FACT_TABLES) -> List[str]:
+    """
+    Finds the steps of a plan reading a whole large table, with or without an index.
+
+    Args:
+        plan (List[str]): The `EXPLAIN QUERY PLAN` details.
+        tables (Sequence[str]): The large tables.
+
+    Returns:
+        List[str]: The offending steps.
+    """
+    pattern = re.compile(rf"^SCAN ({'|'.join(map(re.escape, tables))})\b")
+    return [step for step in plan if pattern.match(step)]
+
+
+def check_plans(db_path: str) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Explains the hot queries against a database. Partitioned databases are checked on
+    their first partition, attached as the queries read them.
+
+    Args:
+        db_path (str): The SQLite database.
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: The 'plan' and the 'full_scans' of each query.
+    """
+    dashboard = load_dashboard()
+    conn = connect(db_path)
+    try:
+        partitions = FactPartitions(partition_dir(db_path))
+        attached = partitions.provinces()[:1]
+        results = {}
+        for name, build in hot_queries(dashboard).items():
+            query, params = build()
+            if attached:
+                with partitions.attached(conn, attached):
+                    plan = explain(conn, query, params)
+            else:
+                plan = explain(conn, query, params)
+            results[name] = {"plan": plan, "full_scans": full_scans(plan)}
+    finally:
+        conn.close()
+    return results
+
+
+def main() -> None:
+    """
+    Checks the hot query plans from the command line, failing when one of them reads a
+    whole fact table (e.g., after a schema or query change).
+    """
+    parser = argparse.ArgumentParser(
+        description="Fails when a hot query plan regresses to a full fact table scan."
+    )
+    parser.add_argument("--db", required=True, help="SQLite database to check.")
+    args = parser.parse_args()
+
+    failed = False
+    for name, result in check_plans(args.db).items():
+        status = "FULL SCAN" if result["full_scans"] else "ok"
+        print(f"{name}: {status}")
+        for step in result["plan"]:
+            print(f"    {step}")
+        failed = failed or bool(result["full_scans"])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# Libraries
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules
+from bench.synthetic import PriceModel, make_payload
+from contextlib import contextmanager
+from db.changelog import delete_slots, load_price_changes
+from db.partitions import FactPartitions, partition_dir
+from datetime import datetime, timedelta
+from db.engine import get_engine
+from db.layouts import fact_layout, load_wide_facts
+from etl.dates import date_key
+from etl.load import load_facts
+from etl.stations import STATION_FIELDS, active_stations
+from etl.transform import build_facts
+from pathlib import Path
+from sqlalchemy import text
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+FRONTEND_DIR = Path(__file__).resolve().parents[2] / "frontend"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+@contextmanager
+def working_dir(path: Path) -> Iterator[None]:
+    """
+    Temporarily changes the working directory (the dashboard uses relative paths).
+
+    Args:
+        path (Path): The working directory.
+    """
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def load_dashboard() -> Any:
+    """
+    Imports the dashboard helpers (`frontend/utils.py`) without Streamlit. They are
+    loaded under another name because the backend has its own `utils` package.
+
+    Returns:
+        Any: The `frontend/utils.py` module.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "dashboard_utils", FRONTEND_DIR / "utils.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func: Callable[[], Any], repeats: int, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Times a function several times after some warmup runs.
+
+    Args:
+        func (Callable[[], Any]): The function to time.
+        repeats (int): The timed runs.
+        warmup (int): The untimed runs before them.
+
+    Returns:
+        Dict[str, Any]: The 'min', 'median', 'mean' and 'max' seconds and the 'repeats'.
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return {
+        "min": round(min(times), 6),
+        "median": round(statistics.median(times), 6),
+        "mean": round(statistics.mean(times), 6),
+        "max": round(max(times), 6),
+        "repeats": repeats,
+    }
+
+
+def payload_from_db(dimstation: Any, seed: int = 0) -> Dict[str, Any]:
+    """
+    Builds a ministry payload with synthetic prices for the current stations of a database.
+
+    Args:
+        dimstation (pd.DataFrame): The station dimension.
+        seed (int): The random seed.
+
+    Returns:
+        Dict[str, Any]: The payload.
+    """
+    current = active_stations(dimstation)
+    stations = []
+    for row in current.to_dict("records"):
+        station = {field: str(row[col]) for field, col in STATION_FIELDS.items()}
+        for field in ["Latitud", "Longitud (WGS84)"]:
+            station[field] = station[field].replace(".", ",")
+        stations.append(station)
+    return make_payload(stations, PriceModel(len(stations), seed), datetime.now())
+
+
+def git_commit() -> Optional[str]:
+    """
+    Returns the current commit of the repository, if available.
+
+    Returns:
+        Optional[str]: The commit hash.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(db_path: str, repeats: int) -> Dict[str, Any]:
+    """
+    Runs the benchmarks of the ingest and the dashboard against a database.
+
+    Args:
+        db_path (str): The SQLite database (e.g., generated by `bench.synthetic`).
+        repeats (int): The timed runs of each benchmark.
+
+    Returns:
+        Dict[str, Any]: The 'meta' data of the run and the 'results' by benchmark.
+    """
+    import numpy as np
+    import pandas as pd
+
+    db_path = str(Path(db_path).resolve())
+    engine = get_engine(f"sqlite:///{db_path}")
+    dims = {
+        name: pd.read_sql_query(f"SELECT * FROM {name};", engine)
+        for name in ["dimstation", "dimproduct", "dimmoment"]
+    }
+    with engine.connect() as conn:
+        fact_rows = conn.execute(text("SELECT COUNT(*) FROM factdata")).scalar()
+        last_date_key = conn.execute(text("SELECT MAX(DateKey) FROM factdata")).scalar()
+        layout = fact_layout(conn.connection.driver_connection)
+    loader, fact_table = load_facts, "factdata"
+    if layout == "wide":
+        loader, fact_table = load_wide_facts, "factwide"
+    elif layout == "changes":
+        loader = load_price_changes
+
+    # Partitioned databases (`bench.synthetic --partitioned`) keep the facts apart
+    if partition_dir(db_path).exists():
+        partitions = FactPartitions(partition_dir(db_path))
+        with engine.connect() as conn:
+            stats = partitions.read_sql(
+                conn.connection.driver_connection,
+                "SELECT COUNT(*) AS n, MAX(DateKey) AS last FROM factdata",
+            )
+        fact_rows += int(stats["n"].sum())
+        last_date_key = max(last_date_key or 0, int(stats["last"].max()))
+
+    results = {}
+
+    # Ingest: fact building and loading of one moment
+    payload = payload_from_db(dims["dimstation"])
+    stations = payload["ListaEESSPrecio"]
+    results["build_facts"] = measure(
+        lambda: build_facts(stations, dims["dimstation"], dims["dimproduct"], 1, 1),
+        repeats,
+    )
+    facts, _ = build_facts(stations, dims["dimstation"], dims["dimproduct"], 1, 1)
+    facts["RunKey"] = None
+    facts["Flags"] = 0
+    results["build_facts"]["rows"] = len(facts)
+
+    # New dates after the last loaded one, removed afterwards
+    last_day = datetime.strptime(str(last_date_key), "%Y%m%d")
+    new_keys = [date_key(last_day + timedelta(days=n)) for n in range(1, repeats + 2)]
+    date_keys = iter(new_keys)
+    try:
+        results["load_facts_insert"] = measure(
+            lambda: loader(facts.assign(DateKey=next(date_keys)), engine),
+            repeats,
+        )
+        results["load_facts_rerun"] = measure(
+            lambda: loader(facts.assign(DateKey=new_keys[0]), engine),
+            repeats,
+        )
+    finally:
+        with engine.begin() as conn:
+            if layout == "changes":
+                delete_slots(conn.connection.driver_connection, last_date_key + 1)
+            else:
+                conn.execute(
+                    text(f"DELETE FROM {fact_table} WHERE DateKey > :key"),
+                    {"key": last_date_key},
+                )
+    results["load_facts_insert"]["rows"] = len(facts)
+
+    # Dashboard: query, selection, KPIs, top 10 and map
+    dashboard = load_dashboard()
+    moment_key = int(dims["dimmoment"]["MomentKey"].iloc[-1])
+    results["retrieve_data_app"] = measure(
+        lambda: dashboard.retrieve_data_app(moment_key, db_path), repeats
+    )
+    data = dashboard.retrieve_data_app(moment_key, db_path)
+    results["retrieve_data_app"]["rows"] = len(data)
+    results["retrieve_data_app"]["bytes"] = int(data.memory_usage(deep=True).sum())
+    # A rerun of the dashboard: served by the shared cache until a new ingest lands
+    data_cache = dashboard.DataCache(db_path)
+    results["retrieve_data_cached"] = measure(
+        lambda: data_cache.data_app(moment_key), repeats
+    )
+    results["retrieve_data_cached"].update(data_cache.counters())
+
+    results["selection_cube"] = measure(lambda: dashboard.SelectionCube(data), repeats)
+    info_select = dashboard.InfoSelect(data)
+    info_select.sel_geo_ent = data["StationAC"].mode().iloc[0]
+    info_select.set_prod("GASOLINA 95")
+    for brand in ["TODAS", "BP", "OTRAS"]:
+        info_select.set_brand(brand)
+        results[f"ref_info_{brand.lower()}"] = measure(info_select.ref_info, repeats)
+    info_select.set_brand("TODAS")
+    info_select.ref_info()
+    results["get_kpis"] = measure(info_select.get_kpis, repeats)
+    results["get_top_n_cheapest_stat"] = measure(
+        lambda: info_select.get_top_n_cheapest_stat(10), repeats
+    )
+
+    def build_map() -> str:
+        with working_dir(FRONTEND_DIR):
+            if Path("municipios.geojson").exists():
+                m = dashboard.create_basis_map(28.3, -15.8, 7)
+            else:
+                m = dashboard.folium.Map(location=[28.3, -15.8], zoom_start=7)
+            current_stations_df = info_select.current_df[
+                ["StationName", "StationBrand", "StationLatitude", "StationLongitude"]
+            ].drop_duplicates()
+            for _, row in current_stations_df.iterrows():
+                dashboard.add_station_map(row, m)
+            return m._repr_html_()
+
+    results["map"] = measure(build_map, repeats)
+    results["map"]["markers"] = int(
+        len(info_select.current_df[["StationName", "StationLatitude"]].drop_duplicates())
+    )
+
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "database": db_path,
+        "database_bytes": os.path.getsize(db_path),
+        "fact_rows": fact_rows,
+        "fact_layout": layout,
+        "stations": int(dims["dimstation"]["StationID"].nunique()),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "map_geojson": (FRONTEND_DIR / "municipios.geojson").exists(),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Compares the median times of two benchmark runs.
+
+    Args:
+        baseline (Dict[str, Any]): The reference run.
+        current (Dict[str, Any]): The new run.
+
+    Returns:
+        List[str]: One line per benchmark present in both runs.
+    """
+    lines = [f"{'benchmark':<28}{'baseline':>12}{'current':>12}{'speedup':>10}"]
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before, after = baseline["results"][name]["median"], result["median"]
+        speedup = before / after if after else float("inf")
+        lines.append(f"{name:<28}{before:>12.4f}{after:>12.4f}{speedup:>9.2f}x")
+    return lines
+
+
+def main() -> None:
+    """
+    Runs the benchmarks from the command line and stores the results as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmarks fact building, loading and the dashboard queries."
+    )
+    parser.add_argument("--db", required=True, help="SQLite database to benchmark.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", help="Results file. Defaults to bench/results/<timestamp>.json.")
+    parser.add_argument("--compare", help="Previous results file to compare with.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.db, args.repeats)
+
+    if args.out:
+        out = Path(args.out)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = RESULTS_DIR / f"{stamp}_{Path(args.db).stem}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    for name, result in report["results"].items():
+        print(f"{name:<28}{result['median']:>12.4f}s")
+    if args.compare:
+        print("\n".join(compare(json.loads(Path(args.compare).read_text()), report)))
+    print(f"Results stored in {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# Libraries
+import argparse
+import numpy as np
+import pandas as pd
+import time
+
+# Modules
+from datetime import date, datetime, timedelta
+from db.engine import get_engine
+from db.migrations import migrate
+from db.models import PRICE_SCALE
+from db.partitions import FactPartitions, partition_dir
+from etl.dates import date_key
+from etl.load import load_facts
+from etl.metrics import Metrics, record_run, start_run
+from etl.pipeline import ensure_dim_dates
+from etl.regions import PROVINCES
+from etl.stations import active_stations, sync_stations
+from etl.transform import key_lookup
+from pathlib import Path
+from scripts.initial_bulk import load_dim_moment, load_dim_product, load_dim_station
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, List, Optional
+
+
+BASELINE_PATH = "data/init/baseline_master.csv"
+MOMENTS = ["Madrugada", "Mañana", "Mediodía", "Tarde", "Noche"]
+
+# Province sets of each scale
+SCALES = {
+    "canarias": ["35", "38"],
+    "spain": list(PROVINCES),
+}
+
+# Station fields of the API payload, besides the prices
+STATION_FIELDS = [
+    "C.P.",
+    "Dirección",
+    "Horario",
+    "Latitud",
+    "Localidad",
+    "Longitud (WGS84)",
+    "Margen",
+    "Municipio",
+    "Provincia",
+    "Remisión",
+    "Rótulo",
+    "Tipo Venta",
+    "% BioEtanol",
+    "% Éster metílico",
+    "IDEESS",
+    "IDMunicipio",
+    "IDProvincia",
+    "IDCCAA",
+]
+
+# Products as published by the API, with a base price and the share of stations selling them
+PRODUCTS = {
+    "Precio Biodiesel": (1.45, 0.01),
+    "Precio Bioetanol": (1.40, 0.005),
+    "Precio Gas Natural Comprimido": (1.30, 0.01),
+    "Precio Gas Natural Licuado": (1.20, 0.005),
+    "Precio Gases licuados del petróleo": (0.95, 0.08),
+    "Precio Gasoleo A": (1.40, 0.98),
+    "Precio Gasoleo B": (1.05, 0.25),
+    "Precio Gasoleo Premium": (1.50, 0.55),
+    "Precio Gasolina 95 E10": (1.50, 0.02),
+    "Precio Gasolina 95 E5": (1.55, 0.97),
+    "Precio Gasolina 95 E5 Premium": (1.62, 0.15),
+    "Precio Gasolina 98 E10": (1.65, 0.01),
+    "Precio Gasolina 98 E5": (1.70, 0.60),
+    "Precio Hidrogeno": (9.90, 0.001),
+}
+BRANDS = ["REPSOL", "CEPSA", "BP", "SHELL", "DISA", "GALP", "PLENOIL", "BALLENOIL", "AVIA"]
+
+
+def make_stations(
+    provinces: List[str], stations_per_province: int = 235, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Generates the station fields of a ministry payload.
+
+    Canarias uses the real stations of the baseline, the rest of the provinces get
+    synthetic stations modelled on them.
+
+    Args:
+        provinces (List[str]): The province ids (e.g., ['35', '38']).
+        stations_per_province (int): The stations of each synthetic province.
+        seed (int): The random seed.
+
+    Returns:
+        List[Dict[str, Any]]: The station fields, without prices.
+    """
+    rng = np.random.default_rng(seed)
+    baseline = pd.read_csv(BASELINE_PATH, sep=";", dtype=str, keep_default_na=False)
+    templates = baseline[STATION_FIELDS].to_dict("records")
+
+    stations = [
+        station for station in templates if station["IDProvincia"] in provinces
+    ]
+    next_id = 100000
+    for province in provinces:
+        if province in SCALES["canarias"]:
+            continue
+
+        name, ac_id = PROVINCES[province]
+        center = rng.uniform([37.0, -7.5], [43.0, 2.5])
+        for n in range(stations_per_province):
+            station = dict(templates[rng.integers(len(templates))])
+            municipality = n % 40
+            lat, lon = center + rng.normal(0, 0.3, 2)
+            station.update(
+                {
+                    "IDEESS": str(next_id),
+                    "Rótulo": f"{BRANDS[rng.integers(len(BRANDS))]} {name[:12]} {n}",
+                    "Latitud": f"{lat:.6f}".replace(".", ","),
+                    "Longitud (WGS84)": f"{lon:.6f}".replace(".", ","),
+                    "Localidad": f"LOCALIDAD {province}-{municipality:03d}",
+                    "Municipio": f"Municipio {province}-{municipality:03d}",
+                    "IDMunicipio": str(int(province) * 1000 + municipality),
+                    "Provincia": name,
+                    "IDProvincia": province,
+                    "IDCCAA": f"{ac_id:02d}",
+                }
+            )
+            stations.append(station)
+            next_id += 1
+
+    return stations
+
+
+class PriceModel:
+    """
+    A class which simulates the prices of every station and product over time.
+
+    Each station sells a random subset of products. Prices follow a national daily
+    trend plus a station offset, and a share of the stations changes its price at each
+    moment of the day.
+
+    Attributes:
+        offers (np.ndarray): Whether each station (row) sells each product (column).
+        prices (np.ndarray): The current prices, in euros per litre.
+    """
+
+    def __init__(self, n_stations: int, seed: int = 0):
+        """
+        Initializes the model with random offers and starting prices.
+
+        Args:
+            n_stations (int): The number of stations.
+            seed (int): The random seed.
+        """
+        self.rng = np.random.default_rng(seed)
+        base, share = np.array(list(PRODUCTS.values())).T
+        self.offers = self.rng.random((n_stations, len(PRODUCTS))) < share
+        self.base = base
+        self.offset = self.rng.normal(0, 0.035, (n_stations, 1))
+        self.level = np.zeros((n_stations, len(PRODUCTS)))
+        self.trend = 0.0
+        self.prices = self.current()
+
+    def current(self) -> np.ndarray:
+        """
+        Computes the current prices, rounded to the thousandth like the API.
+
+        Returns:
+            np.ndarray: The prices of every station and product.
+        """
+        return np.round(self.base + self.trend + self.offset + self.level, 3)
+
+    def next_day(self) -> None:
+        """
+        Moves the national trend one day forward.
+        """
+        self.trend = float(np.clip(self.trend + self.rng.normal(0, 0.004), -0.3, 0.3))
+
+    def next_moment(self, change_share: float = 0.1) -> np.ndarray:
+        """
+        Moves the prices one moment forward.
+
+        Args:
+            change_share (float): The share of stations changing their prices.
+
+        Returns:
+            np.ndarray: The new prices.
+        """
+        changing = self.rng.random(self.level.shape[0]) < change_share
+        self.level[changing] += self.rng.normal(0, 0.01, (changing.sum(), 1))
+        self.level *= 0.98
+        self.prices = self.current()
+        return self.prices
+
+
+def make_payload(
+    stations: List[Dict[str, Any]], model: PriceModel, fecha: datetime
+) -> Dict[str, Any]:
+    """
+    Builds a ministry payload with the current prices of a model.
+
+    Args:
+        stations (List[Dict[str, Any]]): The station fields.
+        model (PriceModel): The price model of the stations.
+        fecha (datetime): The `Fecha` of the payload.
+
+    Returns:
+        Dict[str, Any]: The payload, with `Fecha` and `ListaEESSPrecio`.
+    """
+    products = list(PRODUCTS)
+    formatted = np.char.replace(np.char.mod("%.3f", model.prices), ".", ",")
+    formatted = np.where(model.offers, formatted, "")
+    stations_list = [
+        {**station, **dict(zip(products, row))}
+        for station, row in zip(stations, formatted.tolist())
+    ]
+    return {
+        "Fecha": fecha.strftime("%d/%m/%Y %H:%M:%S"),
+        "ListaEESSPrecio": stations_list,
+        "Nota": "Datos sintéticos",
+        "ResultadoConsulta": "OK",
+    }
+
+
+def create_database(
+    path: str,
+    scale: str = "canarias",
+    years: int = 1,
+    end: Optional[date] = None,
+    stations_per_province: int = 235,
+    seed: int = 0,
+    logger: Any = print,
+    days: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Creates a populated `star_schema.db` with synthetic prices at five moments a day.
+
+    Args:
+        path (str): The path of the new SQLite database.
+        scale (str): The provinces to cover ('canarias' or 'spain').
+        years (int): The years of history, ending at `end`.
+        end (Optional[date]): The last date. Today when None, so the dashboard finds
+                              the last seven days.
+        stations_per_province (int): The stations of each synthetic province.
+        seed (int): The random seed.
+        logger (Any): Called with progress messages.
+        days (Optional[int]): The days of history, instead of `years` (e.g., a small
+                              database for the tests).
+
+    Returns:
+        Dict[str, Any]: The number of 'stations', 'days' and 'facts' and the 'elapsed' seconds.
+    """
+    if Path(path).exists():
+        raise FileExistsError(f"{path} already exists")
+
+    started = time.perf_counter()
+    end = end or date.today()
+    start = end - timedelta(days=(days or 365 * years) - 1)
+    engine = get_engine(f"sqlite:///{path}")
+    migrate(engine)
+
+    # Dimensions
+    ensure_dim_dates(engine, start, start + timedelta(days=5000))
+    load_dim_product(engine)
+    load_dim_moment(engine)
+    load_dim_station(engine)
+    stations = make_stations(SCALES[scale], stations_per_province, seed)
+    dimstation = pd.read_sql_query("SELECT * FROM dimstation;", engine)
+    sync_stations(stations, dimstation, engine, versioning=False)
+
+    dims = read_keys(engine)
+    station_keys = (
+        pd.to_numeric(pd.Series([station["IDEESS"] for station in stations]))
+        .map(dims["stations"])
+        .to_numpy()
+    )
+    product_keys = pd.Series(list(PRODUCTS)).map(dims["products"]).to_numpy()
+
+    # Facts, one transaction per day
+    model = PriceModel(len(stations), seed)
+    rows, cols = np.nonzero(model.offers)
+    total = 0
+    for n, day in enumerate(pd.date_range(start, end, freq="D")):
+        model.next_day()
+        day_key = date_key(day)
+        run_key = start_run(engine, day.date(), None, "synthetic")
+        frames = []
+        for moment_id in MOMENTS:
+            prices = model.next_moment()
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "DateKey": day_key,
+                        "StationKey": station_keys[rows],
+                        "ProductKey": product_keys[cols],
+                        "MomentKey": dims["moments"][moment_id],
+                        "PriceMilli": np.round(prices[rows, cols] * PRICE_SCALE),
+                        "RunKey": run_key,
+                        "Flags": 0,
+                    }
+                )
+            )
+        facts = pd.concat(frames, ignore_index=True).astype({"PriceMilli": "int64"})
+        total += load_facts(facts, engine, "ignore")["inserted"]
+        record_run(engine, Metrics(), day.date(), None, run_key=run_key)
+        if n % 30 == 0:
+            logger(f"{day.date()}: {total} facts loaded")
+
+    return {
+        "stations": len(stations),
+        "days": (end - start).days + 1,
+        "facts": total,
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+
+
+def read_keys(engine: Engine) -> Dict[str, pd.Series]:
+    """
+    Reads the key lookups of the dimensions.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        Dict[str, pd.Series]: The 'stations' (StationID), 'products' (ProductID) and
+                              'moments' (MomentID) keys.
+    """
+    dimstation = active_stations(pd.read_sql_query("SELECT * FROM dimstation;", engine))
+    return {
+        "stations": key_lookup(dimstation, "StationID", "StationKey"),
+        "products": key_lookup(
+            pd.read_sql_query("SELECT * FROM dimproduct;", engine), "ProductID", "ProductKey"
+        ),
+        "moments": key_lookup(
+            pd.read_sql_query("SELECT * FROM dimmoment;", engine), "MomentID", "MomentKey"
+        ),
+    }
+
+
+def main() -> None:
+    """
+    Generates a synthetic database from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description="Generates a star_schema.db with synthetic prices for benchmarks."
+    )
+    parser.add_argument("--out", required=True, help="Path of the new database.")
+    parser.add_argument("--scale", choices=list(SCALES), default="canarias")
+    parser.add_argument("--years", type=int, default=1, help="Years of history (1-5).")
+    parser.add_argument("--stations-per-province", type=int, default=235)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Move the facts into province partitions (FACT_PARTITIONING=province).",
+    )
+    args = parser.parse_args()
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    summary = create_database(
+        args.out, args.scale, args.years, None, args.stations_per_province, args.seed
+    )
+    if args.partitioned:
+        summary["partitions"] = len(
+            FactPartitions(partition_dir(args.out)).import_facts(args.out)
+        )
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
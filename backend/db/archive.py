@@ -0,0 +1,363 @@
+# Libraries
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sqlite3
+
+# Modules
+from contextlib import contextmanager
+from db.engine import connect
+from db.layouts import fact_layout
+from db.models import FactData
+from db.partitions import FactPartitions
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+# The dashboard reads the last 7 days, which always stay in SQLite
+MIN_HORIZON_DAYS = 7
+
+# Columns of the archived facts: the FactData columns and the province of the station
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("DateKey", pa.int32()),
+        ("StationKey", pa.int32()),
+        ("ProductKey", pa.int16()),
+        ("MomentKey", pa.int8()),
+        ("PriceMilli", pa.int32()),
+        ("RunKey", pa.int32()),
+        ("Flags", pa.int8()),
+        ("StationProvinceID", pa.int8()),
+    ]
+)
+FACT_KEYS = ["DateKey", "StationKey", "ProductKey", "MomentKey"]
+
+# Rows are sorted so the row group statistics prune provinces, products and dates
+SORT_COLUMNS = ["StationProvinceID", "ProductKey", "DateKey", "MomentKey", "StationKey"]
+ROW_GROUP_SIZE = 128 * 1024
+
+
+def archive_dir(database_name: str) -> Path:
+    """
+    Returns the directory of the fact archive of a database, next to it.
+
+    Args:
+        database_name (str): The path of the SQLite database (e.g., 'star_schema.db').
+
+    Returns:
+        Path: The directory (e.g., 'star_schema_archive/').
+    """
+    path = Path(database_name)
+    return path.with_name(f"{path.stem}_archive")
+
+
+class FactArchive:
+    """
+    A class which stores old facts as Parquet files, one per month.
+
+    Files are laid out as `month=<YYYYMM>/facts.parquet` (Hive partitioning), so reads
+    skip the months outside their date range, and sorted by province, product and date,
+    so the row group statistics skip the rest.
+
+    Attributes:
+        root (Path): The directory of the archive.
+        compression (str): The Parquet compression codec.
+        row_group_size (int): The maximum number of rows of a row group.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        compression: str = "zstd",
+        row_group_size: int = ROW_GROUP_SIZE,
+    ):
+        """
+        Initializes the archive of a directory, creating it if needed.
+
+        Args:
+            root (Path): The directory of the archive.
+            compression (str): The Parquet compression codec.
+            row_group_size (int): The maximum number of rows of a row group.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.row_group_size = row_group_size
+
+    def path(self, month: int) -> Path:
+        """
+        Returns the file of a month.
+
+        Args:
+            month (int): The month, as YYYYMM (e.g., 202401).
+
+        Returns:
+            Path: The Parquet file of the month.
+        """
+        return self.root / f"month={month}" / "facts.parquet"
+
+    def months(self) -> List[int]:
+        """
+        Lists the archived months.
+
+        Returns:
+            List[int]: The months, as YYYYMM, sorted.
+        """
+        return sorted(
+            int(path.parent.name.split("=")[1])
+            for path in self.root.glob("month=*/facts.parquet")
+        )
+
+    def write_month(self, month: int, facts: pd.DataFrame, merge: bool = True) -> int:
+        """
+        Adds facts to the file of a month, merging them with the facts already archived
+        (the new ones win on conflict). The file is replaced atomically.
+
+        Args:
+            month (int): The month of the facts, as YYYYMM.
+            facts (pd.DataFrame): The facts, with the columns of `ARCHIVE_SCHEMA`.
+            merge (bool): Whether the archived facts are kept. False replaces them.
+
+        Returns:
+            int: The number of facts of the month file.
+        """
+        path = self.path(month)
+        if merge and path.exists():
+            archived = pq.read_table(path, schema=ARCHIVE_SCHEMA).to_pandas()
+            facts = pd.concat([archived, facts], ignore_index=True)
+            facts = facts.drop_duplicates(FACT_KEYS, keep="last")
+        facts = facts.sort_values(SORT_COLUMNS)
+        table = pa.Table.from_pandas(
+            facts[ARCHIVE_SCHEMA.names], schema=ARCHIVE_SCHEMA, preserve_index=False
+        )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(
+            table,
+            tmp_path,
+            compression=self.compression,
+            row_group_size=self.row_group_size,
+            write_statistics=True,
+        )
+        os.replace(tmp_path, path)
+        return table.num_rows
+
+    def read(
+        self,
+        start_key: int,
+        end_key: int,
+        provinces: Optional[Iterable[str]] = None,
+        products: Optional[Iterable[int]] = None,
+        moments: Optional[Iterable[int]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Reads archived facts. The filters are pushed down to the months (directories)
+        and to the row groups (statistics).
+
+        Args:
+            start_key (int): The first DateKey.
+            end_key (int): The last DateKey.
+            provinces (Optional[Iterable[str]]): The province ids. All when None.
+            products (Optional[Iterable[int]]): The ProductKey values. All when None.
+            moments (Optional[Iterable[int]]): The MomentKey values. All when None.
+            columns (Optional[List[str]]): The columns read. Those of `ARCHIVE_SCHEMA` when None.
+
+        Returns:
+            pd.DataFrame: The facts.
+        """
+        columns = columns or ARCHIVE_SCHEMA.names
+        months = [m for m in self.months() if start_key // 100 <= m <= end_key // 100]
+        if not months:
+            return ARCHIVE_SCHEMA.empty_table().select(columns).to_pandas()
+
+        condition = (ds.field("DateKey") >= start_key) & (ds.field("DateKey") <= end_key)
+        if provinces is not None:
+            condition &= ds.field("StationProvinceID").isin([int(p) for p in provinces])
+        if products is not None:
+            condition &= ds.field("ProductKey").isin(list(products))
+        if moments is not None:
+            condition &= ds.field("MomentKey").isin(list(moments))
+
+        dataset = ds.dataset(
+            [str(self.path(month)) for month in months],
+            schema=ARCHIVE_SCHEMA,
+            format="parquet",
+        )
+        return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+    def archive_facts(
+        self,
+        database_name: str,
+        cutoff_key: int,
+        partitions: Optional[FactPartitions] = None,
+    ) -> Dict[int, int]:
+        """
+        Moves the facts older than a date from SQLite (the `factdata` table and the
+        province partitions, if any) into the archive, one month at a time. Each month is
+        deleted from SQLite once its file is written, so an interrupted run is resumed by
+        the next one.
+
+        Args:
+            database_name (str): The path of the main SQLite database.
+            cutoff_key (int): The first DateKey kept in SQLite.
+            partitions (Optional[FactPartitions]): The province partitions of the facts.
+
+        Returns:
+            Dict[int, int]: The number of facts moved, by month.
+
+        Raises:
+            ValueError: If the database uses the change log layout, whose old changes
+                        still make the prices of the following dates.
+        """
+        sources = {"main": None}
+        if partitions is not None:
+            sources.update({f"p{p}": partitions.path(p) for p in partitions.provinces()})
+
+        moved = {}
+        conn = connect(database_name)
+        try:
+            # The facts are read through `factdata`, but deleted from their table
+            tables = {schema: "factdata" for schema in sources}
+            layout = fact_layout(conn)
+            if layout == "changes":
+                raise ValueError("The change log layout does not support the archive")
+            if layout == "wide":
+                tables["main"] = "factwide"
+
+            months = set()
+            for schema, path in sources.items():
+                with attached(conn, schema, path):
+                    months.update(
+                        row[0]
+                        for row in conn.execute(
+                            f"SELECT DISTINCT DateKey / 100 FROM {schema}.factdata "
+                            "WHERE DateKey < ?",
+                            (cutoff_key,),
+                        )
+                    )
+
+            cols = ", ".join(f"f.{col.name}" for col in FactData.__table__.columns)
+            for month in sorted(months):
+                # The DateKey range seeks the primary key
+                bounds = (month * 100, min(month * 100 + 100, cutoff_key))
+                frames = []
+                for schema, path in sources.items():
+                    with attached(conn, schema, path):
+                        frames.append(
+                            pd.read_sql_query(
+                                f"""
+                                SELECT {cols}, s.StationProvinceID
+                                FROM {schema}.factdata f
+                                JOIN dimstation s ON f.StationKey = s.StationKey
+                                WHERE f.DateKey >= ? AND f.DateKey < ?
+                                """,
+                                conn,
+                                params=bounds,
+                            )
+                        )
+                facts = pd.concat(frames, ignore_index=True)
+                self.write_month(month, facts)
+
+                for schema, path in sources.items():
+                    with attached(conn, schema, path):
+                        conn.execute(
+                            f"DELETE FROM {schema}.{tables[schema]} "
+                            "WHERE DateKey >= ? AND DateKey < ?",
+                            bounds,
+                        )
+                        conn.commit()
+                moved[month] = len(facts)
+        finally:
+            conn.close()
+        return moved
+
+
+@contextmanager
+def attached(conn: sqlite3.Connection, schema: str, path: Optional[Path]) -> Iterator[None]:
+    """
+    Attaches a database to a connection for the duration of a block.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the main database.
+        schema (str): The schema name of the database ('main' for the connection's own).
+        path (Optional[Path]): The SQLite file attached. Nothing is attached when None.
+    """
+    if path is None:
+        yield
+        return
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+    try:
+        yield
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+
+
+def read_facts(
+    database_name: str,
+    start_key: int,
+    end_key: int,
+    provinces: Optional[Iterable[str]] = None,
+    products: Optional[Iterable[int]] = None,
+    moments: Optional[Iterable[int]] = None,
+    partitions: Optional[FactPartitions] = None,
+    archive: Optional[FactArchive] = None,
+) -> pd.DataFrame:
+    """
+    Reads the facts of a date range from SQLite and from the Parquet archive at once, for
+    historical queries. The filters are applied by both stores, and facts present in
+    both (e.g., a replayed archived date) are taken from SQLite.
+
+    Args:
+        database_name (str): The path of the main SQLite database.
+        start_key (int): The first DateKey.
+        end_key (int): The last DateKey.
+        provinces (Optional[Iterable[str]]): The province ids. All when None.
+        products (Optional[Iterable[int]]): The ProductKey values. All when None.
+        moments (Optional[Iterable[int]]): The MomentKey values. All when None.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+        archive (Optional[FactArchive]): The archive. The one next to the database when None.
+
+    Returns:
+        pd.DataFrame: The facts, with the columns of `ARCHIVE_SCHEMA`.
+    """
+    provinces = None if provinces is None else [int(p) for p in provinces]
+    products = None if products is None else list(products)
+    moments = None if moments is None else list(moments)
+
+    conditions = ["f.DateKey BETWEEN ? AND ?"]
+    params = [start_key, end_key]
+    for column, values in [
+        ("s.StationProvinceID", provinces),
+        ("f.ProductKey", products),
+        ("f.MomentKey", moments),
+    ]:
+        if values is not None:
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+    cols = ", ".join(f"f.{col.name}" for col in FactData.__table__.columns)
+    query = f"""
+    SELECT {cols}, s.StationProvinceID
+    FROM factdata f
+    JOIN dimstation s ON f.StationKey = s.StationKey
+    WHERE {' AND '.join(conditions)}
+    """
+
+    conn = connect(database_name)
+    try:
+        if partitions is None:
+            hot = pd.read_sql_query(query, conn, params=params)
+        else:
+            hot = partitions.read_sql(conn, query, provinces, params=params)
+    finally:
+        conn.close()
+
+    archive = archive or FactArchive(archive_dir(database_name))
+    cold = archive.read(start_key, end_key, provinces, products, moments)
+    if cold.empty:
+        return hot
+    facts = pd.concat([hot, cold], ignore_index=True)
+    return facts.drop_duplicates(FACT_KEYS, keep="first").reset_index(drop=True)
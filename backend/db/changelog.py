@@ -0,0 +1,659 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import sqlite3
+import time
+
+# Modules
+from datetime import datetime, timedelta
+from db.models import FactData, LastPrice, PriceChange, PriceSlot
+from etl.load import DEFAULT_CHUNK_SIZE, POLICIES, compile_driver_sql
+from etl.metrics import Metrics
+from sqlalchemy import and_, bindparam, delete
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+PAIR_KEYS = ["StationKey", "ProductKey"]
+CHANGE_KEYS = ["DateKey", "MomentKey"] + PAIR_KEYS
+# Bits of the StationKey shift in the code of a station and product
+PAIR_SHIFT = 32
+
+# Days between keyframes: the first moment loaded in each period (weeks from Monday)
+# stores every price, so the prices of a moment are rebuilt from the changes since the
+# last keyframe only
+KEYFRAME_DAYS = 7
+
+# The latest change of every station and product in a range of moments: the prices in
+# force at its end when it starts at a keyframe
+LATEST_QUERY = """
+SELECT StationKey, ProductKey, PriceMilli, Flags
+FROM (
+    SELECT *, ROW_NUMBER() OVER (
+        PARTITION BY StationKey, ProductKey ORDER BY DateKey DESC, MomentKey DESC
+    ) AS Recency
+    FROM pricechange
+    WHERE (DateKey, MomentKey) >= (?, ?) AND (DateKey, MomentKey) <= (?, ?)
+)
+WHERE Recency = 1
+"""
+
+
+def changes_select() -> str:
+    """
+    Builds the query reconstructing the facts in the long form, one row per price with
+    the FactData columns, from the change log: every loaded date and moment gets the
+    latest change of each station and product since its keyframe. The filters on the
+    date and moment seek the primary keys of `priceslot` and `pricechange`. The RunKey
+    is the last run that loaded the date and moment.
+
+    Returns:
+        str: The query.
+    """
+    return """
+    SELECT DateKey, StationKey, ProductKey, MomentKey, PriceMilli, RunKey, Flags
+    FROM (
+        SELECT
+            priceslot.DateKey,
+            pricechange.StationKey,
+            pricechange.ProductKey,
+            priceslot.MomentKey,
+            pricechange.PriceMilli,
+            priceslot.RunKey,
+            pricechange.Flags,
+            ROW_NUMBER() OVER (
+                PARTITION BY priceslot.DateKey, priceslot.MomentKey,
+                    pricechange.StationKey, pricechange.ProductKey
+                ORDER BY pricechange.DateKey DESC, pricechange.MomentKey DESC
+            ) AS Recency
+        FROM priceslot
+        CROSS JOIN pricechange
+        WHERE (pricechange.DateKey, pricechange.MomentKey)
+                >= (priceslot.KeyDateKey, priceslot.KeyMomentKey)
+            AND (pricechange.DateKey, pricechange.MomentKey)
+                <= (priceslot.DateKey, priceslot.MomentKey)
+    )
+    WHERE Recency = 1 AND PriceMilli IS NOT NULL
+    """
+
+
+def prices_as_of(
+    conn: sqlite3.Connection, date_key: int, moment_key: int, withdrawn: bool = False
+) -> pd.DataFrame:
+    """
+    Reconstructs the prices of every station and product in force at a date and moment,
+    whether or not that moment was loaded, from the changes since the last keyframe.
+
+    Args:
+        conn (sqlite3.Connection): A connection of a database in the change log layout.
+        date_key (int): The DateKey.
+        moment_key (int): The MomentKey.
+        withdrawn (bool): Whether to keep the products no longer published by their
+                          station then, with a missing price.
+
+    Returns:
+        pd.DataFrame: The StationKey, ProductKey, PriceMilli and Flags of each price.
+    """
+    slot = (date_key, moment_key)
+    row = conn.execute(
+        "SELECT KeyDateKey, KeyMomentKey FROM priceslot "
+        "WHERE (DateKey, MomentKey) <= (?, ?) "
+        "ORDER BY DateKey DESC, MomentKey DESC LIMIT 1",
+        slot,
+    ).fetchone()
+    # Nothing is loaded before when there is no keyframe, the range is empty then
+    keyframe = tuple(row) if row is not None else slot
+    query = LATEST_QUERY
+    if not withdrawn:
+        query += "AND PriceMilli IS NOT NULL"
+    return pd.read_sql_query(query, conn, params=(*keyframe, *slot))
+
+
+def neighbour_slot(
+    conn: sqlite3.Connection, slot: Tuple[int, int], after: bool
+) -> Optional[Tuple[int, int]]:
+    """
+    Finds the loaded date and moment right before or after another one.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+        slot (Tuple[int, int]): The DateKey and MomentKey.
+        after (bool): Whether to look for the next slot instead of the previous one.
+
+    Returns:
+        Optional[Tuple[int, int]]: Its DateKey and MomentKey, None if there is none.
+    """
+    op, order = (">", "ASC") if after else ("<", "DESC")
+    row = conn.execute(
+        f"SELECT DateKey, MomentKey FROM priceslot WHERE (DateKey, MomentKey) {op} (?, ?) "
+        f"ORDER BY DateKey {order}, MomentKey {order} LIMIT 1",
+        slot,
+    ).fetchone()
+    return None if row is None else tuple(row)
+
+
+def keyframe_period(date_key: int) -> int:
+    """
+    Computes the keyframe period of a date, counted in `KEYFRAME_DAYS` from a Monday.
+
+    Args:
+        date_key (int): The DateKey.
+
+    Returns:
+        int: The period number.
+    """
+    return (datetime.strptime(str(date_key), "%Y%m%d").toordinal() - 1) // KEYFRAME_DAYS
+
+
+def slot_keyframe(conn: sqlite3.Connection, slot: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Finds the keyframe the prices of a date and moment are rebuilt from: the stored one
+    of a loaded moment, else the last keyframe before it in its period, else itself (the
+    first moment loaded in the period).
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+        slot (Tuple[int, int]): The DateKey and MomentKey.
+
+    Returns:
+        Tuple[int, int]: The DateKey and MomentKey of the keyframe.
+    """
+    row = conn.execute(
+        "SELECT KeyDateKey, KeyMomentKey FROM priceslot WHERE DateKey = ? AND MomentKey = ?",
+        slot,
+    ).fetchone()
+    if row is not None:
+        return tuple(row)
+
+    day = datetime.strptime(str(slot[0]), "%Y%m%d")
+    start = day - timedelta(days=(day.toordinal() - 1) % KEYFRAME_DAYS)
+    row = conn.execute(
+        "SELECT DateKey, MomentKey FROM priceslot "
+        "WHERE DateKey >= ? AND (DateKey, MomentKey) <= (?, ?) "
+        "AND DateKey = KeyDateKey AND MomentKey = KeyMomentKey "
+        "ORDER BY DateKey DESC, MomentKey DESC LIMIT 1",
+        (int(start.strftime("%Y%m%d")), *slot),
+    ).fetchone()
+    return slot if row is None else tuple(row)
+
+
+def pair_codes(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Packs the StationKey and ProductKey of some rows into one integer each.
+
+    Args:
+        frame (pd.DataFrame): The StationKey and ProductKey columns.
+
+    Returns:
+        np.ndarray: The codes, ordered as the keys.
+    """
+    stations = frame["StationKey"].to_numpy(dtype=np.int64)
+    return (stations << PAIR_SHIFT) | frame["ProductKey"].to_numpy(dtype=np.int64)
+
+
+def price_state(frame: pd.DataFrame, pairs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aligns prices and flags with some stations and products.
+
+    Args:
+        frame (pd.DataFrame): The StationKey, ProductKey, PriceMilli and Flags columns.
+        pairs (np.ndarray): The sorted codes of the stations and products (`pair_codes`).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The prices (NaN when there is none) and flags (0
+                                       then), aligned with `pairs`.
+    """
+    prices = np.full(len(pairs), np.nan)
+    flags = np.zeros(len(pairs), dtype=np.int64)
+    codes = pair_codes(frame)
+    positions = np.searchsorted(pairs, codes)
+    found = positions < len(pairs)
+    found[found] = pairs[positions[found]] == codes[found]
+    prices[positions[found]] = frame["PriceMilli"].to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )[found]
+    flags[positions[found]] = frame["Flags"].to_numpy(dtype=np.int64)[found]
+    return prices, flags
+
+
+def same_price(
+    a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """
+    Compares two aligned price states, both prices being missing counting as equal.
+
+    Args:
+        a (Tuple[np.ndarray, np.ndarray]): A state, from `price_state`.
+        b (Tuple[np.ndarray, np.ndarray]): Another state, aligned with the first one.
+
+    Returns:
+        np.ndarray: Whether each pair has the same price and flags.
+    """
+    both_missing = np.isnan(a[0]) & np.isnan(b[0])
+    return both_missing | ((a[0] == b[0]) & (a[1] == b[1]))
+
+
+def stored_rows(
+    state: Tuple[np.ndarray, np.ndarray],
+    previous: Tuple[np.ndarray, np.ndarray],
+    keyframe: bool,
+) -> np.ndarray:
+    """
+    Finds the pairs with a row at a date and moment: those whose price changed since the
+    previous loaded one and, in a keyframe, every published price.
+
+    Args:
+        state (Tuple[np.ndarray, np.ndarray]): The prices at the date and moment.
+        previous (Tuple[np.ndarray, np.ndarray]): The prices at the previous one.
+        keyframe (bool): Whether the date and moment is a keyframe.
+
+    Returns:
+        np.ndarray: Whether each pair has a row.
+    """
+    rows = ~same_price(state, previous)
+    if keyframe:
+        rows |= ~np.isnan(state[0])
+    return rows
+
+
+def state_rows(
+    pairs: np.ndarray,
+    state: Tuple[np.ndarray, np.ndarray],
+    mask: np.ndarray,
+    slot: Optional[Tuple[int, int]] = None,
+) -> List[Tuple]:
+    """
+    Converts some pairs of a price state into driver parameter tuples.
+
+    Args:
+        pairs (np.ndarray): The codes of the stations and products of the state.
+        state (Tuple[np.ndarray, np.ndarray]): A state, from `price_state`.
+        mask (np.ndarray): The pairs to convert.
+        slot (Optional[Tuple[int, int]]): The DateKey and MomentKey put before the pair.
+
+    Returns:
+        List[Tuple]: The [DateKey, MomentKey,] StationKey, ProductKey, PriceMilli and
+                     Flags of each pair, None for a missing price.
+    """
+    codes = pairs[mask]
+    stations = (codes >> PAIR_SHIFT).tolist()
+    products = (codes & ((1 << PAIR_SHIFT) - 1)).tolist()
+    prices = [None if np.isnan(price) else int(price) for price in state[0][mask].tolist()]
+    rows = zip(stations, products, prices, state[1][mask].tolist())
+    if slot is None:
+        return list(rows)
+    return [(*slot, *row) for row in rows]
+
+
+def execute_chunks(
+    conn: Connection, sql: str, rows: List[Tuple], chunk_size: int
+) -> None:
+    """
+    Runs a statement with chunked `executemany` calls.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+        sql (str): The driver SQL.
+        rows (List[Tuple]): The parameters of each row.
+        chunk_size (int): The number of rows per call.
+    """
+    for start in range(0, len(rows), chunk_size):
+        conn.exec_driver_sql(sql, rows[start : start + chunk_size])
+
+
+def load_slot_changes(
+    conn: Connection,
+    facts: pd.DataFrame,
+    policy: str,
+    chunk_size: int,
+    stations: Optional[Iterable[int]] = None,
+) -> Dict[str, int]:
+    """
+    Loads the facts of one date and moment into the change log.
+
+    A price is stored when it differs from the one in force at the previous loaded date
+    and moment, which the `lastprice` table holds when loading after the last one (the
+    live ingest, which only appends). Loading before it (backfills) reconstructs the
+    previous and next prices instead, and adds rows at the next loaded moment where
+    needed to keep its prices. The products of the covered stations missing from a new
+    date and moment are recorded as no longer published, the other stations keep their
+    prices.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+        facts (pd.DataFrame): The facts of the date and moment, with the FactData columns.
+        policy (str): The conflict policy ('update', 'ignore' or 'error').
+        chunk_size (int): The number of rows per `executemany` call.
+        stations (Optional[Iterable[int]]): The StationKey of the stations covered by the
+                                            load. Those of the facts when None.
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+
+    Raises:
+        ValueError: If a price is already loaded with the 'error' policy.
+    """
+    driver = conn.connection.driver_connection
+    slot = (int(facts["DateKey"].iloc[0]), int(facts["MomentKey"].iloc[0]))
+    prev_slot = neighbour_slot(driver, slot, after=False)
+    next_slot = neighbour_slot(driver, slot, after=True)
+    loaded = (
+        driver.execute(
+            "SELECT 1 FROM priceslot WHERE DateKey = ? AND MomentKey = ?", slot
+        ).fetchone()
+        is not None
+    )
+    keyframe = slot_keyframe(driver, slot)
+
+    last = pd.read_sql_query(
+        "SELECT StationKey, ProductKey, PriceMilli, Flags FROM lastprice", driver
+    )
+    empty = last.iloc[:0]
+
+    def as_of(at: Optional[Tuple[int, int]]) -> pd.DataFrame:
+        return empty if at is None else prices_as_of(driver, *at, withdrawn=True)
+
+    # The last prices are those of the last loaded moment, nothing is read after it
+    if next_slot is None:
+        frames = [as_of(prev_slot) if loaded else last, last if loaded else empty, empty]
+    else:
+        frames = [as_of(prev_slot), as_of(slot) if loaded else empty, as_of(next_slot)]
+    pairs = np.union1d(pair_codes(facts), np.concatenate([pair_codes(f) for f in frames]))
+    before, old, after = [price_state(frame, pairs) for frame in frames]
+    given = price_state(facts, pairs)
+
+    is_given, present = ~np.isnan(given[0]), ~np.isnan(old[0])
+    if policy == "error" and (is_given & present).any():
+        raise ValueError(f"{int((is_given & present).sum())} facts are already loaded")
+    inserted = is_given & ~present
+    written = inserted
+    if policy == "update":
+        written = inserted | (is_given & present & ~same_price(given, old))
+    counts = {
+        "inserted": int(inserted.sum()),
+        "updated": int(written.sum() - inserted.sum()),
+        "skipped": len(facts) - int(written.sum()),
+    }
+
+    # Missing prices: kept when reloading, withdrawn for the covered stations otherwise
+    covered = set(stations) if stations is not None else set(facts["StationKey"])
+    fallback = old
+    if not loaded:
+        uncovered = ~np.isin(pairs >> PAIR_SHIFT, list(covered))
+        fallback = (np.where(uncovered, before[0], np.nan), np.where(uncovered, before[1], 0))
+    new = (np.where(written, given[0], fallback[0]), np.where(written, given[1], fallback[1]))
+
+    table = PriceChange.__table__
+    upsert = sqlite_insert(table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=CHANGE_KEYS,
+        set_={col: upsert.excluded[col] for col in ["PriceMilli", "Flags"]},
+    )
+    upsert_sql, _ = compile_driver_sql(upsert, conn, CHANGE_KEYS + ["PriceMilli", "Flags"])
+    remove = delete(table).where(and_(*[table.c[col] == bindparam(col) for col in CHANGE_KEYS]))
+    remove_sql, _ = compile_driver_sql(remove, conn, CHANGE_KEYS)
+
+    def rewrite(at, state, needed, stored, unchanged) -> None:
+        upserted = needed & (~stored | ~unchanged)
+        execute_chunks(conn, upsert_sql, state_rows(pairs, state, upserted, at), chunk_size)
+        removed = [row[:4] for row in state_rows(pairs, state, stored & ~needed, at)]
+        execute_chunks(conn, remove_sql, removed, chunk_size)
+
+    # Rows at the date and moment, then at the next one, which keeps its prices
+    is_keyframe = keyframe == slot
+    rewrite(
+        slot,
+        new,
+        stored_rows(new, before, is_keyframe),
+        loaded & stored_rows(old, before, is_keyframe),
+        same_price(new, old),
+    )
+    if next_slot is not None:
+        next_keyframe = slot_keyframe(driver, next_slot) == next_slot
+        rewrite(
+            next_slot,
+            after,
+            stored_rows(after, new, next_keyframe),
+            stored_rows(after, old if loaded else before, next_keyframe),
+            np.ones(len(pairs), dtype=bool),
+        )
+
+    # The last prices move with the last loaded date and moment only
+    if next_slot is None:
+        known = np.isin(pairs, pair_codes(last))
+        moved = ~known | ~same_price(new, price_state(last, pairs))
+        last_table = LastPrice.__table__
+        last_upsert = sqlite_insert(last_table)
+        last_upsert = last_upsert.on_conflict_do_update(
+            index_elements=PAIR_KEYS,
+            set_={col: last_upsert.excluded[col] for col in ["PriceMilli", "Flags"]},
+        )
+        last_sql, _ = compile_driver_sql(
+            last_upsert, conn, PAIR_KEYS + ["PriceMilli", "Flags"]
+        )
+        execute_chunks(conn, last_sql, state_rows(pairs, new, moved), chunk_size)
+
+    if not loaded or written.any():
+        run_keys = facts["RunKey"].dropna()
+        run_key = int(run_keys.iloc[0]) if len(run_keys) else None
+        slot_upsert = sqlite_insert(PriceSlot.__table__)
+        slot_upsert = slot_upsert.on_conflict_do_update(
+            index_elements=["DateKey", "MomentKey"],
+            set_={"RunKey": slot_upsert.excluded.RunKey},
+        )
+        slot_sql, _ = compile_driver_sql(
+            slot_upsert, conn, ["DateKey", "MomentKey", "KeyDateKey", "KeyMomentKey", "RunKey"]
+        )
+        conn.exec_driver_sql(slot_sql, (*slot, *keyframe, run_key))
+    return counts
+
+
+def load_price_changes(
+    facts: pd.DataFrame,
+    engine: Engine,
+    policy: str = "update",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    metrics: Optional[Metrics] = None,
+    stations: Optional[Iterable[int]] = None,
+    before_commit: Optional[Callable[[Connection], None]] = None,
+) -> Dict[str, int]:
+    """
+    Loads facts into the change log layout inside one explicit transaction, one date
+    and moment at a time in chronological order, with the policies and counts of
+    `load_facts` (see `load_slot_changes`). Only the prices that changed are written,
+    besides the keyframes.
+
+    Args:
+        facts (pd.DataFrame): The facts to load, with the FactData columns.
+        engine (Engine): The database engine.
+        policy (str): The conflict policy ('update', 'ignore' or 'error').
+        chunk_size (int): The number of rows per `executemany` call.
+        metrics (Optional[Metrics]): Collects the commit latency.
+        stations (Optional[Iterable[int]]): The StationKey of the stations covered by the
+                                            load, whose missing products are recorded
+                                            as no longer published. Those of the facts
+                                            when None.
+        before_commit (Optional[Callable[[Connection], None]]): Writes more rows
+                                                               in the transaction of the facts
+                                                               (e.g., the price statistics).
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+
+    Raises:
+        ValueError: If the policy is unknown, or a price is already loaded with the
+                    'error' policy (the whole load is rolled back).
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown load policy: {policy}")
+
+    metrics = metrics or Metrics()
+    stations = list(stations) if stations is not None else None
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    with engine.begin() as conn:
+        for _, slot_facts in facts.groupby(["DateKey", "MomentKey"], sort=True):
+            slot_counts = load_slot_changes(conn, slot_facts, policy, chunk_size, stations)
+            for key, value in slot_counts.items():
+                counts[key] += value
+
+        if before_commit is not None:
+            before_commit(conn)
+
+        # The transaction commits when the block exits
+        commit_started = time.perf_counter()
+    metrics.observe("commit", time.perf_counter() - commit_started)
+
+    return counts
+
+
+def create_change_tables(conn: Any) -> None:
+    """
+    Creates the tables of the change log layout when they do not exist yet.
+
+    Args:
+        conn (Any): A DB-API connection to the database.
+    """
+    dialect = sqlite.dialect()
+    for model in [PriceChange, LastPrice, PriceSlot]:
+        table = CreateTable(model.__table__, if_not_exists=True)
+        conn.execute(str(table.compile(dialect=dialect)))
+
+
+def rebuild_last_prices(conn: Any) -> int:
+    """
+    Rebuilds the `lastprice` table with the prices in force at the last loaded date and
+    moment.
+
+    Args:
+        conn (Any): A DB-API connection to the database.
+
+    Returns:
+        int: The number of stations and products.
+    """
+    conn.execute("DELETE FROM lastprice")
+    row = conn.execute(
+        "SELECT DateKey, MomentKey, KeyDateKey, KeyMomentKey FROM priceslot "
+        "ORDER BY DateKey DESC, MomentKey DESC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        return 0
+    conn.execute(
+        f"INSERT INTO lastprice (StationKey, ProductKey, PriceMilli, Flags) {LATEST_QUERY}",
+        (*row[2:], *row[:2]),
+    )
+    return conn.execute("SELECT COUNT(*) FROM lastprice").fetchone()[0]
+
+
+def to_changes(conn: sqlite3.Connection) -> int:
+    """
+    Rebuilds the facts of a database in the change log layout: `factdata` is reduced
+    to its price changes and keyframes in `pricechange`, and replaced by the view
+    reconstructing it.
+
+    A change is stored at the first price of a station and product, when its price or
+    flags differ from the previous loaded date and moment, and after its last price
+    before a gap (a missing price, as no longer published).
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database, inside a transaction.
+
+    Returns:
+        int: The number of rows of `pricechange`.
+    """
+    create_change_tables(conn)
+    clear_changes(conn)
+
+    # The first moment loaded in each period is its keyframe
+    slots, keyframe, period = [], None, None
+    for day_key, moment_key, run_key in conn.execute(
+        "SELECT DateKey, MomentKey, MAX(RunKey) FROM factdata "
+        "GROUP BY DateKey, MomentKey ORDER BY DateKey, MomentKey"
+    ).fetchall():
+        if keyframe_period(day_key) != period:
+            keyframe, period = (day_key, moment_key), keyframe_period(day_key)
+        slots.append((day_key, moment_key, *keyframe, run_key))
+    conn.executemany(
+        "INSERT INTO priceslot (DateKey, MomentKey, KeyDateKey, KeyMomentKey, RunKey) "
+        "VALUES (?, ?, ?, ?, ?)",
+        slots,
+    )
+
+    conn.execute("DROP TABLE IF EXISTS temp.slot_number")
+    conn.execute(
+        "CREATE TEMP TABLE slot_number "
+        "(SlotNo INTEGER PRIMARY KEY, DateKey INTEGER, MomentKey INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO temp.slot_number (DateKey, MomentKey) VALUES (?, ?)",
+        [slot[:2] for slot in slots],
+    )
+    conn.execute("CREATE UNIQUE INDEX temp.ix_slot_number ON slot_number (DateKey, MomentKey)")
+    conn.execute(
+        """
+        INSERT INTO pricechange
+            (DateKey, MomentKey, StationKey, ProductKey, PriceMilli, Flags)
+        WITH observed AS (
+            SELECT
+                f.StationKey, f.ProductKey, n.SlotNo, f.PriceMilli, f.Flags,
+                LAG(n.SlotNo) OVER w AS PrevSlotNo,
+                LAG(f.PriceMilli) OVER w AS PrevPrice,
+                LAG(f.Flags) OVER w AS PrevFlags,
+                LEAD(n.SlotNo) OVER w AS NextSlotNo
+            FROM factdata f
+            JOIN temp.slot_number n ON n.DateKey = f.DateKey AND n.MomentKey = f.MomentKey
+            WINDOW w AS (PARTITION BY f.StationKey, f.ProductKey ORDER BY n.SlotNo)
+        )
+        SELECT n.DateKey, n.MomentKey, o.StationKey, o.ProductKey, o.PriceMilli, o.Flags
+        FROM observed o
+        JOIN temp.slot_number n ON n.SlotNo = o.SlotNo
+        WHERE o.PrevSlotNo IS NULL OR o.PrevSlotNo != o.SlotNo - 1
+            OR o.PrevPrice != o.PriceMilli OR o.PrevFlags != o.Flags
+        UNION ALL
+        SELECT n.DateKey, n.MomentKey, o.StationKey, o.ProductKey, NULL, 0
+        FROM observed o
+        JOIN temp.slot_number n ON n.SlotNo = o.SlotNo + 1
+        WHERE o.NextSlotNo IS NULL OR o.NextSlotNo != o.SlotNo + 1
+        UNION
+        SELECT f.DateKey, f.MomentKey, f.StationKey, f.ProductKey, f.PriceMilli, f.Flags
+        FROM factdata f
+        JOIN priceslot s ON s.DateKey = f.DateKey AND s.MomentKey = f.MomentKey
+        WHERE s.KeyDateKey = s.DateKey AND s.KeyMomentKey = s.MomentKey
+        ORDER BY 1, 2, 3, 4
+        """
+    )
+    conn.execute("DROP TABLE temp.slot_number")
+    rebuild_last_prices(conn)
+
+    for index in FactData.__table__.indexes:
+        conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+    conn.execute("DROP TABLE factdata")
+    conn.execute(f"CREATE VIEW factdata AS {changes_select()}")
+    return conn.execute("SELECT COUNT(*) FROM pricechange").fetchone()[0]
+
+
+def delete_slots(conn: Any, first_key: int) -> None:
+    """
+    Deletes the dates from a DateKey on from the change log, the last prices going back
+    to those of the dates kept.
+
+    Args:
+        conn (Any): A DB-API connection to the database.
+        first_key (int): The first DateKey deleted.
+    """
+    conn.execute("DELETE FROM pricechange WHERE DateKey >= ?", (first_key,))
+    conn.execute("DELETE FROM priceslot WHERE DateKey >= ?", (first_key,))
+    rebuild_last_prices(conn)
+
+
+def clear_changes(conn: Any) -> None:
+    """
+    Empties the tables of the change log layout.
+
+    Args:
+        conn (Any): A DB-API connection to the database.
+    """
+    for table in ["pricechange", "lastprice", "priceslot"]:
+        conn.execute(f"DELETE FROM {table}")
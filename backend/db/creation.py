@@ -2,33 +2,47 @@
 import os
 
 # Modules
-from sqlmodel import SQLModel, create_engine
-from datetime import datetime
-from db.models import DimDate, DimStation, DimProduct, DimMoment, FactData
+from sqlalchemy.engine import Engine
+from db.engine import get_engine
+from db.migrations import migrate
+from logging import Logger
 from utils.logger_config import setup_logger
 from dotenv import load_dotenv
 
-# Loading env vars
-load_dotenv()
-database_url = os.getenv("DATABASE_URL")
-
-# Logger configuration for this script
-log_path = "logs/database_creation.log"
-logger = setup_logger("database_creation", log_path)
-
-
-# Engine configuration
-engine = create_engine(database_url, echo=True)
-
 
 # Function to database
-def create_database():
-    SQLModel.metadata.create_all(engine)
-
-
-# Creating database
-try:
-    create_database()
-    logger.info("Database created successfully")
-except Exception as e:
-    logger.error(f"Error during database creation: {e}")
+def create_database(engine: Engine, logger: Logger) -> None:
+    """
+    Creates the tables of the star schema, upgrading an existing database.
+
+    Args:
+        engine (Engine): The database engine.
+        logger (Logger): The logger of the running task.
+    """
+    # Creates missing tables and upgrades existing databases
+    for change in migrate(engine):
+        logger.info(f"Applied {change}")
+
+
+def main() -> None:
+    """
+    Creates the configured database.
+    """
+    # Loading env vars
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+
+    # Logger configuration for this script
+    log_path = "logs/database_creation.log"
+    logger = setup_logger("database_creation", log_path)
+
+    # Creating database
+    try:
+        create_database(get_engine(database_url), logger)
+        logger.info("Database created successfully")
+    except Exception as e:
+        logger.error(f"Error during database creation: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Libraries
+import os
+import sqlite3
+
+# Modules
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import create_engine
+from typing import Any, Dict, Optional
+
+# Engines shared within the process, by database URL
+_engines = {}
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """
+    Reads the SQLite settings applied to every connection from the environment.
+
+    WAL lets the dashboard read while an ingest writes, `synchronous=NORMAL` is durable
+    with WAL except for the last commits on a power loss, and the page cache, memory map
+    and in-memory temporary storage speed up the reads of the fact table.
+
+    Returns:
+        Dict[str, Any]: The values by pragma name.
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # KiB when negative
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    }
+
+
+def apply_pragmas(conn: Any, pragmas: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Applies the SQLite settings to a connection.
+
+    Args:
+        conn (Any): A DB-API connection to a SQLite database.
+        pragmas (Optional[Dict[str, Any]]): The values by pragma name. Those of the
+                                            environment when None.
+    """
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    cursor = conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def get_engine(database_url: str) -> Engine:
+    """
+    Returns the engine of a database, creating it on first use. SQLite connections
+    are opened with the settings of `sqlite_pragmas`.
+
+    Args:
+        database_url (str): The SQLAlchemy URL of the database (e.g., 'sqlite:///star_schema.db').
+
+    Returns:
+        Engine: The engine, shared by every caller in the process.
+    """
+    if database_url not in _engines:
+        engine = create_engine(database_url)
+        if engine.dialect.name == "sqlite":
+            pragmas = sqlite_pragmas()
+            event.listen(
+                engine,
+                "connect",
+                lambda dbapi_conn, _: apply_pragmas(dbapi_conn, pragmas),
+            )
+        _engines[database_url] = engine
+    return _engines[database_url]
+
+
+def connect(database_name: str) -> sqlite3.Connection:
+    """
+    Opens a raw connection to a SQLite database with the settings of `sqlite_pragmas`,
+    for pandas reads.
+
+    Args:
+        database_name (str): The path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: The connection. The caller closes it.
+    """
+    conn = sqlite3.connect(database_name)
+    apply_pragmas(conn)
+    return conn
@@ -0,0 +1,385 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import sqlite3
+import time
+
+# Modules
+from db.changelog import changes_select, clear_changes, to_changes
+from db.engine import connect
+from db.models import WIDE_FLAG_BITS, WIDE_PRODUCTS, FactData, FactWide
+from db.partitions import FactPartitions, partition_dir
+from etl.load import DEFAULT_CHUNK_SIZE, POLICIES, compile_driver_sql
+from etl.metrics import Metrics
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Fact storage layouts: one row per price (`factdata` table), one row per date, moment
+# and station with every price (`factwide` table) or one row per price change
+# (`pricechange` table), the last two read through a `factdata` view
+FACT_LAYOUTS = ["long", "wide", "changes"]
+WIDE_KEYS = ["MomentKey", "DateKey", "StationKey"]
+FLAG_MASK = (1 << WIDE_FLAG_BITS) - 1
+
+
+def price_column(product_key: int) -> str:
+    """
+    Returns the FactWide column of the price of a product.
+
+    Args:
+        product_key (int): The ProductKey, from 1 to `WIDE_PRODUCTS`.
+
+    Returns:
+        str: The column name (e.g., 'PriceMilli6').
+    """
+    return f"PriceMilli{product_key}"
+
+
+PRICE_COLUMNS = [price_column(key) for key in range(1, WIDE_PRODUCTS + 1)]
+
+
+def fact_layout(conn: sqlite3.Connection) -> str:
+    """
+    Detects the fact layout of a database from the `factdata` view: 'wide' over
+    `factwide`, 'changes' over `pricechange`, 'long' when it is a table.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+
+    Returns:
+        str: The layout ('long', 'wide' or 'changes').
+    """
+    row = conn.execute(
+        "SELECT type, sql FROM sqlite_master WHERE name = 'factdata'"
+    ).fetchone()
+    if row is None or row[0] != "view":
+        return "long"
+    return "changes" if "pricechange" in row[1] else "wide"
+
+
+def long_select() -> str:
+    """
+    Builds the query unpivoting `factwide` into the long form, one row per price with
+    the FactData columns. Each wide row is joined with the products, so the filters on
+    the moment, date and station still seek the `factwide` primary key.
+
+    Returns:
+        str: The query.
+    """
+    cases = " ".join(
+        f"WHEN {key} THEN factwide.{column}"
+        for key, column in enumerate(PRICE_COLUMNS, start=1)
+    )
+    price = f"CASE dimproduct.ProductKey {cases} END"
+    return f"""
+    SELECT
+        factwide.DateKey,
+        factwide.StationKey,
+        dimproduct.ProductKey,
+        factwide.MomentKey,
+        {price} AS PriceMilli,
+        factwide.RunKey,
+        (factwide.Flags >> ({WIDE_FLAG_BITS} * (dimproduct.ProductKey - 1))) & {FLAG_MASK}
+            AS Flags
+    FROM factwide
+    CROSS JOIN dimproduct
+    WHERE {price} IS NOT NULL
+    """
+
+
+def pivot_wide(
+    facts: pd.DataFrame,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pivots facts in the long form into FactWide rows, as arrays.
+
+    Args:
+        facts (pd.DataFrame): The facts, with the FactData columns.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The `WIDE_KEYS` of each
+            row (sorted in primary key order), its prices by product (NaN when missing),
+            its packed flags and its RunKey (NaN when missing).
+
+    Raises:
+        ValueError: If a ProductKey has no price column.
+    """
+    products = facts["ProductKey"].to_numpy(dtype=np.int64)
+    if len(products) and (products.min() < 1 or products.max() > WIDE_PRODUCTS):
+        raise ValueError(f"The wide layout stores ProductKey 1 to {WIDE_PRODUCTS} only")
+
+    keys, codes = np.unique(
+        facts[WIDE_KEYS].to_numpy(dtype=np.int64), axis=0, return_inverse=True
+    )
+    codes = codes.reshape(-1)
+    prices = np.full((len(keys), WIDE_PRODUCTS), np.nan)
+    prices[codes, products - 1] = facts["PriceMilli"].to_numpy(dtype=np.float64)
+    flags = np.zeros(len(keys), dtype=np.int64)
+    shifted = facts["Flags"].to_numpy(dtype=np.int64) << (WIDE_FLAG_BITS * (products - 1))
+    np.bitwise_or.at(flags, codes, shifted)
+    # The facts of a row come from the same load
+    run_keys = np.full(len(keys), np.nan)
+    run_keys[codes] = facts["RunKey"].to_numpy(dtype=np.float64, na_value=np.nan)
+    return keys, prices, flags, run_keys
+
+
+def nullable_ints(values: np.ndarray) -> List:
+    """
+    Converts floats with NaN into integers with None, as the driver binds them.
+
+    Args:
+        values (np.ndarray): The values (of any shape).
+
+    Returns:
+        List: The values as (nested lists of) Python integers, None for NaN.
+    """
+    missing = np.isnan(values)
+    ints = np.where(missing, 0, values).astype(np.int64).astype(object)
+    ints[missing] = None
+    return ints.tolist()
+
+
+def read_wide(conn: Connection, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the stored FactWide rows of some dates, moments and stations, one primary key
+    seek per date and moment.
+
+    Args:
+        conn (Connection): A connection of the database.
+        keys (np.ndarray): The `WIDE_KEYS` of the rows looked up.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The stored prices (NaN where there is none) and
+                                       flags (0 where there is none), aligned with `keys`.
+    """
+    prices = np.full((len(keys), WIDE_PRODUCTS), np.nan)
+    flags = np.zeros(len(keys), dtype=np.int64)
+    positions = {tuple(key): i for i, key in enumerate(keys.tolist())}
+    for moment_key, day_key in {(row[0], row[1]) for row in positions}:
+        for row in conn.exec_driver_sql(
+            f"SELECT StationKey, Flags, {', '.join(PRICE_COLUMNS)} FROM factwide "
+            "WHERE MomentKey = ? AND DateKey = ?",
+            (moment_key, day_key),
+        ):
+            i = positions.get((moment_key, day_key, row[0]))
+            if i is not None:
+                flags[i] = row[1]
+                prices[i] = [np.nan if price is None else price for price in row[2:]]
+    return prices, flags
+
+
+def load_wide_facts(
+    facts: pd.DataFrame,
+    engine: Engine,
+    policy: str = "update",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    metrics: Optional[Metrics] = None,
+    before_commit: Optional[Callable[[Connection], None]] = None,
+) -> Dict[str, int]:
+    """
+    Loads facts into the wide layout inside one explicit transaction, with the policies
+    and counts of `load_facts` applied to each price. The stored rows of the stations
+    are read and merged with the new prices first, so each station is written once
+    with all of its prices.
+
+    Args:
+        facts (pd.DataFrame): The facts to load, with the FactData columns.
+        engine (Engine): The database engine.
+        policy (str): The conflict policy ('update', 'ignore' or 'error').
+        chunk_size (int): The number of rows per `executemany` call.
+        metrics (Optional[Metrics]): Collects the commit latency.
+        before_commit (Optional[Callable[[Connection], None]]): Writes more rows
+                                                               in the transaction of the facts
+                                                               (e.g., the price statistics).
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+
+    Raises:
+        ValueError: If the policy is unknown, or a price is already loaded with the
+                    'error' policy (the whole load is rolled back).
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown load policy: {policy}")
+
+    metrics = metrics or Metrics()
+    keys, new_prices, new_flags, run_keys = pivot_wide(facts)
+    value_cols = ["RunKey", "Flags"] + PRICE_COLUMNS
+    stmt = sqlite_insert(FactWide.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=WIDE_KEYS, set_={col: stmt.excluded[col] for col in value_cols}
+    )
+
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    with engine.begin() as conn:
+        old_prices, old_flags = read_wide(conn, keys)
+        given, present = ~np.isnan(new_prices), ~np.isnan(old_prices)
+        if policy == "error" and (given & present).any():
+            raise ValueError(f"{int((given & present).sum())} facts are already loaded")
+
+        # Flags of each product, an update rewrites the prices whose flags changed too
+        shifts = WIDE_FLAG_BITS * np.arange(WIDE_PRODUCTS, dtype=np.int64)
+        new_product_flags = (new_flags[:, None] >> shifts) & FLAG_MASK
+        old_product_flags = (old_flags[:, None] >> shifts) & FLAG_MASK
+        changed = (new_prices != old_prices) | (new_product_flags != old_product_flags)
+        inserted = given & ~present
+        written = inserted
+        if policy == "update":
+            written = inserted | (given & present & changed)
+        counts["inserted"] = int(inserted.sum())
+        counts["updated"] = int(written.sum()) - counts["inserted"]
+        counts["skipped"] = len(facts) - int(written.sum())
+
+        # The rows with a written price, keeping the stored prices and flags of the rest
+        rows = written.any(axis=1)
+        mask = (written[rows] * (FLAG_MASK << shifts)).sum(axis=1)
+        flags = (old_flags[rows] & ~mask) | (new_flags[rows] & mask)
+        prices = np.where(written, new_prices, old_prices)[rows]
+        columns = dict(zip(WIDE_KEYS, keys[rows].T.tolist()))
+        columns["RunKey"] = nullable_ints(run_keys[rows])
+        columns["Flags"] = flags.tolist()
+        columns.update(zip(PRICE_COLUMNS, nullable_ints(prices.T)))
+
+        sql, params = compile_driver_sql(stmt, conn, WIDE_KEYS + value_cols)
+        out_rows = list(zip(*[columns[param] for param in params]))
+        for start in range(0, len(out_rows), chunk_size):
+            conn.exec_driver_sql(sql, out_rows[start : start + chunk_size])
+
+        if before_commit is not None:
+            before_commit(conn)
+
+        # The transaction commits when the block exits
+        commit_started = time.perf_counter()
+    metrics.observe("commit", time.perf_counter() - commit_started)
+
+    return counts
+
+
+def to_wide(conn: sqlite3.Connection) -> int:
+    """
+    Rebuilds the facts of a database in the wide layout: `factdata` is pivoted into
+    `factwide` and replaced by the view over it.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database, inside a transaction.
+
+    Returns:
+        int: The number of wide rows.
+
+    Raises:
+        ValueError: If a fact has a ProductKey without price column.
+    """
+    outside = conn.execute(
+        f"SELECT COUNT(*) FROM factdata WHERE ProductKey NOT BETWEEN 1 AND {WIDE_PRODUCTS}"
+    ).fetchone()[0]
+    if outside:
+        raise ValueError(f"The wide layout stores ProductKey 1 to {WIDE_PRODUCTS} only")
+
+    prices = ", ".join(
+        f"MAX(CASE WHEN ProductKey = {key} THEN PriceMilli END)"
+        for key in range(1, WIDE_PRODUCTS + 1)
+    )
+    wide_table = CreateTable(FactWide.__table__, if_not_exists=True)
+    conn.execute(str(wide_table.compile(dialect=sqlite.dialect())))
+    conn.execute("DELETE FROM factwide")
+    conn.execute(
+        f"""
+        INSERT INTO factwide ({', '.join(WIDE_KEYS)}, RunKey, Flags, {', '.join(PRICE_COLUMNS)})
+        SELECT
+            MomentKey, DateKey, StationKey, MAX(RunKey),
+            SUM(Flags << ({WIDE_FLAG_BITS} * (ProductKey - 1))),
+            {prices}
+        FROM factdata
+        GROUP BY MomentKey, DateKey, StationKey
+        ORDER BY MomentKey, DateKey, StationKey
+        """
+    )
+    for index in FactData.__table__.indexes:
+        conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+    conn.execute("DROP TABLE factdata")
+    conn.execute(f"CREATE VIEW factdata AS {long_select()}")
+    # With the statistics, date ranges of any moment skip-scan the primary key
+    conn.execute("ANALYZE factwide")
+    return conn.execute("SELECT COUNT(*) FROM factwide").fetchone()[0]
+
+
+def to_long(conn: sqlite3.Connection, layout: str = "wide") -> int:
+    """
+    Rebuilds the facts of a database in the long layout: the `factdata` view is
+    replaced by the table, filled from the tables of the current layout, which are
+    emptied.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database, inside a transaction.
+        layout (str): The current layout ('wide' or 'changes').
+
+    Returns:
+        int: The number of facts.
+    """
+    dialect = sqlite.dialect()
+    table = FactData.__table__
+    select = long_select() if layout == "wide" else changes_select()
+    conn.execute("DROP VIEW factdata")
+    conn.execute(str(CreateTable(table).compile(dialect=dialect)))
+    conn.execute(
+        f"""
+        INSERT INTO factdata
+        SELECT * FROM ({select})
+        ORDER BY DateKey, StationKey, ProductKey, MomentKey
+        """
+    )
+    for index in table.indexes:
+        conn.execute(str(CreateIndex(index).compile(dialect=dialect)))
+    if layout == "wide":
+        conn.execute("DELETE FROM factwide")
+    else:
+        clear_changes(conn)
+    return conn.execute("SELECT COUNT(*) FROM factdata").fetchone()[0]
+
+
+def convert_facts(database_name: str, layout: str) -> int:
+    """
+    Switches the facts of a database to a layout, in one transaction, going through the
+    long layout between the other two. Nothing is done when the database already has it.
+
+    Args:
+        database_name (str): The path of the SQLite database.
+        layout (str): The target layout ('long', 'wide' or 'changes').
+
+    Returns:
+        int: The number of rows of the target layout, 0 when nothing was done.
+
+    Raises:
+        ValueError: If the layout is unknown, or the facts are partitioned by province
+                    (the partitions always use the long layout).
+    """
+    if layout not in FACT_LAYOUTS:
+        raise ValueError(f"Unknown fact layout: {layout}")
+    root = partition_dir(database_name)
+    if layout != "long" and root.exists() and FactPartitions(root).provinces():
+        raise ValueError(f"The {layout} layout does not support province partitions")
+
+    conn = connect(database_name)
+    try:
+        current = fact_layout(conn)
+        if current == layout:
+            return 0
+        conn.execute("BEGIN")
+        try:
+            if current != "long":
+                rows = to_long(conn, current)
+            if layout == "wide":
+                rows = to_wide(conn)
+            elif layout == "changes":
+                rows = to_changes(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return rows
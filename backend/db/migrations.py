@@ -0,0 +1,374 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Modules
+from db.models import FLAG_UNRELIABLE, PRICE_SCALE, FactData, IngestRun
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import SQLModel
+from typing import Any, Callable, Dict, List, Tuple
+
+# Tables must be registered in the metadata
+import db.models  # noqa: F401
+
+
+def add_missing_columns(conn: Connection) -> List[str]:
+    """
+    Adds to the existing tables the nullable columns declared in the models but not
+    present in the database yet.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+
+    Returns:
+        List[str]: The added columns, as 'table.column'.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_cols = {col["name"] for col in inspector.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing_cols or not col.nullable:
+                continue
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.execute(
+                text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}')
+            )
+            added.append(f"{table.name}.{col.name}")
+    return added
+
+
+def create_missing_indexes(conn: Connection) -> None:
+    """
+    Creates the indexes declared in the models but not present in the database yet.
+    Tables replaced by a view (`factdata` in the wide layout) are skipped.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+    """
+    views = set(inspect(conn).get_view_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name in views:
+            continue
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def remap_date_keys(conn: Any, mapping: List[Tuple[int, int]]) -> None:
+    """
+    Replaces the DateKey of the facts of a database following a mapping.
+
+    Args:
+        conn (Any): A DB-API connection to the database holding a `factdata` table.
+        mapping (List[Tuple[int, int]]): The old and new DateKey of each date.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DROP TABLE IF EXISTS temp.date_key_map")
+        cursor.execute(
+            "CREATE TEMP TABLE date_key_map (OldKey INTEGER PRIMARY KEY, NewKey INTEGER)"
+        )
+        cursor.executemany("INSERT INTO temp.date_key_map VALUES (?, ?)", mapping)
+        # Facts duplicated under two keys of the same date keep the first one
+        cursor.execute(
+            """
+            UPDATE OR IGNORE factdata SET DateKey = m.NewKey
+            FROM temp.date_key_map m WHERE factdata.DateKey = m.OldKey
+            """
+        )
+        cursor.execute(
+            "DELETE FROM factdata WHERE DateKey IN (SELECT OldKey FROM temp.date_key_map)"
+        )
+        cursor.execute("DROP TABLE temp.date_key_map")
+    finally:
+        cursor.close()
+
+
+def integer_date_keys(conn: Connection) -> None:
+    """
+    Switches the surrogate date keys to YYYYMMDD integers (e.g., 20241231), in the date
+    dimension and the facts, including the province partitions of the facts.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+    """
+    mapping = [
+        (old_key, new_key)
+        for old_key, new_key in conn.execute(
+            text(
+                "SELECT DateKey, CAST(strftime('%Y%m%d', DateID) AS INTEGER) FROM dimdate"
+            )
+        )
+        if old_key != new_key
+    ]
+    if not mapping:
+        return
+
+    # Partitions first: if the migration stops, it runs again on the old main keys
+    from db.engine import connect
+    from db.partitions import FactPartitions, partition_dir
+
+    if conn.engine.url.database:
+        root = partition_dir(conn.engine.url.database)
+        if root.exists():
+            partitions = FactPartitions(root)
+            for province in partitions.provinces():
+                partition_conn = connect(str(partitions.path(province)))
+                try:
+                    remap_date_keys(partition_conn, mapping)
+                    partition_conn.commit()
+                finally:
+                    partition_conn.close()
+
+    remap_date_keys(conn.connection.driver_connection, mapping)
+
+    # Repeated dates keep their first row
+    conn.execute(
+        text(
+            """
+            DELETE FROM dimdate WHERE DateKey NOT IN (
+                SELECT MIN(DateKey) FROM dimdate GROUP BY date(DateID)
+            )
+            """
+        )
+    )
+    conn.execute(
+        text("UPDATE dimdate SET DateKey = CAST(strftime('%Y%m%d', DateID) AS INTEGER)")
+    )
+
+
+def compact_fact_table(conn: Any, run_keys: Dict[str, int]) -> None:
+    """
+    Rebuilds the `factdata` table of a database with the compact encoding: the price in
+    integer thousandths, the RunKey of the load and the flags, instead of the REAL
+    price, the LoadAt timestamp and the IsReliable boolean. Nothing is done when the
+    table already has it.
+
+    Args:
+        conn (Any): A DB-API connection to the database holding a `factdata` table.
+        run_keys (Dict[str, int]): The RunKey of each stored LoadAt value.
+    """
+    cursor = conn.cursor()
+    try:
+        cols = {row[1] for row in cursor.execute("PRAGMA table_info(factdata)")}
+        if "Price" not in cols:
+            return
+
+        cursor.execute("DROP TABLE IF EXISTS temp.run_key_map")
+        # Same affinity as factdata.LoadAt, so the join seeks the key
+        cursor.execute(
+            "CREATE TEMP TABLE run_key_map (LoadAt DATETIME PRIMARY KEY, RunKey INTEGER)"
+        )
+        cursor.executemany("INSERT INTO temp.run_key_map VALUES (?, ?)", run_keys.items())
+
+        # The indexes keep their names, so they go with the old table
+        indexes = [
+            row[0]
+            for row in cursor.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'factdata' AND sql IS NOT NULL"
+            )
+        ]
+        for name in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+        cursor.execute("ALTER TABLE factdata RENAME TO factdata_legacy")
+
+        table = FactData.__table__
+        dialect = sqlite.dialect()
+        cursor.execute(str(CreateTable(table).compile(dialect=dialect)))
+        cursor.execute(
+            f"""
+            INSERT INTO factdata
+                (DateKey, StationKey, ProductKey, MomentKey, PriceMilli, RunKey, Flags)
+            SELECT
+                f.DateKey, f.StationKey, f.ProductKey, f.MomentKey,
+                CAST(ROUND(f.Price * {PRICE_SCALE}) AS INTEGER),
+                m.RunKey,
+                CASE WHEN f.IsReliable THEN 0 ELSE {FLAG_UNRELIABLE} END
+            FROM factdata_legacy f
+            LEFT JOIN temp.run_key_map m ON m.LoadAt = f.LoadAt
+            ORDER BY f.DateKey, f.StationKey, f.ProductKey, f.MomentKey
+            """
+        )
+        cursor.execute("DROP TABLE factdata_legacy")
+        for index in table.indexes:
+            cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+        cursor.execute("DROP TABLE temp.run_key_map")
+    finally:
+        cursor.close()
+
+
+def compact_facts(conn: Connection) -> None:
+    """
+    Switches the facts to the compact encoding (see `compact_fact_table`), in the main
+    database, the province partitions and the Parquet archive. Every distinct LoadAt of
+    the old facts becomes a 'migrated' run of the ingest run journal.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+    """
+    from db.archive import FactArchive, archive_dir
+    from db.engine import connect
+    from db.partitions import FactPartitions, partition_dir
+
+    sources = [conn.connection.driver_connection]
+    archive = None
+    database = conn.engine.url.database
+    if database:
+        if partition_dir(database).exists():
+            partitions = FactPartitions(partition_dir(database))
+            sources += [connect(str(partitions.path(p))) for p in partitions.provinces()]
+        if archive_dir(database).exists():
+            archive = FactArchive(archive_dir(database))
+
+    try:
+        # Counting the facts of every load
+        loads = []
+        for source in sources:
+            cols = {row[1] for row in source.execute("PRAGMA table_info(factdata)")}
+            if "Price" in cols:
+                loads += source.execute(
+                    "SELECT LoadAt, COUNT(*) FROM factdata GROUP BY LoadAt"
+                ).fetchall()
+        legacy_months = []
+        if archive is not None:
+            for month in archive.months():
+                if "LoadAt" in pq.read_schema(archive.path(month)).names:
+                    legacy_months.append(month)
+                    stamps = pq.read_table(archive.path(month), columns=["LoadAt"])
+                    counts = stamps.column("LoadAt").to_pandas().value_counts()
+                    loads += [(str(stamp), int(n)) for stamp, n in counts.items()]
+        if not loads:
+            return
+
+        # One migrated run per load timestamp
+        raw = pd.DataFrame(loads, columns=["LoadAt", "Facts"])
+        raw["Stamp"] = pd.to_datetime(raw["LoadAt"], format="ISO8601")
+        runs = raw.groupby("Stamp")["Facts"].sum()
+        stamp_keys = {}
+        for stamp, facts in runs.items():
+            started = stamp.to_pydatetime()
+            row = {
+                "Day": started.date(),
+                "Status": "migrated",
+                "Source": "migration",
+                "StartedAt": started,
+                "FinishedAt": started,
+                "TotalSeconds": 0.0,
+                "RowsInserted": int(facts),
+            }
+            result = conn.execute(insert(IngestRun.__table__), row)
+            stamp_keys[stamp] = result.inserted_primary_key[0]
+        run_keys = dict(zip(raw["LoadAt"], raw["Stamp"].map(stamp_keys)))
+
+        # Partitions first, the main table goes with the transaction
+        for source in sources[1:]:
+            compact_fact_table(source, run_keys)
+            source.commit()
+        compact_fact_table(sources[0], run_keys)
+
+        for month in legacy_months:
+            facts = pq.read_table(archive.path(month)).to_pandas()
+            facts["PriceMilli"] = (facts.pop("Price") * PRICE_SCALE).round().astype("int64")
+            facts["RunKey"] = pd.to_datetime(facts.pop("LoadAt")).map(stamp_keys)
+            facts["Flags"] = np.where(facts.pop("IsReliable"), 0, FLAG_UNRELIABLE)
+            archive.write_month(month, facts, merge=False)
+    finally:
+        for source in sources[1:]:
+            source.close()
+
+
+def flag_covering_index(conn: Connection) -> None:
+    """
+    Adds the Flags to the index covering the dashboard query, in the main database and
+    the province partitions, so the unreliable prices are left out without reading the
+    fact table. The index keeps its name, so the old one is dropped and created again.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+    """
+    from db.engine import connect
+    from db.partitions import FactPartitions, partition_dir
+
+    sources = [conn.connection.driver_connection]
+    database = conn.engine.url.database
+    if database and partition_dir(database).exists():
+        partitions = FactPartitions(partition_dir(database))
+        sources += [connect(str(partitions.path(p))) for p in partitions.provinces()]
+
+    dialect = sqlite.dialect()
+    try:
+        for source in sources:
+            kind = source.execute(
+                "SELECT type FROM sqlite_master WHERE name = 'factdata'"
+            ).fetchone()
+            # Views of the other layouts have no index
+            if kind is None or kind[0] != "table":
+                continue
+            for index in FactData.__table__.indexes:
+                source.execute(f"DROP INDEX IF EXISTS {index.name}")
+                source.execute(str(CreateIndex(index).compile(dialect=dialect)))
+        for source in sources[1:]:
+            source.commit()
+    finally:
+        for source in sources[1:]:
+            source.close()
+
+
+def station_brands(conn: Connection) -> None:
+    """
+    Classifies the stations loaded before the brand dimension existed into their brand.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+    """
+    from etl.brands import classify_stations
+
+    classify_stations(conn)
+
+
+# Versioned data migrations, applied once each following `PRAGMA user_version`
+MIGRATIONS: List[Tuple[int, Callable[[Connection], None]]] = [
+    (1, integer_date_keys),
+    (2, compact_facts),
+    (3, flag_covering_index),
+    (4, station_brands),
+]
+
+
+def migrate(engine: Engine) -> List[str]:
+    """
+    Brings an existing database up to date with the models.
+
+    Missing tables, nullable columns and indexes are created, then the pending
+    versioned migrations are applied in order. Every step is idempotent, so it is safe
+    to call it on every start.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        List[str]: A description of the applied changes.
+    """
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        applied = add_missing_columns(conn)
+
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+        for target, migration in MIGRATIONS:
+            if target > version:
+                migration(conn)
+                conn.execute(text(f"PRAGMA user_version = {target}"))
+                applied.append(f"migration {target}: {migration.__name__}")
+
+        # After the migrations, which may change the indexed columns
+        create_missing_indexes(conn)
+
+    return applied
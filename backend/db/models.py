@@ -1,18 +1,50 @@
 # Modules
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
+
+
+# Prices are stored as integer thousandths of a euro (e.g., 1.479 € is 1479)
+PRICE_SCALE = 1000
+
+# Bits of FactData.Flags, 0 for a reliable price. Unreliable prices are left out of
+# the KPIs and cheapest stations, the other bits tell why (see `etl/anomalies.py`)
+FLAG_UNRELIABLE = 1
+FLAG_OUT_OF_BOUNDS = 2
+FLAG_JUMP = 4
+FLAG_OUTLIER = 8
+
+# Products with a price column in FactWide (ProductKey 1 to 14)
+WIDE_PRODUCTS = 14
+# Flag bits of each product in FactWide.Flags (product k uses bits 4(k-1) to 4k-1)
+WIDE_FLAG_BITS = 4
 
 
 # Fact Table
 class FactData(SQLModel, table=True):
+    __table_args__ = (
+        # Covers the dashboard query (one moment over the last days), which feeds the KPIs
+        Index(
+            "ix_factdata_moment_date",
+            "MomentKey",
+            "DateKey",
+            "StationKey",
+            "ProductKey",
+            "PriceMilli",
+            "Flags",
+        ),
+        # Clustered on the primary key, which needs no separate index then
+        {"sqlite_with_rowid": False},
+    )
+
     DateKey: int = Field(primary_key=True, foreign_key="dimdate.DateKey")
     StationKey: int = Field(primary_key=True, foreign_key="dimstation.StationKey")
     ProductKey: int = Field(primary_key=True, foreign_key="dimproduct.ProductKey")
     MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
-    Price: float = Field(..., nullable=False)
-    LoadAt: datetime = Field(default=datetime.now(), nullable=False)
-    IsReliable: bool = Field(default=True, nullable=False)
+    PriceMilli: int = Field(..., nullable=False)
+    RunKey: Optional[int] = Field(default=None, foreign_key="ingestrun.RunKey")
+    Flags: int = Field(default=0, nullable=False)
 
     # Relationship
     date: Optional["DimDate"] = Relationship(back_populates="facts")
@@ -21,10 +53,73 @@ class FactData(SQLModel, table=True):
     moment: Optional["DimMoment"] = Relationship(back_populates="facts")
 
 
+# Fact Table of the wide layout (`FACT_LAYOUT=wide`), read through the `factdata` view
+class FactWide(SQLModel, table=True):
+    # One seek per moment and date range, as the dashboard and rollups read them
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
+    DateKey: int = Field(primary_key=True, foreign_key="dimdate.DateKey")
+    StationKey: int = Field(primary_key=True, foreign_key="dimstation.StationKey")
+    RunKey: Optional[int] = Field(default=None, foreign_key="ingestrun.RunKey")
+    Flags: int = Field(default=0, nullable=False)
+    PriceMilli1: Optional[int] = Field(default=None)
+    PriceMilli2: Optional[int] = Field(default=None)
+    PriceMilli3: Optional[int] = Field(default=None)
+    PriceMilli4: Optional[int] = Field(default=None)
+    PriceMilli5: Optional[int] = Field(default=None)
+    PriceMilli6: Optional[int] = Field(default=None)
+    PriceMilli7: Optional[int] = Field(default=None)
+    PriceMilli8: Optional[int] = Field(default=None)
+    PriceMilli9: Optional[int] = Field(default=None)
+    PriceMilli10: Optional[int] = Field(default=None)
+    PriceMilli11: Optional[int] = Field(default=None)
+    PriceMilli12: Optional[int] = Field(default=None)
+    PriceMilli13: Optional[int] = Field(default=None)
+    PriceMilli14: Optional[int] = Field(default=None)
+
+
+# Price changes of the change log layout (`FACT_LAYOUT=changes`), read through the
+# `factdata` view
+class PriceChange(SQLModel, table=True):
+    # Stored in load order: new changes are appended, and the prices in force at any
+    # date and moment are a range since the previous keyframe
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    DateKey: int = Field(primary_key=True, foreign_key="dimdate.DateKey")
+    MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
+    StationKey: int = Field(primary_key=True, foreign_key="dimstation.StationKey")
+    ProductKey: int = Field(primary_key=True, foreign_key="dimproduct.ProductKey")
+    PriceMilli: Optional[int] = Field(default=None)  # None once no longer published
+    Flags: int = Field(default=0, nullable=False)
+
+
+# Price of every station and product at the last date and moment of the change log
+class LastPrice(SQLModel, table=True):
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    StationKey: int = Field(primary_key=True, foreign_key="dimstation.StationKey")
+    ProductKey: int = Field(primary_key=True, foreign_key="dimproduct.ProductKey")
+    PriceMilli: Optional[int] = Field(default=None)
+    Flags: int = Field(default=0, nullable=False)
+
+
+# Dates and moments loaded into the change log (the others have no prices), with the
+# keyframe their prices are reconstructed from
+class PriceSlot(SQLModel, table=True):
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    DateKey: int = Field(primary_key=True, foreign_key="dimdate.DateKey")
+    MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
+    KeyDateKey: int
+    KeyMomentKey: int
+    RunKey: Optional[int] = Field(default=None, foreign_key="ingestrun.RunKey")
+
+
 # Dimension Tables
 class DimDate(SQLModel, table=True):
-    DateKey: Optional[int] = Field(default=None, primary_key=True)
-    DateID: datetime
+    DateKey: Optional[int] = Field(default=None, primary_key=True)  # YYYYMMDD
+    DateID: datetime = Field(index=True)
     CreatedAt: datetime = Field(default=datetime.now())
     EndOfUse: Optional[datetime] = Field(default=None)
 
@@ -49,6 +144,8 @@ class DimStation(SQLModel, table=True):
     StationACID: int
     StationIsland: str = Field(max_length=512)
     StationIslandID: int
+    ContentHash: Optional[int] = Field(default=None)
+    BrandKey: Optional[int] = Field(default=None, foreign_key="dimbrand.BrandKey", index=True)
     CreatedAt: datetime = Field(default=datetime.now())
     EndOfUse: Optional[datetime] = None
 
@@ -56,6 +153,14 @@ class DimStation(SQLModel, table=True):
     facts: list[FactData] = Relationship(back_populates="station")
 
 
+# Brands of the dashboard, classified from the station names (see `etl/brands.py`)
+class DimBrand(SQLModel, table=True):
+    BrandKey: Optional[int] = Field(default=None, primary_key=True)
+    BrandName: str = Field(max_length=64, unique=True)
+    CreatedAt: datetime = Field(default=datetime.now())
+    EndOfUse: Optional[datetime] = None
+
+
 class DimProduct(SQLModel, table=True):
     ProductKey: Optional[int] = Field(default=None, primary_key=True)
     ProductID: str = Field(max_length=64)
@@ -75,3 +180,81 @@ class DimMoment(SQLModel, table=True):
 
     # Relationship
     facts: list[FactData] = Relationship(back_populates="moment")
+
+
+# Aggregate Tables
+class PriceRollup(SQLModel, table=True):
+    # Stored in primary key order: an entity, moment and date range is a single seek
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    GeoLevel: str = Field(primary_key=True, max_length=32)
+    GeoEntity: str = Field(primary_key=True, max_length=512)
+    MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
+    DateKey: int = Field(primary_key=True, foreign_key="dimdate.DateKey")
+    Brand: str = Field(primary_key=True, max_length=64)
+    ProductGroup: str = Field(primary_key=True, max_length=64)
+    MinPrice: float
+    MaxPrice: float
+    SumPrice: float
+    PriceCount: int
+    P25Price: Optional[float] = Field(default=None)
+    MedianPrice: Optional[float] = Field(default=None)
+    P75Price: Optional[float] = Field(default=None)
+
+
+# Rolling price statistics of each station and product, for the anomaly flags
+class PriceStat(SQLModel, table=True):
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    StationKey: int = Field(primary_key=True, foreign_key="dimstation.StationKey")
+    ProductKey: int = Field(primary_key=True, foreign_key="dimproduct.ProductKey")
+    DateKey: int  # Last date and moment folded into the statistics
+    MomentKey: int
+    MeanMilli: float  # Exponentially weighted mean and variance of the accepted prices
+    VarMilli: float
+    LastPriceMilli: int  # Last accepted price
+    Observations: int
+    Rejected: int = Field(default=0)  # Consecutive unreliable prices since then
+
+
+# Control Tables
+class BackfillProgress(SQLModel, table=True):
+    Day: date = Field(primary_key=True)
+    MomentKey: int = Field(primary_key=True, foreign_key="dimmoment.MomentKey")
+    Stations: int
+    Inserted: int
+    Updated: int
+    Skipped: int
+    CompletedAt: datetime = Field(default_factory=datetime.now)
+
+
+class IngestRun(SQLModel, table=True):
+    RunKey: Optional[int] = Field(default=None, primary_key=True)
+    Day: date
+    MomentKey: Optional[int] = Field(default=None, foreign_key="dimmoment.MomentKey")
+    Status: str = Field(max_length=16)  # running, success, failed or migrated
+    Source: Optional[str] = Field(default=None, max_length=16)
+    Snapshot: Optional[str] = Field(default=None, max_length=512)
+    Error: Optional[str] = Field(default=None, max_length=1024)
+    StartedAt: datetime
+    FinishedAt: datetime
+    TotalSeconds: float
+    FetchSeconds: float = Field(default=0.0)
+    ParseSeconds: float = Field(default=0.0)
+    SnapshotSeconds: float = Field(default=0.0)
+    StationSyncSeconds: float = Field(default=0.0)
+    TransformSeconds: float = Field(default=0.0)
+    LoadSeconds: float = Field(default=0.0)
+    CommitSeconds: float = Field(default=0.0)
+    RollupSeconds: Optional[float] = Field(default=0.0)
+    AnomaliesSeconds: Optional[float] = Field(default=0.0)
+    PublishSeconds: Optional[float] = Field(default=0.0)
+    BytesDownloaded: int = Field(default=0)
+    StationsSeen: int = Field(default=0)
+    StationsMatched: int = Field(default=0)
+    StationsUnmatched: int = Field(default=0)
+    FactsBuilt: int = Field(default=0)
+    RowsInserted: int = Field(default=0)
+    RowsUpdated: int = Field(default=0)
+    RowsSkipped: int = Field(default=0)
+    FactsFlagged: Optional[int] = Field(default=0)
@@ -0,0 +1,263 @@
+# Libraries
+import pandas as pd
+import sqlite3
+
+# Modules
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from db.engine import connect, get_engine
+from db.migrations import add_missing_columns
+from db.models import FactData
+from etl.load import load_facts
+from pathlib import Path
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+# Fact storage layouts: one `factdata` table, or one SQLite file per province
+PARTITIONING_MODES = ["none", "province"]
+PARTITION_PREFIX = "factdata_"
+
+# SQLite attaches at most 10 databases per connection by default
+MAX_ATTACHED = 9
+
+
+def partition_dir(database_name: str) -> Path:
+    """
+    Returns the directory of the fact partitions of a database, next to it.
+
+    Args:
+        database_name (str): The path of the SQLite database (e.g., 'star_schema.db').
+
+    Returns:
+        Path: The directory (e.g., 'star_schema_facts/').
+    """
+    path = Path(database_name)
+    return path.with_name(f"{path.stem}_facts")
+
+
+class FactPartitions:
+    """
+    A class which stores the facts in one SQLite file per province.
+
+    Each partition holds a `factdata` table with the usual schema, while the dimensions
+    stay in the main database. Partitions are written in parallel, since every file has
+    its own writer, and read by attaching them to a connection of the main database:
+    a query for one province only touches its own file.
+
+    Attributes:
+        root (Path): The directory of the partitions.
+        max_workers (int): The maximum number of partitions written at once.
+        engines (dict): The engines of the partitions already opened, by province.
+    """
+
+    def __init__(self, root: Path, max_workers: int = 8):
+        """
+        Initializes the partitions of a directory, creating it if needed.
+
+        Args:
+            root (Path): The directory of the partitions.
+            max_workers (int): The maximum number of partitions written at once.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.engines = {}
+
+    def path(self, province: str) -> Path:
+        """
+        Returns the file of a province partition.
+
+        Args:
+            province (str): The province id (e.g., '35').
+
+        Returns:
+            Path: The SQLite file of the partition.
+        """
+        return self.root / f"{PARTITION_PREFIX}{int(province):02d}.db"
+
+    def provinces(self) -> List[str]:
+        """
+        Lists the provinces with a partition.
+
+        Returns:
+            List[str]: The province ids, sorted.
+        """
+        return sorted(
+            path.stem[len(PARTITION_PREFIX) :]
+            for path in self.root.glob(f"{PARTITION_PREFIX}*.db")
+        )
+
+    def engine(self, province: str) -> Engine:
+        """
+        Returns the engine of a province partition, creating its table on first use.
+
+        Args:
+            province (str): The province id.
+
+        Returns:
+            Engine: The engine of the partition.
+        """
+        province = f"{int(province):02d}"
+        if province not in self.engines:
+            engine = get_engine(f"sqlite:///{self.path(province)}")
+            FactData.__table__.create(engine, checkfirst=True)
+            with engine.begin() as conn:
+                add_missing_columns(conn)
+                for index in FactData.__table__.indexes:
+                    index.create(conn, checkfirst=True)
+            self.engines[province] = engine
+        return self.engines[province]
+
+    def migrate(self) -> None:
+        """
+        Brings every existing partition up to date with the FactData model (columns and
+        indexes).
+        """
+        for province in self.provinces():
+            self.engine(province)
+
+    def load(
+        self,
+        facts: pd.DataFrame,
+        provinces: pd.Series,
+        policy: str = "update",
+        metrics: Optional[Any] = None,
+    ) -> Dict[str, int]:
+        """
+        Loads facts into the partitions of their provinces, in parallel.
+
+        Args:
+            facts (pd.DataFrame): The facts to load, with the FactData columns.
+            provinces (pd.Series): The province id of each fact, aligned with `facts`.
+            policy (str): The conflict policy ('update', 'ignore' or 'error').
+            metrics (Optional[Metrics]): Collects the commit latency.
+
+        Returns:
+            Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' rows.
+        """
+        groups = {
+            f"{int(province):02d}": group
+            for province, group in facts.groupby(provinces.to_numpy(), sort=True)
+        }
+        engines = {province: self.engine(province) for province in groups}
+
+        workers = max(1, min(self.max_workers, len(groups)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    lambda province: load_facts(
+                        groups[province], engines[province], policy, metrics=metrics
+                    ),
+                    groups,
+                )
+            )
+
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        for result in results:
+            for key in counts:
+                counts[key] += result[key]
+        return counts
+
+    @contextmanager
+    def attached(
+        self, conn: sqlite3.Connection, provinces: Sequence[str]
+    ) -> Iterator[None]:
+        """
+        Attaches some partitions to a connection of the main database and exposes them as
+        a temporary `factdata` view, which shadows the (empty) main table.
+
+        Args:
+            conn (sqlite3.Connection): A connection of the main database.
+            provinces (Sequence[str]): At most `MAX_ATTACHED` province ids.
+        """
+        schemas = [f"p{province}" for province in provinces]
+        for province, schema in zip(provinces, schemas):
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(self.path(province)),))
+        cols = ", ".join(col.name for col in FactData.__table__.columns)
+        union = " UNION ALL ".join(
+            f"SELECT {cols} FROM {schema}.factdata" for schema in schemas
+        )
+        conn.execute(f"CREATE TEMP VIEW factdata AS {union}")
+        try:
+            yield
+        finally:
+            conn.execute("DROP VIEW temp.factdata")
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    def read_sql(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        provinces: Optional[Iterable[str]] = None,
+        params: Any = None,
+    ) -> pd.DataFrame:
+        """
+        Runs a query over the facts of some provinces, attaching their partitions in
+        batches. The query refers to the facts as `factdata`, as with a single table, so
+        it must not aggregate across batches.
+
+        Args:
+            conn (sqlite3.Connection): A connection of the main database.
+            query (str): The query.
+            provinces (Optional[Iterable[str]]): The province ids. Every partition when None.
+            params (Any): The query parameters.
+
+        Returns:
+            pd.DataFrame: The rows of every batch.
+        """
+        existing = self.provinces()
+        if provinces is None:
+            selected = existing
+        else:
+            selected = [
+                province
+                for province in (f"{int(p):02d}" for p in provinces)
+                if province in existing
+            ]
+
+        frames = []
+        for start in range(0, len(selected), MAX_ATTACHED):
+            with self.attached(conn, selected[start : start + MAX_ATTACHED]):
+                frames.append(pd.read_sql_query(query, conn, params=params))
+        if not frames:
+            return pd.read_sql_query(query, conn, params=params)
+        return pd.concat(frames, ignore_index=True)
+
+    def import_facts(
+        self, database_name: str, chunksize: int = 500_000
+    ) -> Dict[str, int]:
+        """
+        Moves the facts of the main `factdata` table into the province partitions, in
+        one pass over the table.
+
+        Args:
+            database_name (str): The path of the main SQLite database.
+            chunksize (int): The facts read and loaded at once.
+
+        Returns:
+            Dict[str, int]: The number of facts moved, by province.
+        """
+        cols = ", ".join(f"f.{col.name}" for col in FactData.__table__.columns)
+        query = f"""
+        SELECT {cols}, s.StationProvinceID
+        FROM factdata f
+        JOIN dimstation s ON f.StationKey = s.StationKey
+        """
+        moved = {}
+        conn = connect(database_name)
+        try:
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+                provinces = chunk.pop("StationProvinceID")
+                self.load(chunk, provinces, "ignore")
+                for province, count in provinces.value_counts().items():
+                    key = f"{int(province):02d}"
+                    moved[key] = moved.get(key, 0) + int(count)
+
+            # The main table is emptied once every partition holds its facts
+            conn.execute("DELETE FROM factdata")
+            conn.commit()
+        finally:
+            conn.close()
+        return dict(sorted(moved.items()))
@@ -0,0 +1,298 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import sqlite3
+
+# Modules
+from db.models import (
+    FLAG_JUMP,
+    FLAG_OUT_OF_BOUNDS,
+    FLAG_OUTLIER,
+    FLAG_UNRELIABLE,
+    PRICE_SCALE,
+    PriceStat,
+)
+from db.partitions import FactPartitions
+from etl.load import compile_driver_sql, driver_rows
+from etl.metrics import Metrics
+from etl.rollups import read_slot
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from typing import Iterable, Optional, Tuple
+
+
+# Plausible prices of each product, in euros per litre (per kilogram for the gases)
+PRICE_BOUNDS = {
+    "Precio Biodiesel": (0.5, 3.5),
+    "Precio Bioetanol": (0.5, 3.5),
+    "Precio Gas Natural Comprimido": (0.3, 3.5),
+    "Precio Gas Natural Licuado": (0.3, 3.5),
+    "Precio Gases licuados del petróleo": (0.3, 2.5),
+    "Precio Gasoleo A": (0.5, 3.5),
+    "Precio Gasoleo B": (0.3, 3.0),
+    "Precio Gasoleo Premium": (0.5, 3.5),
+    "Precio Gasolina 95 E10": (0.5, 3.5),
+    "Precio Gasolina 95 E5": (0.5, 3.5),
+    "Precio Gasolina 95 E5 Premium": (0.5, 3.5),
+    "Precio Gasolina 98 E10": (0.5, 3.5),
+    "Precio Gasolina 98 E5": (0.5, 3.5),
+    "Precio Hidrogeno": (3.0, 30.0),
+}
+# Bounds of the products missing above
+DEFAULT_BOUNDS = (0.1, 50.0)
+
+# Weight of a new price in the exponentially weighted mean and variance
+EWMA_ALPHA = 0.1
+# A price is a jump beyond this ratio to the last accepted one (e.g., a misplaced comma)
+JUMP_RATIO = 1.5
+# A price is an outlier beyond this many standard deviations and share of the mean,
+# once the statistics have enough observations
+OUTLIER_SIGMAS = 6.0
+OUTLIER_SHARE = 0.05
+MIN_OBSERVATIONS = 10
+# Consecutive unreliable prices after which the statistics restart from the new level,
+# so a lasting price change stops being flagged
+RESET_AFTER = 3
+
+STAT_KEYS = ["StationKey", "ProductKey"]
+# Statistics of the keys of a batch, the CROSS JOIN keeping the keys as the outer loop
+# so `pricestat` is only searched by its primary key
+STATS_QUERY = """
+SELECT pricestat.*
+FROM temp.stat_keys CROSS JOIN pricestat USING (StationKey, ProductKey)
+"""
+STAT_COLS = [col for col in PriceStat.__table__.columns.keys() if col not in STAT_KEYS]
+
+
+def price_bounds(dimproduct: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resolves the plausible price range of every product.
+
+    Args:
+        dimproduct (pd.DataFrame): The product dimension.
+
+    Returns:
+        pd.DataFrame: The 'LowMilli' and 'HighMilli' prices, indexed by ProductKey.
+    """
+    bounds = [PRICE_BOUNDS.get(product, DEFAULT_BOUNDS) for product in dimproduct["ProductID"]]
+    return pd.DataFrame(
+        np.array(bounds, dtype=float).reshape(-1, 2) * PRICE_SCALE,
+        index=dimproduct["ProductKey"].to_numpy(),
+        columns=["LowMilli", "HighMilli"],
+    )
+
+
+def detect_anomalies(
+    facts: pd.DataFrame, stats: pd.DataFrame, bounds: pd.DataFrame
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Flags the suspicious prices of one date and moment and folds the others into the
+    rolling statistics of their station and product, with vectorized operations only.
+
+    A price is flagged when it is outside the bounds of its product, when it jumps more
+    than `JUMP_RATIO` from the last accepted price, or when it is further than
+    `OUTLIER_SIGMAS` standard deviations (and `OUTLIER_SHARE` of the mean) from the
+    exponentially weighted mean. Flagged prices leave the statistics unchanged, unless
+    `RESET_AFTER` of them follow each other. Facts not after the statistics of their
+    station and product (backfills, reruns) are only checked against the bounds, since
+    the statistics describe a later period, and leave them unchanged.
+
+    Args:
+        facts (pd.DataFrame): The facts of one date and moment, with the FactData columns.
+        stats (pd.DataFrame): The statistics of their stations and products, with the
+                              PriceStat columns.
+        bounds (pd.DataFrame): The price range of each product, from `price_bounds`.
+
+    Returns:
+        Tuple[np.ndarray, pd.DataFrame]: The Flags of each fact, and the statistics that
+                                         changed, with the PriceStat columns.
+    """
+    current = facts[STAT_KEYS + ["DateKey", "MomentKey", "PriceMilli"]].merge(
+        stats, on=STAT_KEYS, how="left", suffixes=("", "_stat")
+    )
+    price = current["PriceMilli"].to_numpy(dtype=float)
+    known = current["Observations"].notna().to_numpy()
+    mean = current["MeanMilli"].to_numpy(dtype=float, na_value=np.nan)
+    var = current["VarMilli"].to_numpy(dtype=float, na_value=np.nan)
+    last = current["LastPriceMilli"].to_numpy(dtype=float, na_value=np.nan)
+    observations = current["Observations"].to_numpy(dtype=float, na_value=0)
+    rejected = current["Rejected"].to_numpy(dtype=float, na_value=0)
+
+    # Only the facts after the statistics are compared with them
+    slot = current["DateKey"].to_numpy() * 10 + current["MomentKey"].to_numpy()
+    stat_slot = current["DateKey_stat"].to_numpy(
+        dtype=float, na_value=-1
+    ) * 10 + current["MomentKey_stat"].to_numpy(dtype=float, na_value=0)
+    later = slot > stat_slot
+
+    limits = bounds.reindex(current["ProductKey"].to_numpy())
+    out_of_bounds = (price < limits["LowMilli"].to_numpy()) | (
+        price > limits["HighMilli"].to_numpy()
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = price / last
+    jump = later & known & ((ratio > JUMP_RATIO) | (ratio < 1 / JUMP_RATIO))
+    tolerance = np.maximum(OUTLIER_SIGMAS * np.sqrt(var), OUTLIER_SHARE * mean)
+    outlier = (
+        later & known & (observations >= MIN_OBSERVATIONS) & (np.abs(price - mean) > tolerance)
+    )
+
+    flags = (
+        out_of_bounds * FLAG_OUT_OF_BOUNDS + jump * FLAG_JUMP + outlier * FLAG_OUTLIER
+    ).astype(np.int64)
+    flags[flags > 0] |= FLAG_UNRELIABLE
+
+    # They move the statistics, unless they are out of bounds
+    newer = later & ~out_of_bounds
+    accepted = newer & known & (flags == 0)
+    rejected = np.where(newer & known & (flags > 0), rejected + 1, np.where(newer, 0, rejected))
+    restart = newer & (~known | (rejected >= RESET_AFTER))
+
+    diff = price - mean
+    increment = EWMA_ALPHA * diff
+    mean = np.where(accepted, mean + increment, mean)
+    var = np.where(accepted, (1 - EWMA_ALPHA) * (var + diff * increment), var)
+    observations = np.where(accepted, observations + 1, observations)
+    last = np.where(accepted, price, last)
+    mean, var = np.where(restart, price, mean), np.where(restart, 0.0, var)
+    observations = np.where(restart, 1, observations)
+    last, rejected = np.where(restart, price, last), np.where(restart, 0, rejected)
+
+    changed = current[newer][STAT_KEYS + ["DateKey", "MomentKey"]].assign(
+        MeanMilli=mean[newer],
+        VarMilli=var[newer],
+        LastPriceMilli=last[newer].astype(np.int64),
+        Observations=observations[newer].astype(np.int64),
+        Rejected=rejected[newer].astype(np.int64),
+    )
+    return flags, changed.reset_index(drop=True)
+
+
+def read_price_stats(conn: sqlite3.Connection, facts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reads the statistics of the stations and products of some facts only. Their keys
+    go into a temporary table joined on the primary key of `pricestat`, so the cost
+    depends on the size of the batch, not on the number of statistics.
+
+    Args:
+        conn (sqlite3.Connection): A connection of the database.
+        facts (pd.DataFrame): The facts, with their StationKey and ProductKey.
+
+    Returns:
+        pd.DataFrame: The statistics, with the PriceStat columns.
+    """
+    keys = facts[STAT_KEYS].drop_duplicates().to_numpy(dtype=np.int64).tolist()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DROP TABLE IF EXISTS temp.stat_keys")
+        cursor.execute(
+            "CREATE TEMP TABLE stat_keys "
+            "(StationKey INTEGER, ProductKey INTEGER, PRIMARY KEY (StationKey, ProductKey))"
+        )
+        cursor.executemany("INSERT INTO temp.stat_keys VALUES (?, ?)", keys)
+        stats = pd.read_sql_query(STATS_QUERY, conn)
+        cursor.execute("DROP TABLE temp.stat_keys")
+    finally:
+        cursor.close()
+    return stats
+
+
+def keep_stored_flags(
+    facts: pd.DataFrame, flags: np.ndarray, stored: pd.DataFrame
+) -> np.ndarray:
+    """
+    Adds the flags already stored for the same date, moment, station, product and price
+    to the flags of the facts. A rerun of a loaded moment is not after the statistics,
+    so only its bounds are checked again: without the stored flags, the "update" load
+    policy would clear the jumps and outliers flagged by the first run.
+
+    Args:
+        facts (pd.DataFrame): The facts of one date and moment, with the FactData columns.
+        flags (np.ndarray): The Flags of each fact, from `detect_anomalies`.
+        stored (pd.DataFrame): The loaded facts of the same date and moment, with their
+                               StationKey, ProductKey, PriceMilli and Flags.
+
+    Returns:
+        np.ndarray: The Flags of each fact, the stored ones kept unless the price changed.
+    """
+    if stored.empty:
+        return flags
+    current = facts[STAT_KEYS + ["PriceMilli"]].merge(
+        stored[STAT_KEYS + ["PriceMilli", "Flags"]],
+        on=STAT_KEYS + ["PriceMilli"],
+        how="left",
+    )
+    return flags | current["Flags"].to_numpy(dtype=np.int64, na_value=0)
+
+
+def flag_anomalies(
+    facts: pd.DataFrame,
+    engine: Engine,
+    dimproduct: pd.DataFrame,
+    metrics: Optional[Metrics] = None,
+    provinces: Optional[Iterable[str]] = None,
+    partitions: Optional[FactPartitions] = None,
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Flags the suspicious prices of one date and moment (see `detect_anomalies`). The
+    statistics hold one row per station and product, and only those of the facts are
+    read (see `read_price_stats`), so the cost does not depend on the size of the
+    history, which is never read.
+
+    The statistics that changed are returned instead of stored, to be written with
+    `store_price_stats` in the transaction loading the facts: a failed load leaves them
+    as they were, so its retry is flagged against the same statistics. Facts already
+    loaded with the same price keep their stored flags (see `keep_stored_flags`).
+
+    Args:
+        facts (pd.DataFrame): The facts of one date and moment, with the FactData columns.
+        engine (Engine): The database engine.
+        dimproduct (pd.DataFrame): The product dimension.
+        metrics (Optional[Metrics]): Collects the anomaly detection time and the number
+                                     of flagged facts.
+        provinces (Optional[Iterable[str]]): The province ids of the facts, whose
+                                             partitions are read. All when None.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+
+    Returns:
+        Tuple[np.ndarray, pd.DataFrame]: The Flags of each fact, and the statistics
+                                         that changed, with the PriceStat columns.
+    """
+    metrics = metrics or Metrics()
+    with metrics.timer("anomalies"):
+        with engine.connect() as conn:
+            stats = read_price_stats(conn.connection.driver_connection, facts)
+        flags, changed = detect_anomalies(facts, stats, price_bounds(dimproduct))
+        if not facts.empty:
+            stored = read_slot(
+                engine,
+                int(facts["DateKey"].iloc[0]),
+                int(facts["MomentKey"].iloc[0]),
+                provinces,
+                partitions,
+            )
+            stored["PriceMilli"] = np.rint(stored.pop("Price") * PRICE_SCALE).astype(np.int64)
+            flags = keep_stored_flags(facts, flags, stored)
+    metrics.add("facts_flagged", int((flags > 0).sum()))
+    return flags, changed
+
+
+def store_price_stats(conn: Connection, changed: pd.DataFrame) -> None:
+    """
+    Stores the statistics changed by `flag_anomalies`.
+
+    Args:
+        conn (Connection): A connection inside a transaction, usually that of the load
+                           of the flagged facts.
+        changed (pd.DataFrame): The statistics, with the PriceStat columns.
+    """
+    if changed.empty:
+        return
+    table = PriceStat.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=STAT_KEYS,
+        set_={col: stmt.excluded[col] for col in STAT_COLS},
+    )
+    sql, params = compile_driver_sql(stmt, conn, STAT_KEYS + STAT_COLS)
+    conn.exec_driver_sql(sql, driver_rows(changed, params, conn, table))
@@ -0,0 +1,154 @@
+# Libraries
+import json
+import os
+import pandas as pd
+
+# Modules
+from datetime import datetime
+from db.models import DimBrand, DimStation
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.engine import Connection
+from typing import Dict, List, Optional
+
+
+# Brands of the dashboard and the aliases matched in the station names, in priority
+# order (the first match wins). A JSON file with the same shape set in `BRAND_RULES`
+# replaces them
+BRAND_RULES = {
+    "BP": ["BP"],
+    "CEPSA": ["CEPSA", "MOEVE"],
+    "DISA": ["DISA"],
+    "REPSOL": ["REPSOL", "CAMPSA", "PETRONOR"],
+    "SHELL": ["SHELL"],
+}
+# Brand of the stations matching no rule
+OTHER_BRAND = "OTRAS"
+
+
+def load_brand_rules(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Reads the brand rules, from a JSON object mapping each brand to its aliases.
+
+    Args:
+        path (Optional[str]): The JSON file. `BRAND_RULES` from the environment when
+                              None, and the default rules without it.
+
+    Returns:
+        Dict[str, List[str]]: The uppercased aliases of each brand, in priority order.
+
+    Raises:
+        ValueError: If the rules are not a mapping of brands to lists of aliases.
+    """
+    path = path or os.getenv("BRAND_RULES")
+    if not path:
+        return BRAND_RULES
+    with open(path, encoding="utf-8") as file:
+        rules = json.load(file)
+    if not isinstance(rules, dict) or not all(
+        isinstance(aliases, list) and aliases and all(isinstance(a, str) and a for a in aliases)
+        for aliases in rules.values()
+    ):
+        raise ValueError(f"The brand rules {path} must map each brand to a list of aliases")
+    if OTHER_BRAND in rules:
+        raise ValueError(f"The brand rules {path} cannot define {OTHER_BRAND}")
+    return {
+        brand.upper(): [alias.upper() for alias in aliases] for brand, aliases in rules.items()
+    }
+
+
+def classify_brands(names: pd.Series, rules: Dict[str, List[str]]) -> pd.Series:
+    """
+    Assigns the brand of each station from its (normalized) name. Each distinct name is
+    matched once, so the cost depends on the number of names, not of rows.
+
+    Args:
+        names (pd.Series): The station names (e.g., 'BP LAS TORRES').
+        rules (Dict[str, List[str]]): The aliases of each brand (see `load_brand_rules`).
+
+    Returns:
+        pd.Series: The brand of each station, `OTHER_BRAND` when no alias matches.
+    """
+    codes, uniques = pd.factorize(names.fillna(""))
+    uniques = pd.Series(uniques, dtype=object)
+    brands = pd.Series(OTHER_BRAND, index=uniques.index, dtype=object)
+    for brand, aliases in reversed(list(rules.items())):
+        for alias in aliases:
+            brands[uniques.str.contains(alias, regex=False)] = brand
+    return pd.Series(brands.to_numpy()[codes], index=names.index, dtype=object)
+
+
+def brand_keys(conn: Connection, rules: Dict[str, List[str]]) -> Dict[str, int]:
+    """
+    Inserts the brands of the rules missing in the brand dimension.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+        rules (Dict[str, List[str]]): The aliases of each brand.
+
+    Returns:
+        Dict[str, int]: The BrandKey of every brand, including `OTHER_BRAND`.
+    """
+    table = DimBrand.__table__
+    keys = dict(conn.execute(select(table.c.BrandName, table.c.BrandKey)).all())
+    missing = [brand for brand in [*rules, OTHER_BRAND] if brand not in keys]
+    if missing:
+        conn.execute(
+            insert(table),
+            [{"BrandName": brand, "CreatedAt": datetime.now()} for brand in missing],
+        )
+        keys = dict(conn.execute(select(table.c.BrandName, table.c.BrandKey)).all())
+    return keys
+
+
+def station_brand_keys(
+    names: pd.Series, conn: Connection, rules: Optional[Dict[str, List[str]]] = None
+) -> pd.Series:
+    """
+    Resolves the BrandKey of stations from their names.
+
+    Args:
+        names (pd.Series): The station names.
+        conn (Connection): A connection inside a transaction.
+        rules (Optional[Dict[str, List[str]]]): The brand rules. Those of
+                                                `load_brand_rules` when None.
+
+    Returns:
+        pd.Series: The BrandKey of each station.
+    """
+    rules = rules or load_brand_rules()
+    return classify_brands(names, rules).map(brand_keys(conn, rules)).astype("int64")
+
+
+def classify_stations(conn: Connection, rules: Optional[Dict[str, List[str]]] = None) -> int:
+    """
+    Classifies every version of every station again, e.g., after the brand rules
+    changed. Only the versions whose brand changed are written.
+
+    Args:
+        conn (Connection): A connection inside a transaction.
+        rules (Optional[Dict[str, List[str]]]): The brand rules. Those of
+                                                `load_brand_rules` when None.
+
+    Returns:
+        int: The number of reclassified station versions.
+    """
+    table = DimStation.__table__
+    stations = pd.DataFrame(
+        conn.execute(select(table.c.StationKey, table.c.StationName, table.c.BrandKey)).all(),
+        columns=["StationKey", "StationName", "BrandKey"],
+    )
+    if stations.empty:
+        return 0
+    keys = station_brand_keys(stations["StationName"], conn, rules)
+    changed = stations[stations["BrandKey"].ne(keys)]
+    if not changed.empty:
+        conn.execute(
+            update(table)
+            .where(table.c.StationKey == bindparam("b_StationKey"))
+            .values(BrandKey=bindparam("b_BrandKey")),
+            [
+                {"b_StationKey": int(station), "b_BrandKey": int(key)}
+                for station, key in zip(changed["StationKey"], keys[changed.index])
+            ],
+        )
+    return len(changed)
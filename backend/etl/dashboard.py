@@ -0,0 +1,340 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Modules
+from datetime import date, timedelta
+from db.engine import connect
+from db.models import PRICE_SCALE
+from db.partitions import partition_dir
+from etl.brands import OTHER_BRAND
+from etl.dates import date_key
+from etl.metrics import Metrics
+from etl.snapshots import write_atomic
+from pathlib import Path
+from sqlalchemy.engine import Engine
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Days of prices shown by the dashboard, ending today
+DASHBOARD_DAYS = 7
+
+# Columns of the dashboard facts, read into one integer array
+FACT_COLS = ["DateKey", "StationKey", "ProductKey", "PriceMilli", "Flags"]
+
+# Station attributes of the dashboard, with the brand of each version
+STATION_QUERY = f"""
+SELECT
+    dimstation.StationKey,
+    dimstation.StationID,
+    dimstation.StationName,
+    dimstation.StationAddress,
+    dimstation.StationPostalCode,
+    dimstation.StationLatitude,
+    dimstation.StationLongitude,
+    dimstation.StationLocation,
+    dimstation.StationMunicipality,
+    dimstation.StationMunicipalityID,
+    dimstation.StationProvince,
+    dimstation.StationProvinceID,
+    dimstation.StationAC,
+    dimstation.StationACID,
+    dimstation.StationIsland,
+    dimstation.StationIslandID,
+    COALESCE(dimbrand.BrandName, '{OTHER_BRAND}') AS StationBrand
+FROM dimstation
+LEFT JOIN dimbrand ON dimstation.BrandKey = dimbrand.BrandKey;
+"""
+
+
+def dashboard_dir(database_name: str) -> Path:
+    """
+    Returns the directory of the published dashboard data of a database, next to it.
+
+    Args:
+        database_name (str): The path of the SQLite database (e.g., 'star_schema.db').
+
+    Returns:
+        Path: The directory (e.g., 'star_schema_dashboard/').
+    """
+    path = Path(database_name)
+    return path.with_name(f"{path.stem}_dashboard")
+
+
+def dashboard_path(database_name: str, moment_key: int) -> Path:
+    """
+    Returns the Arrow file of the published dashboard data of a moment.
+
+    Args:
+        database_name (str): The path of the SQLite database.
+        moment_key (int): The MomentKey.
+
+    Returns:
+        Path: The file (e.g., 'star_schema_dashboard/moment_4.arrow').
+    """
+    return dashboard_dir(database_name) / f"moment_{moment_key}.arrow"
+
+
+def build_dashboard_query(
+    curr_mom_key: int,
+    province_ids: Optional[List[int]] = None,
+    today: Optional[date] = None,
+) -> Tuple[str, list]:
+    """
+    Builds the query of the dashboard: the prices of a moment over the last
+    `DASHBOARD_DAYS` days.
+
+    The date range applies directly on `factdata.DateKey` (YYYYMMDD integers), so the
+    query seeks the `ix_factdata_moment_date` covering index without joining the date
+    dimension and never scans the fact table. Only the narrow fact columns (`FACT_COLS`)
+    are read, the dimensions being joined in memory (see `join_dimensions`).
+
+    Args:
+        curr_mom_key (int): The key representing the specific moment to filter data.
+        province_ids (Optional[List[int]]): The province ids to read. Every province when None.
+        today (Optional[date]): The last date to read. Today when None.
+
+    Returns:
+        Tuple[str, list]: The query and its parameters.
+    """
+    today = today or date.today()
+    first_day = today - timedelta(days=DASHBOARD_DAYS - 1)
+    params = [curr_mom_key, date_key(first_day), date_key(today)]
+    province_cond = ""
+    if province_ids is not None:
+        province_cond = (
+            "AND factdata.StationKey IN (SELECT StationKey FROM dimstation "
+            f"WHERE StationProvinceID IN ({', '.join('?' * len(province_ids))}))"
+        )
+        params += list(province_ids)
+
+    query = f"""
+    SELECT {', '.join(f'factdata.{col}' for col in FACT_COLS)}
+    FROM factdata
+    WHERE factdata.MomentKey = ?
+    AND factdata.DateKey BETWEEN ? AND ?
+    {province_cond};
+    """
+    return query, params
+
+
+def retrieve_dimensions_app(db_path: str) -> Dict[str, pd.DataFrame]:
+    """
+    Retrieves the dimensions joined to the facts of the dashboard: every station version
+    with its brand, the products and the moments. They are read once and shared by the
+    loads of the facts (see `DataCache` in `frontend/utils.py`).
+
+    Args:
+        db_path (str): The SQLite database to read.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The 'stations', 'products' and 'moments'.
+    """
+    conn = connect(db_path)
+    try:
+        return {
+            "stations": pd.read_sql_query(STATION_QUERY, conn),
+            "products": pd.read_sql_query(
+                "SELECT ProductKey, ProductID, ProductName FROM dimproduct;", conn
+            ),
+            "moments": pd.read_sql_query("SELECT MomentKey, MomentID FROM dimmoment;", conn),
+        }
+    finally:
+        conn.close()  # Closing connection
+
+
+def coded_column(values: pd.Series, rows: np.ndarray) -> pd.Series:
+    """
+    Repeats the values of a dimension for some rows, as a categorical column sharing
+    one copy of each distinct value.
+
+    Args:
+        values (pd.Series): The values of the dimension rows.
+        rows (np.ndarray): The dimension row of each row.
+
+    Returns:
+        pd.Series: The values of the rows, with sorted categories.
+    """
+    codes, categories = pd.factorize(values, sort=True)
+    return pd.Series(pd.Categorical.from_codes(codes[rows], categories))
+
+
+def join_dimensions(
+    facts: np.ndarray, curr_mom_key: int, dimensions: Dict[str, pd.DataFrame]
+) -> pd.DataFrame:
+    """
+    Joins the dimensions to the facts of the dashboard in memory. Facts look up the
+    position of their station and product, and every dimension attribute becomes a
+    categorical column (one small integer code per row over the distinct values), so
+    the size of a row does not depend on the length of the names. Keys are downcast.
+    Facts of unknown stations or products are left out, like an inner join.
+
+    Args:
+        facts (np.ndarray): The facts, one row per price with the `FACT_COLS` columns.
+        curr_mom_key (int): The moment of the facts.
+        dimensions (Dict[str, pd.DataFrame]): The dimensions (see `retrieve_dimensions_app`).
+
+    Returns:
+        pd.DataFrame: One row per price with its date, station, product and moment.
+    """
+    stations, products = dimensions["stations"], dimensions["products"]
+    station_rows = pd.Index(stations["StationKey"]).get_indexer(facts[:, 1])
+    product_rows = pd.Index(products["ProductKey"]).get_indexer(facts[:, 2])
+    known = (station_rows >= 0) & (product_rows >= 0)
+    facts, station_rows, product_rows = (
+        facts[known],
+        station_rows[known],
+        product_rows[known],
+    )
+    moments = dimensions["moments"].set_index("MomentKey")["MomentID"]
+
+    # DateID as stored in the date dimension, from the few distinct keys
+    codes, keys = pd.factorize(facts[:, 0], sort=True)
+    date_ids = pd.to_datetime(keys.astype(str), format="%Y%m%d").strftime(
+        "%Y-%m-%d %H:%M:%S.%f"
+    )
+
+    data = {
+        "DateKey": facts[:, 0].astype(np.int32),
+        "StationKey": facts[:, 1].astype(np.int32),
+        "ProductKey": facts[:, 2].astype(np.int8),
+        "MomentKey": np.full(len(facts), curr_mom_key, dtype=np.int8),
+        "Price": facts[:, 3] / PRICE_SCALE,
+        "DateID": pd.Categorical.from_codes(codes, date_ids),
+        "MomentID": pd.Categorical.from_codes(
+            np.zeros(len(facts), dtype=np.int8), [moments.get(curr_mom_key, "")]
+        ),
+    }
+    for col in ["ProductID", "ProductName"]:
+        data[col] = coded_column(products[col], product_rows)
+    for col in stations.columns.drop("StationKey"):
+        data[col] = coded_column(stations[col], station_rows)
+    data["Flags"] = facts[:, 4].astype(np.int16)
+    return pd.DataFrame(data)
+
+
+def data_app_dtypes(curr_mom_key: int, dimensions: Dict[str, pd.DataFrame]) -> pd.Series:
+    """
+    Returns the columns and types of the dashboard data (see `join_dimensions`), which
+    the published data must have.
+
+    Args:
+        curr_mom_key (int): The moment of the data.
+        dimensions (Dict[str, pd.DataFrame]): The dimensions (see `retrieve_dimensions_app`).
+
+    Returns:
+        pd.Series: The type name of each column, in order.
+    """
+    facts = np.empty((0, len(FACT_COLS)), dtype=np.int64)
+    return join_dimensions(facts, curr_mom_key, dimensions).dtypes.astype(str)
+
+
+def retrieve_data_app(
+    curr_mom_key: int,
+    db_path: str,
+    provinces: Optional[Iterable[str]] = None,
+    dimensions: Optional[Dict[str, pd.DataFrame]] = None,
+    today: Optional[date] = None,
+) -> pd.DataFrame:
+    """
+    Retrieves the dashboard data from the database: the prices of a moment over the
+    last `DASHBOARD_DAYS` days joined to their dimensions.
+
+    Only the narrow fact columns are queried, straight into an integer array, and the
+    dimensions are joined in memory (see `join_dimensions`). When the facts are
+    partitioned by province, only the partitions of the requested provinces are read,
+    attaching them in batches (SQLite attaches 10 databases at most).
+
+    Args:
+        curr_mom_key (int): The key representing the specific moment to filter data.
+        db_path (str): The SQLite database to read.
+        provinces (Optional[Iterable[str]]): The province ids to read (e.g., ['35', '38']).
+                                             Every province when None.
+        dimensions (Optional[Dict[str, pd.DataFrame]]): The dimensions, from
+                                                        `retrieve_dimensions_app`. Read
+                                                        from the database when None.
+        today (Optional[date]): The last date to read. Today when None.
+
+    Returns:
+        pd.DataFrame: One row per price with its date, station, product and moment.
+    """
+    province_ids = None if provinces is None else sorted(int(p) for p in provinces)
+    query, params = build_dashboard_query(curr_mom_key, province_ids, today)
+
+    conn = connect(db_path)
+    try:
+        partitions = sorted(partition_dir(db_path).glob("factdata_*.db"))
+        if not partitions:
+            rows = conn.execute(query, params).fetchall()
+        else:
+            # The partitions replace the main table through a temporary view
+            if province_ids is not None:
+                partitions = [
+                    path for path in partitions if int(path.stem[-2:]) in province_ids
+                ]
+            rows = []
+            for start in range(0, len(partitions), 9):
+                batch = partitions[start : start + 9]
+                schemas = [f"p{path.stem[-2:]}" for path in batch]
+                for path, schema in zip(batch, schemas):
+                    conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+                union = " UNION ALL ".join(
+                    f"SELECT * FROM {schema}.factdata" for schema in schemas
+                )
+                conn.execute(f"CREATE TEMP VIEW factdata AS {union}")
+                try:
+                    rows += conn.execute(query, params).fetchall()
+                finally:
+                    conn.execute("DROP VIEW temp.factdata")
+                    for schema in schemas:
+                        conn.execute(f"DETACH DATABASE {schema}")
+    finally:
+        conn.close()  # Closing connection
+
+    facts = np.array(rows, dtype=np.int64).reshape(-1, len(FACT_COLS))
+    return join_dimensions(facts, curr_mom_key, dimensions or retrieve_dimensions_app(db_path))
+
+
+def publish_dashboard(
+    engine: Engine,
+    moment_key: int,
+    today: Optional[date] = None,
+    metrics: Optional[Metrics] = None,
+) -> int:
+    """
+    Publishes the dashboard data of a moment (the prices of the last `DASHBOARD_DAYS`
+    days joined to their dimensions) as an Arrow IPC file next to the database.
+
+    The data is read with `retrieve_data_app`, like the dashboard does without the
+    file, so the file has exactly the columns and types of `data_app_dtypes`, which the
+    dashboard checks on read. The file is replaced
+    atomically, so dashboards never read it half written, and the text columns are
+    dictionary encoded. Dashboards memory-map it read-only: every process and session
+    shares the pages of one copy, viewed by pandas without copying, and starts without
+    querying the database.
+
+    Args:
+        engine (Engine): The database engine.
+        moment_key (int): The MomentKey of the data.
+        today (Optional[date]): The last date of the data. Today when None.
+        metrics (Optional[Metrics]): Collects the publication time.
+
+    Returns:
+        int: The number of published rows.
+    """
+    metrics = metrics or Metrics()
+    today = today or date.today()
+    with metrics.timer("publish"):
+        frame = retrieve_data_app(moment_key, engine.url.database, today=today)
+
+        # The dashboard only uses the file for the same moment and last date
+        table = pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata(
+            {"moment_key": str(moment_key), "window_end": str(date_key(today))}
+        )
+        sink = pa.BufferOutputStream()
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        write_atomic(dashboard_path(engine.url.database, moment_key), sink.getvalue())
+    return len(frame)
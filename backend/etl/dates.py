@@ -0,0 +1,16 @@
+# Modules
+from datetime import date
+
+
+def date_key(day: date) -> int:
+    """
+    Computes the DateKey of a date, a YYYYMMDD integer, so date ranges can be filtered
+    on the facts without joining the date dimension.
+
+    Args:
+        day (date): The date (or datetime, whose time is ignored).
+
+    Returns:
+        int: The DateKey (e.g., 20241231).
+    """
+    return day.year * 10000 + day.month * 100 + day.day
@@ -0,0 +1,491 @@
+# Libraries
+import codecs
+import json
+import re
+import requests
+
+# Modules
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from etl.metrics import Metrics
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urljoin
+
+
+# Connection and read timeouts in seconds
+DEFAULT_TIMEOUT = (10, 120)
+CHUNK_SIZE = 64 * 1024
+LIST_KEY = "ListaEESSPrecio"
+
+_SKIP = re.compile(r"[\s,]*")
+_SCALAR_FIELD = re.compile(r'"([^"\\]+)"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Retry policy shared by every request to the ministry
+api_retry = retry(
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=1, min=1, max=20),
+    retry=retry_if_exception_type(requests.RequestException),
+    reraise=True,
+)
+
+
+def create_session(pool_size: int = 8) -> requests.Session:
+    """
+    Creates an HTTP session reusing its connections across requests.
+
+    Args:
+        pool_size (int): The maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: A session asking for gzip encoded JSON responses.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+    )
+    return session
+
+
+def province_link(api_link: str, province: str) -> str:
+    """
+    Builds the URL of the ministry endpoint filtered by province.
+
+    Args:
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        province (str): The province id (e.g., '35').
+
+    Returns:
+        str: The URL of the `FiltroProvincia` endpoint for the province.
+    """
+    base = api_link if api_link.endswith("/") else f"{api_link}/"
+    return urljoin(base, f"FiltroProvincia/{province}")
+
+
+def historical_link(api_hist_link: str, day: date, province: Optional[str] = None) -> str:
+    """
+    Builds the URL of the ministry historical endpoint for a date.
+
+    Args:
+        api_hist_link (str): The URL of the `EstacionesTerrestresHist/` endpoint.
+        day (date): The date to retrieve.
+        province (Optional[str]): The province id to filter by. Nationwide when None.
+
+    Returns:
+        str: The URL of the historical endpoint for the date (and province).
+    """
+    base = api_hist_link if api_hist_link.endswith("/") else f"{api_hist_link}/"
+    day_str = day.strftime("%d-%m-%Y")
+    if province is None:
+        return urljoin(base, day_str)
+    return urljoin(base, f"FiltroProvincia/{day_str}/{province}")
+
+
+def merge_payloads(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges several payloads into one.
+
+    Args:
+        payloads (List[Dict[str, Any]]): The payloads (e.g., one per province).
+
+    Returns:
+        Dict[str, Any]: The top level fields of the first payload and the stations of all of them.
+    """
+    merged = {key: value for key, value in payloads[0].items() if key != LIST_KEY}
+    merged[LIST_KEY] = [
+        station for payload in payloads for station in payload[LIST_KEY]
+    ]
+    return merged
+
+
+def _conditional_headers(
+    validators: Optional[Dict[str, Dict[str, str]]], url: str
+) -> Dict[str, str]:
+    """
+    Builds the conditional request headers from the validators of a previous response.
+
+    Args:
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators by URL. None
+                                                          disables conditional requests.
+        url (str): The URL being requested.
+
+    Returns:
+        Dict[str, str]: The `If-None-Match` and `If-Modified-Since` headers, if known.
+    """
+    known = (validators or {}).get(url, {})
+    headers = {}
+    if known.get("etag"):
+        headers["If-None-Match"] = known["etag"]
+    if known.get("last_modified"):
+        headers["If-Modified-Since"] = known["last_modified"]
+    return headers
+
+
+def _remember_validators(
+    validators: Optional[Dict[str, Dict[str, str]]],
+    url: str,
+    response: requests.Response,
+) -> None:
+    """
+    Stores the `ETag` and `Last-Modified` headers of a response.
+
+    Args:
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators by URL, updated in place.
+        url (str): The requested URL.
+        response (requests.Response): The response.
+    """
+    if validators is None:
+        return
+    validators[url] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _scalar_fields(text: str) -> Dict[str, str]:
+    """
+    Extracts the top level string fields (e.g., 'Fecha') from a fragment of the payload.
+
+    Args:
+        text (str): A fragment of the JSON document outside the station list.
+
+    Returns:
+        Dict[str, str]: The string fields found in the fragment.
+    """
+    return {key: json.loads(value) for key, value in _SCALAR_FIELD.findall(text)}
+
+
+def iter_list_elements(
+    chunks: Iterable[bytes], key: str = LIST_KEY, header: Optional[Dict[str, Any]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally parses a JSON document and yields the elements of one of its arrays.
+
+    Only the element being decoded is kept in memory, so the whole document never
+    needs to be materialized.
+
+    Args:
+        chunks (Iterable[bytes]): The raw document, in chunks of any size.
+        key (str): The name of the top level array to iterate (e.g., 'ListaEESSPrecio').
+        header (Optional[Dict[str, Any]]): If given, it is filled with the top level
+                                           string fields of the document (e.g., 'Fecha').
+
+    Yields:
+        Dict[str, Any]: Each element of the array, in order.
+
+    Raises:
+        ValueError: If the array is not found or the document is truncated.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = iter(chunks)
+    marker = f'"{key}"'
+    buffer = ""
+
+    # Locating the beginning of the array
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        idx = buffer.find(marker)
+        bracket = buffer.find("[", idx + len(marker)) if idx != -1 else -1
+        if bracket != -1:
+            if header is not None:
+                header.update(_scalar_fields(buffer[:idx]))
+            buffer = buffer[bracket + 1 :]
+            break
+    else:
+        raise ValueError(f"{key} not found in payload")
+
+    # Decoding elements as soon as they are complete
+    pos = 0
+    while True:
+        pos = _SKIP.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            break
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Incomplete element", buffer, pos)
+            element, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError("Truncated payload")
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+            pos = 0
+            continue
+        yield element
+
+    # Trailing fields (e.g., 'ResultadoConsulta')
+    if header is not None:
+        tail = buffer[pos + 1 :] + "".join(
+            text_decoder.decode(chunk) for chunk in chunks
+        )
+        header.update(_scalar_fields(tail))
+
+
+def response_size(response: requests.Response) -> int:
+    """
+    Returns the bytes of a response body as transferred (compressed when gzip encoded),
+    whether it was read at once or streamed.
+
+    Args:
+        response (requests.Response): A response whose body was already read.
+
+    Returns:
+        int: The number of bytes downloaded.
+    """
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return len(response.content)
+
+
+@api_retry
+def stream_stations(
+    api_link: str,
+    provinces: Optional[Iterable[str]] = None,
+    session: Optional[requests.Session] = None,
+    timeout: Any = DEFAULT_TIMEOUT,
+    validators: Optional[Dict[str, Dict[str, str]]] = None,
+    metrics: Optional[Metrics] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Streams the nationwide document and keeps only the stations of the given provinces.
+    The document is parsed while it is downloaded, so no separate parse time is reported.
+
+    Args:
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        provinces (Optional[Iterable[str]]): Province ids to keep. All when None.
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        timeout (Any): The requests timeout (connect, read) in seconds.
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators of previous
+                                                          responses, by URL, updated in place.
+        metrics (Optional[Metrics]): Collects the downloaded bytes.
+
+    Returns:
+        Optional[Dict[str, Any]]: The payload with its top level fields and the filtered
+                                  `ListaEESSPrecio`, or None if the document is not modified.
+    """
+    session = session or create_session()
+    metrics = metrics or Metrics()
+    provinces = set(provinces) if provinces is not None else None
+    header = {}
+    with session.get(
+        api_link,
+        stream=True,
+        timeout=timeout,
+        headers=_conditional_headers(validators, api_link),
+    ) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        elements = iter_list_elements(
+            response.iter_content(chunk_size=CHUNK_SIZE), LIST_KEY, header
+        )
+        stations = [
+            element
+            for element in elements
+            if provinces is None or element.get("IDProvincia") in provinces
+        ]
+        _remember_validators(validators, api_link, response)
+        # Counted once the whole body is read, so a retried attempt is not
+        metrics.add("bytes_downloaded", response_size(response))
+    return {**header, LIST_KEY: stations}
+
+
+@api_retry
+def fetch_province(
+    api_link: str,
+    province: str,
+    session: Optional[requests.Session] = None,
+    timeout: Any = DEFAULT_TIMEOUT,
+    validators: Optional[Dict[str, Dict[str, str]]] = None,
+    metrics: Optional[Metrics] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetches the stations of a single province from its filtered endpoint.
+
+    Args:
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        province (str): The province id (e.g., '38').
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        timeout (Any): The requests timeout (connect, read) in seconds.
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators of previous
+                                                          responses, by URL, updated in place.
+        metrics (Optional[Metrics]): Collects the downloaded bytes and the parse time.
+
+    Returns:
+        Optional[Dict[str, Any]]: The payload of the province, or None if it is not modified.
+    """
+    session = session or create_session()
+    metrics = metrics or Metrics()
+    url = province_link(api_link, province)
+    response = session.get(
+        url, timeout=timeout, headers=_conditional_headers(validators, url)
+    )
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    with metrics.timer("parse"):
+        payload = response.json()
+    # Counted once the body is parsed, so a retried attempt is not
+    _remember_validators(validators, url, response)
+    metrics.add("bytes_downloaded", response_size(response))
+    return payload
+
+
+def fetch_provinces(
+    api_link: str,
+    provinces: List[str],
+    session: Optional[requests.Session] = None,
+    max_workers: int = 8,
+    timeout: Any = DEFAULT_TIMEOUT,
+    validators: Optional[Dict[str, Dict[str, str]]] = None,
+    metrics: Optional[Metrics] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetches several provinces concurrently and merges their payloads.
+
+    Args:
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        provinces (List[str]): The province ids to fetch.
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        max_workers (int): The maximum number of concurrent requests.
+        timeout (Any): The requests timeout (connect, read) in seconds.
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators of previous
+                                                          responses, by URL, updated in place.
+        metrics (Optional[Metrics]): Collects the downloaded bytes and the parse time.
+
+    Returns:
+        Optional[Dict[str, Any]]: The top level fields of the first province and the stations
+                                  of all of them, or None if no province is modified.
+    """
+    session = session or create_session(pool_size=max_workers)
+    workers = max(1, min(max_workers, len(provinces)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        payloads = list(
+            executor.map(
+                lambda province: fetch_province(
+                    api_link, province, session, timeout, validators, metrics
+                ),
+                provinces,
+            )
+        )
+
+        # Nothing new, or only some provinces changed and the rest is fetched again
+        if all(payload is None for payload in payloads):
+            return None
+        missing = [n for n, payload in enumerate(payloads) if payload is None]
+        refetched = executor.map(
+            lambda n: fetch_province(
+                api_link, provinces[n], session, timeout, metrics=metrics
+            ),
+            missing,
+        )
+        for n, payload in zip(missing, refetched):
+            payloads[n] = payload
+
+    return merge_payloads(payloads)
+
+
+@api_retry
+def fetch_json(
+    url: str,
+    session: Optional[requests.Session] = None,
+    timeout: Any = DEFAULT_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Fetches a JSON document.
+
+    Args:
+        url (str): The URL of the document.
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        timeout (Any): The requests timeout (connect, read) in seconds.
+
+    Returns:
+        Dict[str, Any]: The decoded document.
+    """
+    session = session or create_session()
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_historical(
+    api_hist_link: str,
+    day: date,
+    provinces: Optional[List[str]] = None,
+    session: Optional[requests.Session] = None,
+    timeout: Any = DEFAULT_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Fetches the stations of a past date from the ministry historical endpoint.
+
+    Args:
+        api_hist_link (str): The URL of the `EstacionesTerrestresHist/` endpoint.
+        day (date): The date to retrieve.
+        provinces (Optional[List[str]]): The province ids to fetch, one request each.
+                                         The nationwide document is streamed when None.
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        timeout (Any): The requests timeout (connect, read) in seconds.
+
+    Returns:
+        Dict[str, Any]: The payload of the date with the `ListaEESSPrecio` of the provinces.
+    """
+    if provinces:
+        return merge_payloads(
+            [
+                fetch_json(historical_link(api_hist_link, day, province), session, timeout)
+                for province in provinces
+            ]
+        )
+    return stream_stations(historical_link(api_hist_link, day), None, session, timeout)
+
+
+def fetch_payload(
+    api_link: str,
+    provinces: Optional[List[str]] = None,
+    mode: str = "province",
+    session: Optional[requests.Session] = None,
+    validators: Optional[Dict[str, Dict[str, str]]] = None,
+    metrics: Optional[Metrics] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetches the stations of the configured provinces from the ministry API.
+
+    Args:
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        provinces (Optional[List[str]]): The province ids to fetch. All Spain when None.
+        mode (str): 'province' to query the filtered endpoints concurrently or 'stream'
+                    to stream-parse the nationwide document.
+        session (Optional[requests.Session]): The session to use. A new one when None.
+        validators (Optional[Dict[str, Dict[str, str]]]): The validators of previous
+                                                          responses, by URL, updated in place.
+                                                          Requests are conditional when given.
+        metrics (Optional[Metrics]): Collects the downloaded bytes and the parse time.
+
+    Returns:
+        Optional[Dict[str, Any]]: The payload with the `ListaEESSPrecio` of the requested
+                                  provinces, or None if the API reports no modification.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode == "province" and provinces:
+        return fetch_provinces(
+            api_link, provinces, session, validators=validators, metrics=metrics
+        )
+    elif mode in ["province", "stream"]:
+        return stream_stations(
+            api_link, provinces, session, validators=validators, metrics=metrics
+        )
+    else:
+        raise ValueError(f"Unknown fetch mode: {mode}")
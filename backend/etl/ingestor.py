@@ -0,0 +1,288 @@
+# Libraries
+import threading
+
+# Modules
+from datetime import datetime, timedelta
+from db.engine import get_engine
+from db.migrations import migrate
+from db.partitions import PARTITIONING_MODES, FactPartitions, partition_dir
+from etl.fetch import create_session, fetch_payload
+from etl.metrics import Metrics, record_run, start_run, write_textfile
+from etl.pipeline import ext_mom_id, ingest_payload, read_dimensions
+from etl.transform import key_lookup
+from etl.snapshots import SnapshotStore
+from logging import Logger
+from typing import Any, Dict, List, Optional
+from utils.file_lock import file_lock
+
+
+class Ingestor:
+    """
+    A class which runs ingests keeping its resources warm between runs.
+
+    The database engine, the HTTP session, the snapshot store and the dimension
+    lookups are created once and reused, so a resident process (e.g., the scheduler)
+    only pays for the fetch, the transformation and the load on each run. Runs never
+    overlap, neither within the process nor with other processes on the same database.
+
+    Attributes:
+        database_name (str): The path of the SQLite database.
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        provinces (List[str]): The province ids to ingest.
+        fetch_mode (str): The fetch mode ('province' or 'stream').
+        load_policy (str): The conflict policy for already loaded facts.
+        logger (Logger): The logger of the running task.
+        engine (Engine): The database engine.
+        session (requests.Session): The HTTP session.
+        store (SnapshotStore): The store of raw API snapshots.
+        dimensions (dict): The cached dimension tables by name.
+        dimensions_at (datetime): When the dimension tables were read.
+        dimensions_max_age (timedelta): How long the dimension tables are cached.
+        lock_path (str): The lock file serializing ingests on the database.
+        metrics_path (str): The Prometheus textfile with the metrics of the last run.
+        last_metrics (Metrics): The metrics of the last run.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+    """
+
+    def __init__(
+        self,
+        database_name: str,
+        database_url: str,
+        api_link: str,
+        provinces: List[str],
+        fetch_mode: str,
+        snapshot_dir: str,
+        load_policy: str,
+        logger: Logger,
+        dimensions_max_age: timedelta = timedelta(hours=6),
+        metrics_path: Optional[str] = None,
+        fact_partitioning: str = "none",
+    ):
+        """
+        Initializes the ingestor and its shared resources.
+
+        Args:
+            database_name (str): The path of the SQLite database.
+            database_url (str): The SQLAlchemy URL of the database.
+            api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+            provinces (List[str]): The province ids to ingest.
+            fetch_mode (str): The fetch mode ('province' or 'stream').
+            snapshot_dir (str): The directory of the raw API snapshots.
+            load_policy (str): The conflict policy for already loaded facts.
+            logger (Logger): The logger of the running task.
+            dimensions_max_age (timedelta): How long the dimension tables are cached.
+            metrics_path (Optional[str]): The Prometheus textfile with the metrics of the
+                                          last run. Not written when None.
+            fact_partitioning (str): The fact storage layout ('none' or 'province').
+        """
+        if fact_partitioning not in PARTITIONING_MODES:
+            raise ValueError(f"Unknown fact partitioning: {fact_partitioning}")
+        self.database_name = database_name
+        self.api_link = api_link
+        self.provinces = provinces
+        self.fetch_mode = fetch_mode
+        self.load_policy = load_policy
+        self.logger = logger
+        self.engine = get_engine(database_url)
+        migrate(self.engine)
+        self.session = create_session()
+        self.store = SnapshotStore(snapshot_dir)
+        self.dimensions = None
+        self.dimensions_at = None
+        self.dimensions_max_age = dimensions_max_age
+        self.lock_path = f"{database_name}.lock"
+        self.metrics_path = metrics_path
+        self.last_metrics = None
+        self.partitions = (
+            FactPartitions(partition_dir(database_name))
+            if fact_partitioning == "province"
+            else None
+        )
+        if self.partitions is not None:
+            self.partitions.migrate()
+        self._run_lock = threading.Lock()
+
+    def get_dimensions(self) -> Dict[str, Any]:
+        """
+        Returns the dimension tables, reading them again when the cache is too old.
+
+        Returns:
+            Dict[str, Any]: The dimension tables by name.
+        """
+        now = datetime.now()
+        if self.dimensions is None or now - self.dimensions_at > self.dimensions_max_age:
+            self.dimensions = read_dimensions(self.database_name, self.logger)
+            self.dimensions_at = now
+        return self.dimensions
+
+    def invalidate_dimensions(self) -> None:
+        """
+        Forces the dimension tables to be read again on the next run.
+        """
+        self.dimensions = None
+
+    def fetch(
+        self, when: datetime, moment_id: str, metrics: Optional[Metrics] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Fetches the API payload, reusing the last snapshot if it did not change.
+
+        A payload received with an unchanged `Fecha` is returned as it is, only its
+        snapshot being shared with the last one. When the API answers that nothing
+        changed but the last snapshot cannot be read (e.g., it was deleted), the
+        validators are dropped and the payload is downloaded again unconditionally.
+
+        Args:
+            when (datetime): The moment being ingested.
+            moment_id (str): The moment of the day (e.g., 'Noche').
+            metrics (Optional[Metrics]): Collects the stage timings and counters.
+
+        Returns:
+            Optional[Dict[str, Any]]: The API payload.
+        """
+        metrics = metrics or Metrics()
+
+        def download() -> Optional[Dict[str, Any]]:
+            with metrics.timer("fetch"):
+                return fetch_payload(
+                    self.api_link,
+                    self.provinces,
+                    self.fetch_mode,
+                    self.session,
+                    validators=self.store.validators,
+                    metrics=metrics,
+                )
+
+        payload = download()
+        with metrics.timer("snapshot"):
+            if payload is None:
+                latest = None
+                if self.store.reuse_latest(when, moment_id) is not None:
+                    try:
+                        latest = self.store.load_latest()
+                    except (OSError, ValueError) as e:
+                        self.logger.warning(f"Error reading the last snapshot: {e}")
+                if latest is not None:
+                    self.logger.info("Prices not modified since last snapshot, reusing it")
+                    return latest
+                self.logger.warning("The last snapshot is missing, downloading the prices again")
+                self.store.validators.clear()
+                self.store.save_state()
+
+        if payload is None:
+            payload = download()
+        with metrics.timer("snapshot"):
+            if payload.get("Fecha") == self.store.last_fecha and (
+                self.store.reuse_latest(when, moment_id) is not None
+            ):
+                self.logger.info("Prices not modified since last snapshot, reusing it")
+                return payload
+
+            self.logger.info(
+                f"Retrieved {len(payload['ListaEESSPrecio'])} stations from api successfully"
+            )
+            self.store.save(payload, when, moment_id)
+            return payload
+
+    def moment_key(self, moment_id: str) -> Optional[int]:
+        """
+        Resolves the MomentKey of a moment from the cached dimensions.
+
+        Args:
+            moment_id (str): The moment of the day (e.g., 'Noche').
+
+        Returns:
+            Optional[int]: The MomentKey, or None if the dimensions are not loaded.
+        """
+        if self.dimensions is None:
+            return None
+        moments = key_lookup(self.dimensions["dimmoment"], "MomentID", "MomentKey")
+        return int(moments[moment_id]) if moment_id in moments else None
+
+    def publish_metrics(
+        self,
+        metrics: Metrics,
+        when: datetime,
+        moment_id: str,
+        error: Optional[str],
+        run_key: Optional[int] = None,
+    ) -> None:
+        """
+        Persists the metrics of a run in the run journal and the Prometheus textfile.
+        Failing to publish them never fails the run.
+
+        Args:
+            metrics (Metrics): The metrics of the run.
+            when (datetime): The moment ingested.
+            moment_id (str): The moment of the day (e.g., 'Noche').
+            error (Optional[str]): The error of a failed run.
+            run_key (Optional[int]): The run opened in the journal, if any.
+        """
+        self.last_metrics = metrics
+        self.logger.info(f"Run metrics: {metrics.summary()}")
+        try:
+            snapshot = self.store.path(when, moment_id)
+            record_run(
+                self.engine,
+                metrics,
+                when.date(),
+                self.moment_key(moment_id),
+                error,
+                run_key=run_key,
+                snapshot=str(snapshot) if snapshot.exists() else None,
+            )
+            if self.metrics_path:
+                write_textfile(
+                    metrics, self.metrics_path, error is None, {"moment": moment_id}
+                )
+        except Exception as e:
+            self.logger.warning(f"Error publishing run metrics: {e}")
+
+    def run(
+        self, when: Optional[datetime] = None, moment_id: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Ingests the prices of a moment: fetch, snapshot, transformation and load.
+
+        Args:
+            when (Optional[datetime]): The moment being ingested. Now when None.
+            moment_id (Optional[str]): The moment of the day (e.g., 'Noche'). The one
+                                       containing `when` when None.
+
+        Returns:
+            Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+        """
+        when = when or datetime.now()
+        moment_id = moment_id or ext_mom_id(when.hour)
+        self.logger.info(f"Ingesting {moment_id} of {when.date()}")
+
+        with self._run_lock, file_lock(self.lock_path):
+            metrics = Metrics()
+            error, run_key = None, None
+            try:
+                dimensions = self.get_dimensions()
+                run_key = start_run(
+                    self.engine, when.date(), self.moment_key(moment_id), "live"
+                )
+                payload = self.fetch(when, moment_id, metrics)
+                return ingest_payload(
+                    payload,
+                    dimensions,
+                    self.engine,
+                    when,
+                    moment_id,
+                    self.logger,
+                    provinces=self.provinces,
+                    run_key=run_key,
+                    policy=self.load_policy,
+                    station_sync="full",
+                    metrics=metrics,
+                    partitions=self.partitions,
+                )
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                self.publish_metrics(metrics, when, moment_id, error, run_key)
+                if error is not None:
+                    self.invalidate_dimensions()
@@ -0,0 +1,173 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import time
+
+# Modules
+from db.models import FactData
+from etl.metrics import Metrics
+from sqlalchemy import Table, and_, bindparam, insert, or_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import ClauseElement
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Conflict policies on the FactData primary key
+POLICIES = ["update", "ignore", "error"]
+KEY_COLS = ["DateKey", "StationKey", "ProductKey", "MomentKey"]
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def compile_driver_sql(
+    stmt: ClauseElement, conn: Connection, params: List[str]
+) -> Tuple[str, List[str]]:
+    """
+    Compiles a Core statement into the driver SQL and the order of its parameters.
+
+    Args:
+        stmt (ClauseElement): The Core statement.
+        conn (Connection): The connection whose dialect compiles the statement.
+        params (List[str]): The names of the parameters bound per row.
+
+    Returns:
+        Tuple[str, List[str]]: The SQL string and the parameter names in positional order.
+    """
+    compiled = stmt.compile(dialect=conn.dialect, column_keys=params)
+    return str(compiled), list(compiled.positiontup)
+
+
+def driver_rows(
+    df: pd.DataFrame, params: List[str], conn: Connection, table: Table
+) -> List[Tuple]:
+    """
+    Converts DataFrame columns into driver parameter tuples, applying the column type
+    conversions (e.g., datetimes into strings) once per column instead of once per value.
+
+    Args:
+        df (pd.DataFrame): The data, with one column per table column.
+        params (List[str]): The parameter names in positional order. A `b_` prefix
+                            refers to the column without it.
+        conn (Connection): The connection whose dialect provides the conversions.
+        table (Table): The table the columns belong to.
+
+    Returns:
+        List[Tuple]: One tuple per row.
+    """
+    columns = {}
+    for param in params:
+        col = param[2:] if param.startswith("b_") else param
+        if col in columns:
+            continue
+
+        col_type = table.c[col].type.dialect_impl(conn.dialect)
+        processor = col_type.bind_processor(conn.dialect)
+        if processor is None:
+            columns[col] = df[col].tolist()
+        else:
+            # Converting each distinct value once (e.g., the few dates of a load)
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+            converted = np.array(
+                [processor(value) for value in uniques.astype(object)], dtype=object
+            )
+            columns[col] = converted[codes].tolist()
+    return list(
+        zip(*[columns[p[2:] if p.startswith("b_") else p] for p in params])
+    )
+
+
+def load_facts(
+    facts: pd.DataFrame,
+    engine: Engine,
+    policy: str = "update",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    metrics: Optional[Metrics] = None,
+    before_commit: Optional[Callable[[Connection], None]] = None,
+) -> Dict[str, int]:
+    """
+    Loads facts with chunked `executemany` inserts inside one explicit transaction.
+
+    The statements are built with SQLAlchemy Core and run through the driver
+    `executemany`, so no ORM object nor per row parameter dictionary is created.
+
+    Existing rows (same DateKey, StationKey, ProductKey and MomentKey) are handled by the
+    policy:
+        - "update": their price and metadata are overwritten when the price or its
+                    flags changed (e.g., flags computed again by a replay).
+        - "ignore": they are kept as they are.
+        - "error": the whole load is rolled back.
+
+    Args:
+        facts (pd.DataFrame): The facts to load, with the FactData columns.
+        engine (Engine): The database engine.
+        policy (str): The conflict policy ('update', 'ignore' or 'error').
+        chunk_size (int): The number of rows per `executemany` call.
+        metrics (Optional[Metrics]): Collects the commit latency.
+        before_commit (Optional[Callable[[Connection], None]]): Writes more rows
+                                                               in the transaction of the facts
+                                                               (e.g., the price statistics).
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' rows.
+
+    Raises:
+        ValueError: If the policy is unknown.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown load policy: {policy}")
+
+    metrics = metrics or Metrics()
+    table = FactData.__table__
+    value_cols = [col for col in facts.columns if col not in KEY_COLS]
+
+    # Statements
+    if policy == "error":
+        insert_stmt = insert(table)
+    else:
+        insert_stmt = sqlite_insert(table).on_conflict_do_nothing(index_elements=KEY_COLS)
+    update_stmt = (
+        update(table)
+        .where(
+            and_(*[table.c[col] == bindparam(f"b_{col}") for col in KEY_COLS]),
+            or_(
+                table.c.PriceMilli != bindparam("b_PriceMilli"),
+                table.c.Flags != bindparam("b_Flags"),
+            ),
+        )
+        .values({col: bindparam(f"b_{col}") for col in value_cols})
+    )
+
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    with engine.begin() as conn:
+        insert_sql, insert_params = compile_driver_sql(
+            insert_stmt, conn, KEY_COLS + value_cols
+        )
+        insert_rows = driver_rows(facts, insert_params, conn, table)
+        if policy == "update":
+            update_sql, update_params = compile_driver_sql(
+                update_stmt, conn, [f"b_{col}" for col in KEY_COLS + value_cols]
+            )
+            update_rows = driver_rows(facts, update_params, conn, table)
+
+        for start in range(0, len(insert_rows), chunk_size):
+            chunk = insert_rows[start : start + chunk_size]
+
+            inserted = conn.exec_driver_sql(insert_sql, chunk).rowcount
+            updated = 0
+            if policy == "update" and inserted < len(chunk):
+                updated = conn.exec_driver_sql(
+                    update_sql, update_rows[start : start + chunk_size]
+                ).rowcount
+
+            counts["inserted"] += inserted
+            counts["updated"] += updated
+            counts["skipped"] += len(chunk) - inserted - updated
+
+        if before_commit is not None:
+            before_commit(conn)
+
+        # The transaction commits when the block exits
+        commit_started = time.perf_counter()
+    metrics.observe("commit", time.perf_counter() - commit_started)
+
+    return counts
@@ -0,0 +1,338 @@
+# Libraries
+import pandas as pd
+import threading
+import time
+
+# Modules
+from contextlib import contextmanager
+from datetime import date, datetime
+from db.models import IngestRun
+from etl.snapshots import write_atomic
+from pathlib import Path
+from sqlalchemy import insert, update
+from sqlalchemy.engine import Engine
+from typing import Dict, Iterator, Optional
+
+
+# Stages of an ingest, timed in seconds
+STAGES = [
+    "fetch",
+    "parse",
+    "snapshot",
+    "station_sync",
+    "transform",
+    "anomalies",
+    "load",
+    "commit",
+    "rollup",
+    "publish",
+]
+
+# Counters of an ingest
+COUNTERS = [
+    "bytes_downloaded",
+    "stations_seen",
+    "stations_matched",
+    "stations_unmatched",
+    "facts_built",
+    "rows_inserted",
+    "rows_updated",
+    "rows_skipped",
+    "facts_flagged",
+]
+
+METRIC_PREFIX = "fuelprices_ingest"
+
+
+class Metrics:
+    """
+    A class which collects the stage timings and counters of one ingest.
+
+    It is thread-safe, so concurrent fetches can report into the same instance. Stages
+    timed from several threads (e.g., 'parse') add up the time of every thread.
+
+    Attributes:
+        started_at (datetime): When the collection started.
+        stages (dict): The accumulated seconds by stage.
+        counters (dict): The accumulated values by counter.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty collection.
+        """
+        self.started_at = datetime.now()
+        self.stages = {}
+        self.counters = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Times the enclosed block as a stage.
+
+        Args:
+            stage (str): The name of the stage (e.g., 'fetch').
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Adds a duration to a stage.
+
+        Args:
+            stage (str): The name of the stage.
+            seconds (float): The duration in seconds.
+        """
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add(self, counter: str, value: int = 1) -> None:
+        """
+        Increments a counter.
+
+        Args:
+            counter (str): The name of the counter (e.g., 'bytes_downloaded').
+            value (int): The increment.
+        """
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def elapsed(self) -> float:
+        """
+        Returns the seconds since the collection started.
+
+        Returns:
+            float: The elapsed seconds.
+        """
+        return time.perf_counter() - self._started
+
+    def summary(self) -> str:
+        """
+        Formats the stages and counters in one line, for the logs.
+
+        Returns:
+            str: The summary.
+        """
+        stages = ", ".join(f"{stage} {self.stages[stage]:.3f}s" for stage in self.stages)
+        counters = ", ".join(f"{name} {value}" for name, value in self.counters.items())
+        return f"total {self.elapsed():.3f}s ({stages}); {counters}"
+
+
+def to_prometheus(
+    metrics: Metrics, success: bool, labels: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Formats the metrics of the last ingest in the Prometheus text exposition format.
+
+    Args:
+        metrics (Metrics): The metrics of the ingest.
+        success (bool): Whether the ingest succeeded.
+        labels (Optional[Dict[str, str]]): Labels added to every sample (e.g., the moment).
+
+    Returns:
+        str: The exposition text.
+    """
+    labels = labels or {}
+
+    def sample(name: str, value: float, extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = {**labels, **(extra or {})}
+        if not pairs:
+            return f"{METRIC_PREFIX}_{name} {value}"
+        label_str = ",".join(f'{key}="{label}"' for key, label in pairs.items())
+        return f"{METRIC_PREFIX}_{name}{{{label_str}}} {value}"
+
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_seconds Duration of each stage of the last ingest.",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds gauge",
+    ]
+    lines += [
+        sample("stage_seconds", round(metrics.stages.get(stage, 0.0), 6), {"stage": stage})
+        for stage in STAGES
+    ]
+    for counter in COUNTERS:
+        lines += [
+            f"# HELP {METRIC_PREFIX}_{counter} {counter.replace('_', ' ').capitalize()} in the last ingest.",
+            f"# TYPE {METRIC_PREFIX}_{counter} gauge",
+            sample(counter, metrics.counters.get(counter, 0)),
+        ]
+    lines += [
+        f"# HELP {METRIC_PREFIX}_duration_seconds Duration of the last ingest.",
+        f"# TYPE {METRIC_PREFIX}_duration_seconds gauge",
+        sample("duration_seconds", round(metrics.elapsed(), 6)),
+        f"# HELP {METRIC_PREFIX}_success Whether the last ingest succeeded.",
+        f"# TYPE {METRIC_PREFIX}_success gauge",
+        sample("success", int(success)),
+        f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds When the last ingest started.",
+        f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+        sample("last_run_timestamp_seconds", round(metrics.started_at.timestamp(), 3)),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(
+    metrics: Metrics,
+    path: str,
+    success: bool,
+    labels: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Writes the metrics of the last ingest as a Prometheus textfile (e.g., for the
+    node_exporter textfile collector). The file is replaced atomically.
+
+    Args:
+        metrics (Metrics): The metrics of the ingest.
+        path (str): The path of the `.prom` file.
+        success (bool): Whether the ingest succeeded.
+        labels (Optional[Dict[str, str]]): Labels added to every sample.
+    """
+    write_atomic(Path(path), to_prometheus(metrics, success, labels).encode())
+
+
+def start_run(
+    engine: Engine,
+    day: date,
+    moment_key: Optional[int],
+    source: str,
+    snapshot: Optional[str] = None,
+) -> int:
+    """
+    Opens an ingest in the run journal, so the facts it loads can refer to it.
+
+    Args:
+        engine (Engine): The database engine.
+        day (date): The date ingested.
+        moment_key (Optional[int]): The MomentKey ingested, if it is known.
+        source (str): What runs the ingest ('live', 'backfill', 'replay', ...).
+        snapshot (Optional[str]): The API snapshot ingested, if it is known.
+
+    Returns:
+        int: The RunKey of the run, in 'running' status until `record_run`.
+    """
+    now = datetime.now()
+    row = {
+        "Day": day,
+        "MomentKey": moment_key,
+        "Status": "running",
+        "Source": source,
+        "Snapshot": snapshot,
+        "StartedAt": now,
+        "FinishedAt": now,
+        "TotalSeconds": 0.0,
+    }
+    with engine.begin() as conn:
+        return conn.execute(insert(IngestRun.__table__), row).inserted_primary_key[0]
+
+
+def record_run(
+    engine: Engine,
+    metrics: Metrics,
+    day: date,
+    moment_key: Optional[int],
+    error: Optional[str] = None,
+    run_key: Optional[int] = None,
+    snapshot: Optional[str] = None,
+) -> None:
+    """
+    Persists the outcome and metrics of an ingest in the run journal.
+
+    Args:
+        engine (Engine): The database engine.
+        metrics (Metrics): The metrics of the ingest.
+        day (date): The date ingested.
+        moment_key (Optional[int]): The MomentKey ingested, if it was resolved.
+        error (Optional[str]): The error of a failed ingest.
+        run_key (Optional[int]): The run opened by `start_run`. A new run is added when None.
+        snapshot (Optional[str]): The API snapshot ingested. Kept as it was when None.
+    """
+    stages, counters = metrics.stages, metrics.counters
+    row = {
+        "Day": day,
+        "MomentKey": moment_key,
+        "Status": "failed" if error else "success",
+        "Error": error[:1024] if error else None,
+        "StartedAt": metrics.started_at,
+        "FinishedAt": datetime.now(),
+        "TotalSeconds": metrics.elapsed(),
+    }
+    if snapshot is not None:
+        row["Snapshot"] = snapshot
+    for stage in STAGES:
+        column = "".join(part.capitalize() for part in stage.split("_")) + "Seconds"
+        row[column] = stages.get(stage, 0.0)
+    for counter in COUNTERS:
+        column = "".join(part.capitalize() for part in counter.split("_"))
+        row[column] = counters.get(counter, 0)
+
+    table = IngestRun.__table__
+    with engine.begin() as conn:
+        if run_key is None:
+            conn.execute(insert(table), row)
+        else:
+            conn.execute(update(table).where(table.c.RunKey == run_key).values(row))
+
+
+@contextmanager
+def journal_run(
+    engine: Engine,
+    day: date,
+    moment_key: Optional[int],
+    source: str,
+    snapshot: Optional[str] = None,
+    metrics: Optional[Metrics] = None,
+) -> Iterator[int]:
+    """
+    Journals the ingest run in the enclosed block: opened on entry, and closed as
+    succeeded or failed (with the error) on exit.
+
+    Args:
+        engine (Engine): The database engine.
+        day (date): The date ingested.
+        moment_key (Optional[int]): The MomentKey ingested, if it is known.
+        source (str): What runs the ingest ('backfill', 'replay', ...).
+        snapshot (Optional[str]): The API snapshot ingested, if any.
+        metrics (Optional[Metrics]): The metrics of the ingest, recorded on exit.
+
+    Yields:
+        int: The RunKey of the run.
+    """
+    metrics = metrics or Metrics()
+    run_key = start_run(engine, day, moment_key, source, snapshot)
+    error = None
+    try:
+        yield run_key
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        raise
+    finally:
+        record_run(engine, metrics, day, moment_key, error, run_key=run_key)
+
+
+def unfinished_runs(engine: Engine) -> pd.DataFrame:
+    """
+    Lists the dates and moments whose last run did not succeed (it failed, or it is
+    still 'running' after a crash), to retry them from their snapshots.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        pd.DataFrame: The RunKey, Day, MomentKey, Status and Snapshot of those runs.
+    """
+    query = """
+    SELECT RunKey, Day, MomentKey, Status, Snapshot
+    FROM ingestrun
+    WHERE RunKey IN (
+        SELECT MAX(RunKey) FROM ingestrun
+        WHERE Status != 'migrated'
+        GROUP BY Day, MomentKey
+    )
+    AND Status IN ('failed', 'running')
+    ORDER BY Day, MomentKey
+    """
+    return pd.read_sql_query(query, engine)
@@ -0,0 +1,323 @@
+# Libraries
+import pandas as pd
+
+# Modules
+from datetime import date, datetime, timedelta
+from db.engine import connect
+from db.changelog import load_price_changes
+from db.layouts import fact_layout, load_wide_facts
+from db.models import DimDate
+from db.partitions import FactPartitions
+from etl.anomalies import flag_anomalies, store_price_stats
+from etl.dashboard import DASHBOARD_DAYS, dashboard_path, publish_dashboard
+from etl.dates import date_key
+from etl.load import load_facts
+from etl.metrics import Metrics
+from etl.rollups import refresh_rollups
+from etl.stations import active_stations, sync_stations
+from etl.transform import build_facts, key_lookup
+from functools import partial
+from logging import Logger
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+# Dimension tables needed to build facts
+DIMENSION_TABLES = ["dimdate", "dimstation", "dimproduct", "dimmoment", "dimbrand"]
+
+# Station dimension maintenance: versioning changes, only inserting new stations or none
+STATION_SYNC_MODES = ["full", "new", "off"]
+
+
+def ext_mom_id(hour: int) -> str:
+    """
+    Determines the stage of the day based on the given hour in 24-hour format.
+
+    Args:
+        hour (int): Hour in 24-hour format (0-23).
+
+    Returns:
+        str: The stage of the day:
+             - "Madrugada" for 1-5 hours.
+             - "Mañana" for 6-11 hours.
+             - "Mediodía" for 12 hours.
+             - "Tarde" for 13-19 hours.
+             - "Noche" for 20-23 hours.
+             - "Madrugada" for 0 hours.
+    """
+    if 1 <= hour < 6:
+        return "Madrugada"
+    elif 6 <= hour < 12:
+        return "Mañana"
+    elif hour == 12:
+        return "Mediodía"
+    elif 13 <= hour < 20:
+        return "Tarde"
+    elif 20 <= hour < 24:
+        return "Noche"
+    else:  # hour == 0
+        return "Madrugada"
+
+
+def read_dimensions(database_name: str, logger: Logger) -> Dict[str, pd.DataFrame]:
+    """
+    Reads the dimension tables from the database.
+
+    Args:
+        database_name (str): The path of the SQLite database.
+        logger (Logger): The logger of the running task.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The dimension tables by name.
+    """
+    conn = connect(database_name)
+    logger.info("Connected to database")
+
+    dimensions = {}
+    try:
+        for table_name in DIMENSION_TABLES:
+            dimensions[table_name] = pd.read_sql_query(
+                f"SELECT * FROM {table_name};", conn
+            )
+            logger.info(f"{table_name} successfully read")
+    finally:
+        conn.close()  # Closing connection
+
+    return dimensions
+
+
+def ensure_dim_dates(engine: Engine, start: date, end: date) -> int:
+    """
+    Inserts the dates of a range that are missing in the date dimension.
+
+    Args:
+        engine (Engine): The database engine.
+        start (date): The first date, inclusive.
+        end (date): The last date, inclusive.
+
+    Returns:
+        int: The number of inserted dates.
+    """
+    table = DimDate.__table__
+    days = pd.date_range(start, end, freq="D").to_pydatetime().tolist()
+    with engine.begin() as conn:
+        existing = {
+            row[0]
+            for row in conn.execute(
+                select(table.c.DateKey).where(
+                    table.c.DateKey.between(date_key(start), date_key(end))
+                )
+            )
+        }
+        now = datetime.now()
+        missing = [
+            {"DateKey": date_key(day), "DateID": day, "CreatedAt": now}
+            for day in days
+            if date_key(day) not in existing
+        ]
+        if missing:
+            conn.execute(insert(table), missing)
+    return len(missing)
+
+
+def date_moment_keys(
+    dimensions: Dict[str, pd.DataFrame], day: datetime, moment_id: str
+) -> Tuple[int, int]:
+    """
+    Resolves the DateKey and MomentKey of a date and moment of the day. The DateKey is
+    computed, only the MomentKey is looked up.
+
+    Args:
+        dimensions (Dict[str, pd.DataFrame]): The dimension tables by name.
+        day (datetime): The date of the facts.
+        moment_id (str): The moment of the day (e.g., 'Tarde').
+
+    Returns:
+        Tuple[int, int]: The DateKey and the MomentKey.
+    """
+    moment_key = key_lookup(dimensions["dimmoment"], "MomentID", "MomentKey")[
+        moment_id
+    ]
+    return date_key(day), int(moment_key)
+
+
+def ingest_payload(
+    payload: Dict[str, Any],
+    dimensions: Dict[str, pd.DataFrame],
+    engine: Engine,
+    day: datetime,
+    moment_id: str,
+    logger: Logger,
+    provinces: Optional[Iterable[str]] = None,
+    run_key: Optional[int] = None,
+    policy: str = "update",
+    station_sync: str = "new",
+    metrics: Optional[Metrics] = None,
+    partitions: Optional[FactPartitions] = None,
+) -> Dict[str, int]:
+    """
+    Builds the facts of a date and moment from an API payload and loads them.
+
+    Args:
+        payload (Dict[str, Any]): The API payload (live or from a snapshot).
+        dimensions (Dict[str, pd.DataFrame]): The dimension tables by name.
+        engine (Engine): The database engine.
+        day (datetime): The date of the facts.
+        moment_id (str): The moment of the day (e.g., 'Tarde').
+        logger (Logger): The logger of the running task.
+        provinces (Optional[Iterable[str]]): Province ids to keep. All when None.
+        run_key (Optional[int]): The ingest run loading the facts (`ingestrun` journal).
+        policy (str): The conflict policy for already loaded facts ('update', 'ignore' or 'error').
+        station_sync (str): How the station dimension is maintained from the payload:
+                            'full' versions changed stations (live payloads), 'new' only
+                            inserts unknown stations (past payloads) and 'off' skips it.
+                            The dimension tables are updated in place when it changes.
+        metrics (Optional[Metrics]): Collects the stage timings and counters.
+        partitions (Optional[FactPartitions]): The province partitions the facts are
+                                               loaded into. The fact table of the
+                                               database layout when None.
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+    """
+    if station_sync not in STATION_SYNC_MODES:
+        raise ValueError(f"Unknown station sync mode: {station_sync}")
+    metrics = metrics or Metrics()
+    day_key, moment_key = date_moment_keys(dimensions, day, moment_id)
+
+    # Dates past the end of the date dimension are added, so the facts always join it
+    if not (dimensions["dimdate"]["DateKey"] == day_key).any():
+        calendar_day = date(day.year, day.month, day.day)
+        ensure_dim_dates(engine, calendar_day, calendar_day)
+        dimensions["dimdate"] = pd.read_sql_query("SELECT * FROM dimdate;", engine)
+
+    # Keeping the station dimension up to date before resolving the station keys
+    if station_sync != "off":
+        with metrics.timer("station_sync"):
+            station_counts, changed = sync_stations(
+                payload["ListaEESSPrecio"],
+                dimensions["dimstation"],
+                engine,
+                versioning=station_sync == "full",
+            )
+            if changed:
+                dimensions["dimstation"] = pd.read_sql_query(
+                    "SELECT * FROM dimstation;", engine
+                )
+        logger.info(
+            f"{station_counts['new']} new stations, {station_counts['changed']} changed "
+            f"and {station_counts['unchanged']} unchanged"
+        )
+
+    # Live payloads use the current stations, past ones the versions valid that day
+    stations = active_stations(
+        dimensions["dimstation"], None if station_sync == "full" else day
+    )
+
+    # Building the facts (fuel prices) of every station at once
+    logger.info("Creating facts")
+    with metrics.timer("transform"):
+        facts, unmatched = build_facts(
+            payload["ListaEESSPrecio"],
+            stations,
+            dimensions["dimproduct"],
+            day_key,
+            moment_key,
+            provinces=provinces,
+        )
+        facts["RunKey"] = run_key
+
+    # Flagging the suspicious prices against the rolling statistics of each station
+    facts["Flags"], price_stats = flag_anomalies(
+        facts,
+        engine,
+        dimensions["dimproduct"],
+        metrics,
+        provinces=provinces,
+        partitions=partitions,
+    )
+    kept = set(provinces) if provinces is not None else None
+    seen = sum(
+        1
+        for station in payload["ListaEESSPrecio"]
+        if kept is None or station.get("IDProvincia") in kept
+    )
+    metrics.add("stations_seen", seen)
+    metrics.add("stations_matched", seen - len(unmatched))
+    metrics.add("stations_unmatched", len(unmatched))
+    metrics.add("facts_built", len(facts))
+    logger.info(f"{len(facts)} facts created, {int((facts['Flags'] > 0).sum())} flagged")
+    if unmatched:
+        logger.info(
+            f"{len(unmatched)} stations are not in our database: {sorted(unmatched)}"
+        )
+
+    # Fill data in database, with the statistics of the anomaly flags
+    logger.info("Loading facts in database")
+    store_stats = partial(store_price_stats, changed=price_stats)
+    with metrics.timer("load"):
+        if partitions is None:
+            with engine.connect() as conn:
+                layout = fact_layout(conn.connection.driver_connection)
+            if layout == "changes":
+                # The stations of the loaded provinces missing a price no longer sell it
+                covered = stations
+                if kept is not None:
+                    province_ids = stations["StationProvinceID"].astype(str).str.zfill(2)
+                    covered = stations[province_ids.isin(kept)]
+                counts = load_price_changes(
+                    facts,
+                    engine,
+                    policy,
+                    metrics=metrics,
+                    stations=covered["StationKey"],
+                    before_commit=store_stats,
+                )
+            else:
+                loader = load_wide_facts if layout == "wide" else load_facts
+                counts = loader(facts, engine, policy, metrics=metrics, before_commit=store_stats)
+        else:
+            station_provinces = key_lookup(stations, "StationKey", "StationProvinceID")
+            counts = partitions.load(
+                facts,
+                facts["StationKey"].map(station_provinces),
+                policy,
+                metrics=metrics,
+            )
+            # The partitions are other databases, the statistics follow their loads
+            with engine.begin() as conn:
+                store_stats(conn)
+    for key, value in counts.items():
+        metrics.add(f"rows_{key}", value)
+    logger.info(
+        f"{counts['inserted']} facts inserted, {counts['updated']} updated "
+        f"and {counts['skipped']} skipped"
+    )
+
+    # Refreshing the dashboard rollups of the stations with new prices
+    if counts["inserted"] or counts["updated"]:
+        rollups = refresh_rollups(
+            engine,
+            dimensions,
+            day_key,
+            moment_key,
+            facts["StationKey"].unique(),
+            partitions=partitions,
+            metrics=metrics,
+        )
+        logger.info(f"{rollups} price rollups refreshed")
+
+        # Publishing the dashboard data of the moment when the facts are in its window
+        today = date.today()
+        first_day = today - timedelta(days=DASHBOARD_DAYS - 1)
+        if engine.url.database and date_key(first_day) <= day_key <= date_key(today):
+            try:
+                rows = publish_dashboard(engine, moment_key, today, metrics=metrics)
+                logger.info(f"{rows} dashboard rows published")
+            except Exception as e:
+                # Without the file the dashboard reads the database, never stale data
+                dashboard_path(engine.url.database, moment_key).unlink(missing_ok=True)
+                logger.warning(f"Error publishing the dashboard data: {e}")
+
+    return counts
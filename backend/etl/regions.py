@@ -0,0 +1,117 @@
+# Modules
+from typing import List
+
+
+# Provinces as published by the ministry: IDProvincia -> (Provincia, IDCCAA)
+PROVINCES = {
+    "01": ("ARABA/ÁLAVA", 16),
+    "02": ("ALBACETE", 7),
+    "03": ("ALICANTE", 10),
+    "04": ("ALMERÍA", 1),
+    "05": ("ÁVILA", 8),
+    "06": ("BADAJOZ", 11),
+    "07": ("BALEARS (ILLES)", 4),
+    "08": ("BARCELONA", 9),
+    "09": ("BURGOS", 8),
+    "10": ("CÁCERES", 11),
+    "11": ("CÁDIZ", 1),
+    "12": ("CASTELLÓN / CASTELLÓ", 10),
+    "13": ("CIUDAD REAL", 7),
+    "14": ("CÓRDOBA", 1),
+    "15": ("CORUÑA (A)", 12),
+    "16": ("CUENCA", 7),
+    "17": ("GIRONA", 9),
+    "18": ("GRANADA", 1),
+    "19": ("GUADALAJARA", 7),
+    "20": ("GIPUZKOA", 16),
+    "21": ("HUELVA", 1),
+    "22": ("HUESCA", 2),
+    "23": ("JAÉN", 1),
+    "24": ("LEÓN", 8),
+    "25": ("LLEIDA", 9),
+    "26": ("RIOJA (LA)", 17),
+    "27": ("LUGO", 12),
+    "28": ("MADRID", 13),
+    "29": ("MÁLAGA", 1),
+    "30": ("MURCIA", 14),
+    "31": ("NAVARRA", 15),
+    "32": ("OURENSE", 12),
+    "33": ("ASTURIAS", 3),
+    "34": ("PALENCIA", 8),
+    "35": ("PALMAS (LAS)", 5),
+    "36": ("PONTEVEDRA", 12),
+    "37": ("SALAMANCA", 8),
+    "38": ("SANTA CRUZ DE TENERIFE", 5),
+    "39": ("CANTABRIA", 6),
+    "40": ("SEGOVIA", 8),
+    "41": ("SEVILLA", 1),
+    "42": ("SORIA", 8),
+    "43": ("TARRAGONA", 9),
+    "44": ("TERUEL", 2),
+    "45": ("TOLEDO", 7),
+    "46": ("VALENCIA / VALÈNCIA", 10),
+    "47": ("VALLADOLID", 8),
+    "48": ("BIZKAIA", 16),
+    "49": ("ZAMORA", 8),
+    "50": ("ZARAGOZA", 2),
+    "51": ("CEUTA", 18),
+    "52": ("MELILLA", 19),
+}
+
+# Autonomous communities by IDCCAA
+AC_NAMES = {
+    1: "ANDALUCÍA",
+    2: "ARAGÓN",
+    3: "PRINCIPADO DE ASTURIAS",
+    4: "ILLES BALEARS",
+    5: "CANARIAS",
+    6: "CANTABRIA",
+    7: "CASTILLA-LA MANCHA",
+    8: "CASTILLA Y LEÓN",
+    9: "CATALUÑA",
+    10: "COMUNITAT VALENCIANA",
+    11: "EXTREMADURA",
+    12: "GALICIA",
+    13: "COMUNIDAD DE MADRID",
+    14: "REGIÓN DE MURCIA",
+    15: "COMUNIDAD FORAL DE NAVARRA",
+    16: "PAÍS VASCO",
+    17: "LA RIOJA",
+    18: "CEUTA",
+    19: "MELILLA",
+}
+
+
+def resolve_provinces(spec: str) -> List[str]:
+    """
+    Resolves a region set into province ids.
+
+    The set is a comma-separated list of province ids, autonomous communities
+    ('ccaa:<IDCCAA>') or 'all' for every province, e.g., '35,38', 'ccaa:5' (Canarias)
+    or 'ccaa:5,28' (Canarias and Madrid).
+
+    Args:
+        spec (str): The region set.
+
+    Returns:
+        List[str]: The province ids, sorted and without duplicates.
+    """
+    provinces = set()
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        if item.lower() == "all":
+            provinces.update(PROVINCES)
+        elif item.lower().startswith("ccaa:"):
+            ac_id = int(item.split(":", 1)[1])
+            if ac_id not in AC_NAMES:
+                raise ValueError(f"Unknown autonomous community: {item}")
+            provinces.update(
+                province for province, (_, ac) in PROVINCES.items() if ac == ac_id
+            )
+        else:
+            province = f"{int(item):02d}"
+            if province not in PROVINCES:
+                raise ValueError(f"Unknown province: {item}")
+            provinces.add(province)
+    return sorted(provinces)
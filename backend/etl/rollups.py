@@ -0,0 +1,290 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+# Modules
+from db.models import FLAG_UNRELIABLE, PRICE_SCALE, PriceRollup
+from db.partitions import FactPartitions
+from etl.brands import OTHER_BRAND
+from etl.load import compile_driver_sql, driver_rows
+from etl.metrics import Metrics
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Engine
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Geographic levels of the dashboard, as station columns
+GEO_LEVELS = ["StationAC", "StationProvince", "StationIsland", "StationMunicipality"]
+
+# Brand selections of every brand and of the stations matching no brand rule
+ALL_BRANDS = "TODAS"
+
+# Product groups of the dashboard, by ProductID
+PRODUCT_GROUPS = {
+    "Precio Biodiesel": "BIODIÉSEL",
+    "Precio Bioetanol": "BIOETANOL",
+    "Precio Gas Natural Comprimido": "GNC",
+    "Precio Gas Natural Licuado": "GNL",
+    "Precio Gases licuados del petróleo": "GLP",
+    "Precio Gasoleo A": "GASÓLEO A",
+    "Precio Gasoleo B": "GASÓLEO B",
+    "Precio Gasoleo Premium": "GASÓLEO PREMIUM",
+    "Precio Gasolina 95 E10": "GASOLINA 95",
+    "Precio Gasolina 95 E5": "GASOLINA 95",
+    "Precio Gasolina 95 E5 Premium": "GASOLINA 95",
+    "Precio Gasolina 98 E10": "GASOLINA 98",
+    "Precio Gasolina 98 E5": "GASOLINA 98",
+    "Precio Hidrogeno": "HIDRÓGENO",
+}
+
+# Quantile columns of the rollups
+QUANTILES = {"P25Price": 0.25, "MedianPrice": 0.5, "P75Price": 0.75}
+
+ROLLUP_KEYS = ["GeoLevel", "GeoEntity", "MomentKey", "DateKey", "Brand", "ProductGroup"]
+SLOT_QUERY = """
+SELECT DateKey, MomentKey, StationKey, ProductKey, PriceMilli, Flags
+FROM factdata
+WHERE MomentKey = :moment_key AND DateKey = :date_key
+"""
+
+
+def compute_rollups(
+    facts: pd.DataFrame,
+    dimstation: pd.DataFrame,
+    dimproduct: pd.DataFrame,
+    dimbrand: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Aggregates facts at every geographic level, brand (plus 'TODAS'), product group,
+    date and moment.
+
+    Args:
+        facts (pd.DataFrame): The facts (DateKey, MomentKey, StationKey, ProductKey, Price).
+        dimstation (pd.DataFrame): The station versions of the facts.
+        dimproduct (pd.DataFrame): The product dimension.
+        dimbrand (pd.DataFrame): The brand dimension.
+
+    Returns:
+        pd.DataFrame: One row per group, with the PriceRollup columns.
+    """
+    stations = dimstation.set_index("StationKey")
+    groups = dimproduct.set_index("ProductKey")["ProductID"].map(PRODUCT_GROUPS)
+    brands = (
+        stations["BrandKey"]
+        .map(dimbrand.set_index("BrandKey")["BrandName"])
+        .fillna(OTHER_BRAND)
+    )
+    base = pd.DataFrame(
+        {
+            "DateKey": facts["DateKey"].to_numpy(),
+            "MomentKey": facts["MomentKey"].to_numpy(),
+            "Price": facts["Price"].to_numpy(),
+            "ProductGroup": facts["ProductKey"].map(groups).to_numpy(),
+            "Brand": facts["StationKey"].map(brands).to_numpy(),
+        }
+    )
+
+    # Each fact counts once per level, for its brand and for every brand
+    frames = []
+    for level in GEO_LEVELS:
+        entities = facts["StationKey"].map(stations[level]).to_numpy()
+        keep = pd.notna(entities) & (entities != "") & base["ProductGroup"].notna()
+        part = base[keep].assign(GeoLevel=level, GeoEntity=entities[keep])
+        frames += [part, part.assign(Brand=ALL_BRANDS)]
+    rows = pd.concat(frames, ignore_index=True)
+    if rows.empty:
+        return pd.DataFrame(
+            columns=ROLLUP_KEYS
+            + ["MinPrice", "MaxPrice", "SumPrice", "PriceCount"]
+            + list(QUANTILES)
+        )
+
+    prices = rows.groupby(ROLLUP_KEYS, sort=False)["Price"]
+    rollups = prices.agg(
+        MinPrice="min", MaxPrice="max", SumPrice="sum", PriceCount="count"
+    )
+    quantiles = prices.quantile(list(QUANTILES.values())).unstack()
+    quantiles.columns = list(QUANTILES)
+    return rollups.join(quantiles).reset_index()
+
+
+def rollup_scope(dimstation: pd.DataFrame, station_keys: Iterable[int]) -> pd.DataFrame:
+    """
+    Finds the stations whose rollups change with the facts of some stations: those of
+    the same autonomous communities, and of any community sharing an entity name
+    (rollups are keyed by name, like the dashboard selection).
+
+    Args:
+        dimstation (pd.DataFrame): The station dimension.
+        station_keys (Iterable[int]): The StationKey of the new facts.
+
+    Returns:
+        pd.DataFrame: The station versions whose rollups are recomputed.
+    """
+    touched = dimstation[dimstation["StationKey"].isin(list(station_keys))]
+    shared = np.zeros(len(dimstation), dtype=bool)
+    for level in GEO_LEVELS:
+        names = set(touched[level].dropna()) - {""}
+        shared |= dimstation[level].isin(names).to_numpy()
+    ac_ids = dimstation.loc[shared, "StationACID"].unique()
+    return dimstation[dimstation["StationACID"].isin(ac_ids)]
+
+
+def read_slot(
+    engine: Engine,
+    date_key: int,
+    moment_key: int,
+    provinces: List[str],
+    partitions: Optional[FactPartitions] = None,
+) -> pd.DataFrame:
+    """
+    Reads the facts of a date and moment, through the `ix_factdata_moment_date` index.
+
+    Args:
+        engine (Engine): The database engine.
+        date_key (int): The DateKey.
+        moment_key (int): The MomentKey.
+        provinces (List[str]): The province ids whose partitions are read, if partitioned.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+
+    Returns:
+        pd.DataFrame: The facts, with their Price in euros.
+    """
+    params = {"date_key": date_key, "moment_key": moment_key}
+    if partitions is None:
+        facts = pd.read_sql_query(text(SLOT_QUERY), engine, params=params)
+    else:
+        with engine.connect() as conn:
+            facts = partitions.read_sql(
+                conn.connection.driver_connection,
+                SLOT_QUERY.replace(":moment_key", "?").replace(":date_key", "?"),
+                provinces,
+                params=[moment_key, date_key],
+            )
+    facts["Price"] = facts.pop("PriceMilli") / PRICE_SCALE
+    return facts
+
+
+def refresh_rollups(
+    engine: Engine,
+    dimensions: Dict[str, pd.DataFrame],
+    date_key: int,
+    moment_key: int,
+    station_keys: Iterable[int],
+    partitions: Optional[FactPartitions] = None,
+    metrics: Optional[Metrics] = None,
+) -> int:
+    """
+    Recomputes the rollups of a date and moment touched by new facts. Only the groups of
+    the touched stations are replaced, from the facts of that date and moment, so the
+    cost does not depend on the history size and minimums and maximums stay exact when
+    prices are corrected. Unreliable prices (`FLAG_UNRELIABLE`) are left out.
+
+    Args:
+        engine (Engine): The database engine.
+        dimensions (Dict[str, pd.DataFrame]): The dimension tables by name.
+        date_key (int): The DateKey of the new facts.
+        moment_key (int): The MomentKey of the new facts.
+        station_keys (Iterable[int]): The StationKey of the new facts.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+        metrics (Optional[Metrics]): Collects the rollup time.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    metrics = metrics or Metrics()
+    with metrics.timer("rollup"):
+        scope = rollup_scope(dimensions["dimstation"], station_keys)
+        if scope.empty:
+            return 0
+        provinces = [f"{int(p):02d}" for p in scope["StationProvinceID"].unique()]
+        facts = read_slot(engine, date_key, moment_key, provinces, partitions)
+        reliable = (facts["Flags"] & FLAG_UNRELIABLE) == 0
+        facts = facts[reliable & facts["StationKey"].isin(scope["StationKey"])]
+        rollups = compute_rollups(
+            facts, scope, dimensions["dimproduct"], dimensions["dimbrand"]
+        )
+
+        entities = {
+            (level, entity)
+            for level in GEO_LEVELS
+            for entity in scope[level].dropna().unique()
+            if entity != ""
+        }
+        replace_slot(engine, date_key, moment_key, sorted(entities), rollups)
+    return len(rollups)
+
+
+def replace_slot(
+    engine: Engine,
+    date_key: int,
+    moment_key: int,
+    entities: List[Tuple[str, str]],
+    rollups: pd.DataFrame,
+) -> None:
+    """
+    Replaces the rollups of some entities at a date and moment, in one transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        date_key (int): The DateKey.
+        moment_key (int): The MomentKey.
+        entities (List[Tuple[str, str]]): The (GeoLevel, GeoEntity) pairs replaced.
+        rollups (pd.DataFrame): Their new rollups.
+    """
+    table = PriceRollup.__table__
+    with engine.begin() as conn:
+        # Each entity is a primary key prefix
+        if entities:
+            conn.exec_driver_sql(
+                "DELETE FROM pricerollup "
+                "WHERE GeoLevel = ? AND GeoEntity = ? AND MomentKey = ? AND DateKey = ?",
+                [(level, entity, moment_key, date_key) for level, entity in entities],
+            )
+        if not rollups.empty:
+            sql, params = compile_driver_sql(insert(table), conn, list(rollups.columns))
+            conn.exec_driver_sql(sql, driver_rows(rollups, params, conn, table))
+
+
+def rebuild_rollups(
+    engine: Engine,
+    dimensions: Dict[str, pd.DataFrame],
+    partitions: Optional[FactPartitions] = None,
+    since: Optional[int] = None,
+) -> int:
+    """
+    Recomputes the rollups of every date and moment with facts, e.g., for a database
+    loaded before the rollups existed.
+
+    Args:
+        engine (Engine): The database engine.
+        dimensions (Dict[str, pd.DataFrame]): The dimension tables by name.
+        partitions (Optional[FactPartitions]): The province partitions of the facts.
+        since (Optional[int]): The first DateKey recomputed. Every date when None.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    query = "SELECT DISTINCT DateKey, MomentKey FROM factdata WHERE DateKey >= ?"
+    params = [since or 0]
+    if partitions is None:
+        with engine.connect() as conn:
+            slots = pd.read_sql_query(query, conn.connection.driver_connection, params=params)
+    else:
+        with engine.connect() as conn:
+            slots = partitions.read_sql(
+                conn.connection.driver_connection, query, params=params
+            ).drop_duplicates()
+
+    station_keys = dimensions["dimstation"]["StationKey"]
+    written = 0
+    for slot in slots.sort_values(["DateKey", "MomentKey"]).itertuples(index=False):
+        written += refresh_rollups(
+            engine,
+            dimensions,
+            int(slot.DateKey),
+            int(slot.MomentKey),
+            station_keys,
+            partitions,
+        )
+    return written
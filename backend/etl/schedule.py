@@ -0,0 +1,71 @@
+# Libraries
+import random
+
+# Modules
+from datetime import datetime, timedelta
+from etl.pipeline import ext_mom_id
+from typing import List, Optional, Tuple
+
+
+def moment_starts() -> List[Tuple[int, str]]:
+    """
+    Derives the hour at which each moment of the day starts from `ext_mom_id`.
+
+    Returns:
+        List[Tuple[int, str]]: The starting hour and the moment, in chronological order
+                               (e.g., [(0, 'Madrugada'), (6, 'Mañana'), ...]).
+    """
+    return [
+        (hour, ext_mom_id(hour))
+        for hour in range(24)
+        if hour == 0 or ext_mom_id(hour) != ext_mom_id(hour - 1)
+    ]
+
+
+def moment_window(when: datetime) -> Tuple[datetime, datetime]:
+    """
+    Returns the start and the end of the moment window containing a datetime.
+
+    Args:
+        when (datetime): Any datetime.
+
+    Returns:
+        Tuple[datetime, datetime]: The start (inclusive) and end (exclusive) of the window.
+    """
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    bounds = [day + timedelta(hours=hour) for hour, _ in moment_starts()]
+    bounds.append(day + timedelta(days=1))
+    for start, end in zip(bounds, bounds[1:]):
+        if start <= when < end:
+            return start, end
+
+
+def next_run(
+    now: datetime,
+    offset: timedelta = timedelta(minutes=5),
+    jitter: timedelta = timedelta(minutes=5),
+    rng: Optional[random.Random] = None,
+) -> Tuple[datetime, str]:
+    """
+    Computes when the next moment has to be ingested.
+
+    Each moment is ingested once, `offset` after its window starts plus a random
+    jitter, so the ministry is not hit at the exact same second every day.
+
+    Args:
+        now (datetime): The current datetime.
+        offset (timedelta): The delay after the start of each window.
+        jitter (timedelta): The maximum random delay added to the offset.
+        rng (Optional[random.Random]): The random generator. The global one when None.
+
+    Returns:
+        Tuple[datetime, str]: The datetime of the next run and its moment.
+    """
+    rng = rng or random
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for day_offset in [0, 1]:
+        for hour, moment_id in moment_starts():
+            start = day + timedelta(days=day_offset, hours=hour) + offset
+            if start > now:
+                delay = timedelta(seconds=rng.uniform(0, jitter.total_seconds()))
+                return start + delay, moment_id
@@ -0,0 +1,200 @@
+# Libraries
+import gzip
+import json
+import os
+import shutil
+
+# Modules
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+# Snapshot file names: <YYYYMMDD>_<MomentID>.json.gz
+SNAPSHOT_SUFFIX = ".json.gz"
+STATE_FILE = "state.json"
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Writes a file atomically, so readers never see it half written.
+
+    Args:
+        path (Path): The destination file.
+        data (bytes): The content of the file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """
+    A class which keeps the raw API payloads as compressed snapshots on disk.
+
+    Snapshots are stored per date and moment under `<root>/<YYYY>/<MM>/`. The store also
+    remembers the HTTP validators (ETag, Last-Modified) of the last responses and the
+    `Fecha` of the last payload, so unchanged data is not downloaded again.
+
+    Attributes:
+        root (Path): The directory holding the snapshots.
+        validators (dict): The HTTP validators of the last responses, by URL.
+        last_fecha (str): The `Fecha` field of the last stored payload.
+        latest (str): The path of the last stored snapshot, relative to `root`.
+    """
+
+    def __init__(self, root: str):
+        """
+        Initializes the store, reading its state file if it exists.
+
+        Args:
+            root (str): The directory holding the snapshots.
+        """
+        self.root = Path(root)
+        state_path = self.root / STATE_FILE
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+        self.validators = state.get("validators", {})
+        self.last_fecha = state.get("last_fecha")
+        self.latest = state.get("latest")
+
+    def path(self, day: date, moment_id: str) -> Path:
+        """
+        Builds the path of the snapshot of a date and moment.
+
+        Args:
+            day (date): The date of the snapshot.
+            moment_id (str): The moment of the day (e.g., 'Mañana').
+
+        Returns:
+            Path: The path of the snapshot.
+        """
+        return (
+            self.root
+            / day.strftime("%Y")
+            / day.strftime("%m")
+            / f"{day.strftime('%Y%m%d')}_{moment_id}{SNAPSHOT_SUFFIX}"
+        )
+
+    def save_state(self) -> None:
+        """
+        Persists the validators and the reference of the last snapshot.
+        """
+        state = {
+            "validators": self.validators,
+            "last_fecha": self.last_fecha,
+            "latest": self.latest,
+        }
+        write_atomic(self.root / STATE_FILE, json.dumps(state, indent=2).encode())
+
+    def save(
+        self, payload: Dict[str, Any], day: date, moment_id: str, latest: bool = True
+    ) -> Path:
+        """
+        Stores a payload as the snapshot of a date and moment.
+
+        Args:
+            payload (Dict[str, Any]): The API payload.
+            day (date): The date of the snapshot.
+            moment_id (str): The moment of the day (e.g., 'Mañana').
+            latest (bool): Whether it becomes the reference for the next conditional
+                           fetch. False for past dates (e.g., backfills).
+
+        Returns:
+            Path: The path of the stored snapshot.
+        """
+        path = self.path(day, moment_id)
+        raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        write_atomic(path, gzip.compress(raw, compresslevel=6))
+        if not latest:
+            return path
+
+        self.last_fecha = payload.get("Fecha")
+        self.latest = path.relative_to(self.root).as_posix()
+        self.save_state()
+        return path
+
+    def reuse_latest(self, day: date, moment_id: str) -> Optional[Path]:
+        """
+        Registers the last snapshot as the snapshot of a date and moment, because the
+        API did not publish new data. A hard link is used so no bytes are duplicated.
+
+        Args:
+            day (date): The date of the snapshot.
+            moment_id (str): The moment of the day (e.g., 'Mañana').
+
+        Returns:
+            Optional[Path]: The path of the snapshot, or None if there is no previous one.
+        """
+        if self.latest is None or not (self.root / self.latest).exists():
+            return None
+
+        source = self.root / self.latest
+        path = self.path(day, moment_id)
+        if path != source:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                path.unlink()
+            try:
+                os.link(source, path)
+            except OSError:
+                shutil.copyfile(source, path)
+        self.save_state()
+        return path
+
+    @staticmethod
+    def load(path: Path) -> Dict[str, Any]:
+        """
+        Reads a snapshot.
+
+        Args:
+            path (Path): The path of the snapshot.
+
+        Returns:
+            Dict[str, Any]: The API payload.
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_latest(self) -> Optional[Dict[str, Any]]:
+        """
+        Reads the last stored snapshot.
+
+        Returns:
+            Optional[Dict[str, Any]]: The API payload, or None if there is no snapshot.
+        """
+        if self.latest is None or not (self.root / self.latest).exists():
+            return None
+        return self.load(self.root / self.latest)
+
+    def iter_snapshots(
+        self, start: date, end: date, moment_id: Optional[str] = None
+    ) -> Iterator[Tuple[date, str, Path]]:
+        """
+        Iterates the stored snapshots of a date range in chronological order.
+
+        Args:
+            start (date): The first date, inclusive.
+            end (date): The last date, inclusive.
+            moment_id (Optional[str]): Only this moment when given (e.g., 'Noche').
+
+        Yields:
+            Tuple[date, str, Path]: The date, the moment and the path of each snapshot.
+        """
+        found = []
+        for path in self.root.glob(f"*/*/*{SNAPSHOT_SUFFIX}"):
+            day_str, snap_moment = path.name[: -len(SNAPSHOT_SUFFIX)].split("_", 1)
+            day = datetime.strptime(day_str, "%Y%m%d").date()
+            if start <= day <= end and moment_id in [None, snap_moment]:
+                found.append((day, snap_moment, path))
+
+        # Chronological order, moments following their position in the day
+        order = ["Madrugada", "Mañana", "Mediodía", "Tarde", "Noche"]
+        found.sort(
+            key=lambda item: (
+                item[0],
+                order.index(item[1]) if item[1] in order else len(order),
+            )
+        )
+        yield from found
@@ -0,0 +1,268 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+# Modules
+from datetime import datetime
+from db.models import DimStation
+from etl.brands import station_brand_keys
+from etl.regions import AC_NAMES
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+# API fields of a station and their DimStation columns
+STATION_FIELDS = {
+    "IDEESS": "StationID",
+    "Rótulo": "StationName",
+    "Dirección": "StationAddress",
+    "C.P.": "StationPostalCode",
+    "Latitud": "StationLatitude",
+    "Longitud (WGS84)": "StationLongitude",
+    "Localidad": "StationLocation",
+    "Municipio": "StationMunicipality",
+    "IDMunicipio": "StationMunicipalityID",
+    "Provincia": "StationProvince",
+    "IDProvincia": "StationProvinceID",
+    "IDCCAA": "StationACID",
+}
+
+# Attributes published by the API, compared through the content hash
+HASH_COLS = [
+    "StationName",
+    "StationAddress",
+    "StationPostalCode",
+    "StationLatitude",
+    "StationLongitude",
+    "StationLocation",
+    "StationMunicipality",
+    "StationMunicipalityID",
+    "StationProvince",
+    "StationProvinceID",
+    "StationACID",
+]
+TEXT_COLS = [
+    "StationName",
+    "StationAddress",
+    "StationPostalCode",
+    "StationLocation",
+    "StationMunicipality",
+    "StationProvince",
+]
+INT_COLS = ["StationID", "StationMunicipalityID", "StationProvinceID", "StationACID"]
+FLOAT_COLS = ["StationLatitude", "StationLongitude"]
+
+
+def normalize_names(values: pd.Series) -> pd.Series:
+    """
+    Normalizes place and station names the way the baseline does: the trailing article
+    used by the ministry is moved to the front (e.g., 'PALMAS (LAS)' -> 'LAS PALMAS') and
+    names are uppercased.
+
+    Args:
+        values (pd.Series): The names.
+
+    Returns:
+        pd.Series: The normalized names.
+    """
+    values = values.fillna("").astype(str).str.strip()
+    values = values.str.replace(r"^(.*\S)\s+\((\w+)\)$", r"\2 \1", regex=True)
+    return values.str.upper()
+
+
+def content_hash(df: pd.DataFrame) -> pd.Series:
+    """
+    Computes a hash of the API attributes of each station. Surrounding whitespace is
+    ignored, so it does not version stations.
+
+    Args:
+        df (pd.DataFrame): Stations with the `HASH_COLS` columns.
+
+    Returns:
+        pd.Series: One signed 64-bit hash per station.
+    """
+    attrs = pd.DataFrame(
+        {
+            col: (
+                df[col].astype(float).round(6)
+                if col in FLOAT_COLS
+                else df[col].astype("int64")
+                if col in INT_COLS
+                else df[col].fillna("").astype(str).str.strip()
+            )
+            for col in HASH_COLS
+        }
+    )
+    hashes = pd.util.hash_pandas_object(attrs, index=False).to_numpy()
+    return pd.Series(hashes.view(np.int64), index=df.index)
+
+
+def stations_from_payload(
+    stations: Iterable[Dict[str, Any]], dimstation: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Turns the `ListaEESSPrecio` elements into DimStation rows.
+
+    The API does not publish islands, so they are taken from the stations already known
+    in the same municipality.
+
+    Args:
+        stations (Iterable[Dict[str, Any]]): The `ListaEESSPrecio` elements of the API payload.
+        dimstation (pd.DataFrame): The station dimension.
+
+    Returns:
+        pd.DataFrame: One row per station with the DimStation columns and its content hash.
+    """
+    df = pd.DataFrame.from_records(list(stations), columns=list(STATION_FIELDS))
+    df = df.rename(columns=STATION_FIELDS).drop_duplicates("StationID", keep="last")
+
+    # Normalizing columns
+    for col in TEXT_COLS:
+        df[col] = normalize_names(df[col])
+    for col in FLOAT_COLS:
+        df[col] = pd.to_numeric(
+            df[col].astype(str).str.replace(",", ".", regex=False), errors="coerce"
+        )
+    for col in INT_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df.dropna(subset=INT_COLS + FLOAT_COLS).astype({col: "int64" for col in INT_COLS})
+
+    # Derived columns
+    df["StationAC"] = df["StationACID"].map(AC_NAMES).fillna("")
+    islands = dimstation.drop_duplicates("StationMunicipalityID", keep="last").set_index(
+        "StationMunicipalityID"
+    )
+    df["StationIsland"] = (
+        df["StationMunicipalityID"].map(islands["StationIsland"]).fillna("")
+    )
+    df["StationIslandID"] = (
+        df["StationMunicipalityID"].map(islands["StationIslandID"]).fillna(0).astype("int64")
+    )
+    df["ContentHash"] = content_hash(df)
+
+    return df.reset_index(drop=True)
+
+
+def active_stations(dimstation: pd.DataFrame, at: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Selects the version of each station valid at a given datetime.
+
+    Versions of a station are contiguous, so the valid one is the oldest version which
+    had not ended yet at that datetime.
+
+    Args:
+        dimstation (pd.DataFrame): The station dimension, with every version.
+        at (Optional[datetime]): The datetime. The current versions when None.
+
+    Returns:
+        pd.DataFrame: One row per station.
+    """
+    end_of_use = pd.to_datetime(dimstation["EndOfUse"])
+    if at is None:
+        valid = dimstation[end_of_use.isna()]
+    else:
+        valid = dimstation[end_of_use.isna() | (end_of_use > pd.Timestamp(at))]
+    return valid.sort_values("StationKey").drop_duplicates("StationID", keep="first")
+
+
+def sync_stations(
+    stations: Iterable[Dict[str, Any]],
+    dimstation: pd.DataFrame,
+    engine: Engine,
+    versioning: bool = True,
+    now: Optional[datetime] = None,
+) -> Tuple[Dict[str, int], bool]:
+    """
+    Maintains the station dimension (SCD type 2) from the stations of an API payload.
+
+    The API attributes are hashed and compared with the current version of each
+    station in one set-based pass. New stations are inserted and, when versioning,
+    stations whose attributes changed get their current version closed (`EndOfUse`)
+    and a new version inserted, classified into its brand (see `etl/brands.py`).
+    Nothing is written when nothing changed.
+
+    Args:
+        stations (Iterable[Dict[str, Any]]): The `ListaEESSPrecio` elements of the API payload.
+        dimstation (pd.DataFrame): The station dimension, with every version.
+        engine (Engine): The database engine.
+        versioning (bool): Whether changed stations are versioned. Only new stations are
+                           inserted otherwise (e.g., when replaying old payloads).
+        now (Optional[datetime]): The datetime of the change. Now when None.
+
+    Returns:
+        Tuple[Dict[str, int], bool]: The number of 'new', 'changed' and 'unchanged'
+                                     stations, and whether the dimension was written.
+    """
+    now = now or datetime.now()
+    table = DimStation.__table__
+    incoming = stations_from_payload(stations, dimstation)
+
+    # Current versions, read from the database so the 64-bit hashes stay exact
+    with engine.connect() as conn:
+        current = pd.DataFrame(
+            conn.execute(
+                select(table.c.StationKey, table.c.StationID, table.c.ContentHash).where(
+                    table.c.EndOfUse.is_(None)
+                )
+            ).all(),
+            columns=["StationKey", "StationID", "ContentHash"],
+        )
+    current = current.sort_values("StationKey").drop_duplicates("StationID", keep="first")
+
+    # Hashes of versions loaded before hashes existed are computed once and stored
+    missing_keys = current.loc[current["ContentHash"].isna(), "StationKey"]
+    if not missing_keys.empty:
+        missing = dimstation[dimstation["StationKey"].isin(missing_keys)]
+        hashes = pd.Series(content_hash(missing).to_numpy(), index=missing["StationKey"])
+        current["ContentHash"] = current["ContentHash"].fillna(current["StationKey"].map(hashes))
+        with engine.begin() as conn:
+            conn.execute(
+                update(table)
+                .where(table.c.StationKey == bindparam("b_StationKey"))
+                .values(ContentHash=bindparam("b_ContentHash")),
+                [
+                    {"b_StationKey": int(key), "b_ContentHash": int(value)}
+                    for key, value in hashes.items()
+                ],
+            )
+
+    # Hash join between the payload and the current versions
+    diff = incoming.merge(
+        current[["StationID", "StationKey", "ContentHash"]].rename(
+            columns={"ContentHash": "CurrentHash"}
+        ),
+        on="StationID",
+        how="left",
+    )
+    is_new = diff["StationKey"].isna()
+    is_changed = ~is_new & (diff["ContentHash"] != diff["CurrentHash"])
+    if not versioning:
+        is_changed[:] = False
+
+    counts = {
+        "new": int(is_new.sum()),
+        "changed": int(is_changed.sum()),
+        "unchanged": int((~is_new & ~is_changed).sum()),
+    }
+    if not (is_new.any() or is_changed.any()):
+        return counts, False
+
+    # Closing changed versions and inserting the new ones in one transaction
+    cols = [col.name for col in table.columns if col.name not in ["StationKey", "EndOfUse"]]
+    rows = diff[is_new | is_changed].assign(CreatedAt=now)
+    with engine.begin() as conn:
+        rows["BrandKey"] = station_brand_keys(rows["StationName"], conn)
+        if is_changed.any():
+            conn.execute(
+                update(table)
+                .where(table.c.StationKey == bindparam("b_StationKey"))
+                .values(EndOfUse=now),
+                [
+                    {"b_StationKey": int(key)}
+                    for key in diff.loc[is_changed, "StationKey"]
+                ],
+            )
+        conn.execute(insert(table), rows[cols].to_dict("records"))
+
+    return counts, True
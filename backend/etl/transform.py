@@ -0,0 +1,130 @@
+# Libraries
+import pandas as pd
+
+# Modules
+from db.models import PRICE_SCALE
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Columns of a ListaEESSPrecio element needed to build facts
+STATION_ID_COL = "IDEESS"
+PROVINCE_ID_COL = "IDProvincia"
+
+
+def key_lookup(df: pd.DataFrame, id_col: str, key_col: str) -> pd.Series:
+    """
+    Builds a hash lookup from a dimension business id to its surrogate key.
+
+    Args:
+        df (pd.DataFrame): The dimension table.
+        id_col (str): The name of the business id column (e.g., 'StationID').
+        key_col (str): The name of the surrogate key column (e.g., 'StationKey').
+
+    Returns:
+        pd.Series: The surrogate keys indexed by business id. When an id is repeated
+                   the last row wins.
+    """
+    lookup = df[[id_col, key_col]].drop_duplicates(subset=id_col, keep="last")
+    return lookup.set_index(id_col)[key_col]
+
+
+def parse_prices(values: pd.Series) -> pd.Series:
+    """
+    Converts price strings with commas as decimal separators into floats.
+
+    Args:
+        values (pd.Series): Price strings (e.g., "1,234"). Empty strings are allowed.
+
+    Returns:
+        pd.Series: The prices as floats, NaN where the string was empty or invalid.
+    """
+    return pd.to_numeric(
+        values.astype("string").str.replace(",", ".", regex=False), errors="coerce"
+    )
+
+
+def payload_to_frame(
+    stations: Iterable[Dict[str, Any]],
+    product_ids: List[str],
+    provinces: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    Turns the `ListaEESSPrecio` elements into a DataFrame in a single pass.
+
+    Args:
+        stations (Iterable[Dict[str, Any]]): The `ListaEESSPrecio` elements of the API payload.
+        product_ids (List[str]): The price columns to keep (e.g., 'Precio Gasoleo A').
+        provinces (Optional[Iterable[str]]): Province ids to keep (e.g., ['35', '38']).
+                                             All stations are kept when None.
+
+    Returns:
+        pd.DataFrame: One row per station with its id, province and price columns.
+    """
+    columns = [STATION_ID_COL, PROVINCE_ID_COL] + list(product_ids)
+    df = pd.DataFrame.from_records(list(stations), columns=columns)
+    if provinces is not None:
+        df = df[df[PROVINCE_ID_COL].isin(list(provinces))]
+    return df
+
+
+def build_facts(
+    stations: Iterable[Dict[str, Any]],
+    dimstation: pd.DataFrame,
+    dimproduct: pd.DataFrame,
+    date_key: int,
+    moment_key: int,
+    provinces: Optional[Iterable[str]] = None,
+) -> Tuple[pd.DataFrame, Set[int]]:
+    """
+    Builds the fuel price facts of one moment from the API station list.
+
+    The price columns are melted into one row per (station, product), the prices are
+    parsed at once and the station and product keys are resolved through hash joins
+    against the dimension tables, so the cost is linear in the payload size.
+
+    Args:
+        stations (Iterable[Dict[str, Any]]): The `ListaEESSPrecio` elements of the API payload.
+        dimstation (pd.DataFrame): The station dimension (StationID, StationKey).
+        dimproduct (pd.DataFrame): The product dimension (ProductID, ProductKey).
+        date_key (int): The DateKey of the facts.
+        moment_key (int): The MomentKey of the facts.
+        provinces (Optional[Iterable[str]]): Province ids to keep. All when None.
+
+    Returns:
+        Tuple[pd.DataFrame, Set[int]]: The facts (DateKey, StationKey, ProductKey, MomentKey,
+                                       PriceMilli) and the ids of the stations that are not in
+                                       the station dimension.
+    """
+    product_lookup = key_lookup(dimproduct, "ProductID", "ProductKey")
+    station_lookup = key_lookup(dimstation, "StationID", "StationKey")
+
+    df = payload_to_frame(stations, product_lookup.index.tolist(), provinces)
+    station_ids = pd.to_numeric(df[STATION_ID_COL], errors="coerce")
+
+    # Stations not present in the dimension are reported once, as a set
+    station_keys = station_ids.map(station_lookup)
+    unmatched = set(station_ids[station_keys.isna()].dropna().astype(int).tolist())
+
+    # One row per published price
+    prices = df[product_lookup.index.tolist()]
+    prices.index = station_keys.to_numpy()
+    long_df = prices[station_keys.notna().to_numpy()].melt(
+        var_name="ProductID", value_name="RawPrice", ignore_index=False
+    )
+    long_df = long_df[long_df["RawPrice"].notna() & (long_df["RawPrice"] != "")]
+
+    facts = pd.DataFrame(
+        {
+            "DateKey": date_key,
+            "StationKey": long_df.index.to_numpy().astype("int64"),
+            "ProductKey": long_df["ProductID"].map(product_lookup).to_numpy(),
+            "MomentKey": moment_key,
+            "PriceMilli": (parse_prices(long_df["RawPrice"]) * PRICE_SCALE)
+            .round()
+            .to_numpy(),
+        }
+    )
+    facts = facts.dropna(subset=["PriceMilli"]).reset_index(drop=True)
+    facts = facts.astype({"ProductKey": "int64", "PriceMilli": "int64"})
+
+    return facts, unmatched
@@ -0,0 +1,25 @@
+# Public API of the ingestion, cheap to import
+from fuelprices.api import (
+    archive_facts,
+    bootstrap,
+    classify_brands,
+    convert_facts,
+    create_schema,
+    ingest,
+    partition_facts,
+    rebuild_rollups,
+)
+from fuelprices.config import Settings, load_settings
+
+__all__ = [
+    "Settings",
+    "archive_facts",
+    "bootstrap",
+    "classify_brands",
+    "convert_facts",
+    "create_schema",
+    "ingest",
+    "load_settings",
+    "partition_facts",
+    "rebuild_rollups",
+]
@@ -0,0 +1,4 @@
+# Modules
+from fuelprices.cli import main
+
+main()
@@ -0,0 +1,319 @@
+# Modules
+from datetime import date, datetime, timedelta
+from fuelprices.config import Settings, load_settings
+from logging import Logger
+from typing import Dict, Optional
+
+# Heavy dependencies (pandas, SQLAlchemy, requests) are imported inside the functions,
+# so importing the package stays cheap
+
+# Ingestors kept warm between in-process calls, by database URL
+_ingestors = {}
+
+
+def get_logger(logger: Optional[Logger] = None) -> Logger:
+    """
+    Returns the given logger, or the logger of the package.
+
+    Args:
+        logger (Optional[Logger]): The logger of the caller.
+
+    Returns:
+        Logger: The logger to use.
+    """
+    if logger is not None:
+        return logger
+
+    from utils.logger_config import setup_logger
+
+    return setup_logger("fuelprices", "logs/fuelprices.log")
+
+
+def get_ingestor(settings: Settings, logger: Logger):
+    """
+    Returns the ingestor of a configuration, creating it on first use.
+
+    Args:
+        settings (Settings): The settings.
+        logger (Logger): The logger of the running task.
+
+    Returns:
+        Ingestor: The ingestor.
+    """
+    if settings not in _ingestors:
+        from etl.ingestor import Ingestor
+
+        _ingestors[settings] = Ingestor(
+            settings.database_name,
+            settings.database_url,
+            settings.api_link,
+            list(settings.provinces),
+            settings.fetch_mode,
+            settings.snapshot_dir,
+            settings.load_policy,
+            logger,
+            metrics_path=settings.metrics_path,
+            fact_partitioning=settings.fact_partitioning,
+        )
+    return _ingestors[settings]
+
+
+def ingest(
+    moment: Optional[str] = None,
+    day: Optional[date] = None,
+    settings: Optional[Settings] = None,
+    logger: Optional[Logger] = None,
+) -> Dict[str, int]:
+    """
+    Ingests the prices currently published by the API.
+
+    Args:
+        moment (Optional[str]): The moment of the day the prices are loaded into
+                                (e.g., 'Tarde'). The current one when None.
+        day (Optional[date]): The date the prices are loaded into. Today when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        Dict[str, int]: The number of 'inserted', 'updated' and 'skipped' facts.
+    """
+    settings = settings or load_settings()
+    ingestor = get_ingestor(settings, get_logger(logger))
+
+    now = datetime.now()
+    when = datetime.combine(day, now.time()) if day else now
+    return ingestor.run(when, moment)
+
+
+def create_schema(
+    settings: Optional[Settings] = None, logger: Optional[Logger] = None
+) -> None:
+    """
+    Creates the tables of the star schema, upgrading an existing database.
+
+    Args:
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+    """
+    from db.creation import create_database
+    from db.engine import get_engine
+
+    settings = settings or load_settings()
+    create_database(get_engine(settings.database_url), get_logger(logger))
+
+
+def bootstrap(
+    settings: Optional[Settings] = None, logger: Optional[Logger] = None
+) -> Dict[str, int]:
+    """
+    Creates the schema and loads the dimension tables of a new database, with the fact
+    layout of the `FACT_LAYOUT` setting. It can run again on a loaded database, which
+    only adds the missing dimension rows and refreshes the baseline ones.
+
+    Args:
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        Dict[str, int]: The number of dimension rows written by table.
+
+    Raises:
+        ValueError: If the baseline of the stations is invalid.
+    """
+    from db.creation import create_database
+    from scripts.initial_bulk import initial_bulk
+    from db.engine import get_engine
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    engine = get_engine(settings.database_url)
+    create_database(engine, logger)
+    counts = initial_bulk(engine, logger)
+    if settings.fact_layout != "long":
+        convert_facts(settings.fact_layout, settings, logger)
+    return counts
+
+
+def partition_facts(
+    settings: Optional[Settings] = None, logger: Optional[Logger] = None
+) -> Dict[str, int]:
+    """
+    Moves the facts of the `factdata` table into the province partitions, to switch an
+    existing database to `FACT_PARTITIONING=province`.
+
+    Args:
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        Dict[str, int]: The number of facts moved, by province.
+    """
+    from db.engine import connect
+    from db.layouts import fact_layout
+    from db.partitions import FactPartitions, partition_dir
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    conn = connect(settings.database_name)
+    try:
+        layout = fact_layout(conn)
+        if layout != "long":
+            raise ValueError(f"The {layout} layout does not support province partitions")
+    finally:
+        conn.close()
+    partitions = FactPartitions(partition_dir(settings.database_name))
+    moved = partitions.import_facts(settings.database_name)
+    logger.info(f"{sum(moved.values())} facts moved to {len(moved)} partitions")
+    return moved
+
+
+def convert_facts(
+    layout: Optional[str] = None,
+    settings: Optional[Settings] = None,
+    logger: Optional[Logger] = None,
+) -> int:
+    """
+    Switches the facts of the database to a layout: the `factdata` table (one row per
+    price), or the `factwide` table (one row per station, date and moment) or the
+    `pricechange` table (one row per price change) behind a `factdata` view, which the
+    readers query as before.
+
+    Args:
+        layout (Optional[str]): The layout ('long', 'wide' or 'changes'). The
+                                `FACT_LAYOUT` setting when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        int: The number of rows of the new layout, 0 when it was already in use.
+    """
+    from db.layouts import convert_facts as convert
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    layout = layout or settings.fact_layout
+    rows = convert(settings.database_name, layout)
+    logger.info(f"Facts stored in the {layout} layout ({rows} rows converted)")
+    return rows
+
+
+def rebuild_rollups(
+    since: Optional[date] = None,
+    settings: Optional[Settings] = None,
+    logger: Optional[Logger] = None,
+) -> int:
+    """
+    Recomputes the dashboard price rollups from the facts, e.g., for a database loaded
+    before they existed or after a backfill outside the ingest.
+
+    Args:
+        since (Optional[date]): The first date recomputed. Every date when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    from db.engine import get_engine
+    from db.partitions import FactPartitions, partition_dir
+    from etl.dates import date_key
+    from etl.pipeline import read_dimensions
+    from etl.rollups import rebuild_rollups as rebuild
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    partitions = (
+        FactPartitions(partition_dir(settings.database_name))
+        if settings.fact_partitioning == "province"
+        else None
+    )
+    written = rebuild(
+        get_engine(settings.database_url),
+        read_dimensions(settings.database_name, logger),
+        partitions=partitions,
+        since=date_key(since) if since else None,
+    )
+    logger.info(f"{written} price rollups rebuilt")
+    return written
+
+
+def classify_brands(
+    settings: Optional[Settings] = None, logger: Optional[Logger] = None
+) -> int:
+    """
+    Classifies every station into its brand again, after the brand rules (`BRAND_RULES`)
+    changed. The rollups keep the old brands until `rebuild_rollups`.
+
+    Args:
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        int: The number of reclassified station versions.
+    """
+    from db.engine import get_engine
+    from db.migrations import migrate
+    from etl.brands import classify_stations
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    engine = get_engine(settings.database_url)
+    migrate(engine)
+    with engine.begin() as conn:
+        changed = classify_stations(conn)
+    logger.info(f"{changed} stations reclassified into their brand")
+    return changed
+
+
+def archive_facts(
+    horizon_days: Optional[int] = None,
+    vacuum: bool = False,
+    settings: Optional[Settings] = None,
+    logger: Optional[Logger] = None,
+) -> Dict[int, int]:
+    """
+    Moves the facts older than the horizon from SQLite into the Parquet archive.
+
+    Args:
+        horizon_days (Optional[int]): The days of facts kept in SQLite. The
+                                      `ARCHIVE_HORIZON_DAYS` setting when None.
+        vacuum (bool): Whether to shrink the SQLite files afterwards (rewrites them).
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+        logger (Optional[Logger]): The logger. The package logger when None.
+
+    Returns:
+        Dict[int, int]: The number of facts moved, by month (YYYYMM).
+    """
+    from db.archive import MIN_HORIZON_DAYS, FactArchive, archive_dir
+    from db.engine import connect
+    from db.partitions import FactPartitions, partition_dir
+    from etl.dates import date_key
+
+    settings = settings or load_settings()
+    logger = get_logger(logger)
+    horizon_days = settings.archive_horizon_days if horizon_days is None else horizon_days
+    if horizon_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"The archive horizon must be {MIN_HORIZON_DAYS} days at least")
+
+    partitions = (
+        FactPartitions(partition_dir(settings.database_name))
+        if settings.fact_partitioning == "province"
+        else None
+    )
+    cutoff_key = date_key(date.today() - timedelta(days=horizon_days))
+    archive = FactArchive(archive_dir(settings.database_name))
+    moved = archive.archive_facts(settings.database_name, cutoff_key, partitions)
+    logger.info(f"{sum(moved.values())} facts before {cutoff_key} archived")
+
+    if vacuum:
+        paths = [settings.database_name]
+        if partitions is not None:
+            paths += [partitions.path(p) for p in partitions.provinces()]
+        for path in paths:
+            conn = connect(str(path))
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        logger.info(f"{len(paths)} databases vacuumed")
+    return moved
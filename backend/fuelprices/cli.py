@@ -0,0 +1,117 @@
+# Libraries
+import argparse
+import json
+
+# Modules
+from datetime import datetime
+from typing import List, Optional
+
+# Subcommands implemented by the scripts, which parse their own arguments
+SCRIPT_COMMANDS = {
+    "schedule": ("scripts.scheduler", "Run the resident scheduler (or print its --status)."),
+    "backfill": ("scripts.backfill", "Load historical prices of a date range."),
+    "replay": ("scripts.replay", "Rebuild the facts of a date range from the snapshots."),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser of the command line interface.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="fuelprices", description="Fuel prices ingestion for the star schema."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("create-schema", help="Create or upgrade the database schema.")
+    commands.add_parser("bootstrap", help="Create the schema and load the dimensions.")
+    commands.add_parser("settings", help="Print the settings read from the environment.")
+
+    ingest_parser = commands.add_parser("ingest", help="Ingest the current prices.")
+    ingest_parser.add_argument(
+        "--moment", help="Moment the prices are loaded into (e.g., 'Tarde')."
+    )
+    ingest_parser.add_argument("--date", help="Date the prices are loaded into (YYYY-MM-DD).")
+
+    commands.add_parser(
+        "partition-facts", help="Move the facts into the province partitions."
+    )
+
+    layout_parser = commands.add_parser(
+        "convert-facts", help="Switch the facts to the long, wide or change log layout."
+    )
+    layout_parser.add_argument(
+        "--layout",
+        choices=["long", "wide", "changes"],
+        help="Target layout (FACT_LAYOUT by default).",
+    )
+
+    rollups_parser = commands.add_parser(
+        "rebuild-rollups", help="Recompute the dashboard price rollups from the facts."
+    )
+    rollups_parser.add_argument("--since", help="First date recomputed (YYYY-MM-DD).")
+
+    commands.add_parser(
+        "classify-brands", help="Classify the stations again with the brand rules."
+    )
+
+    archive_parser = commands.add_parser(
+        "archive-facts", help="Move the old facts into the Parquet archive."
+    )
+    archive_parser.add_argument(
+        "--horizon-days", type=int, help="Days of facts kept in SQLite."
+    )
+    archive_parser.add_argument(
+        "--vacuum", action="store_true", help="Shrink the SQLite files afterwards."
+    )
+
+    for command, (_, help_text) in SCRIPT_COMMANDS.items():
+        commands.add_parser(command, help=help_text, add_help=False)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the command line interface. Heavy modules are only imported by the
+    subcommands needing them, so `--help` and `settings` start immediately.
+
+    Args:
+        argv (Optional[List[str]]): The arguments. Those of the process when None.
+    """
+    args, extra = build_parser().parse_known_args(argv)
+
+    if args.command in SCRIPT_COMMANDS:
+        from importlib import import_module
+
+        import_module(SCRIPT_COMMANDS[args.command][0]).main(extra)
+        return
+    if extra:
+        build_parser().error(f"unrecognized arguments: {' '.join(extra)}")
+
+    import fuelprices
+
+    if args.command == "settings":
+        print(json.dumps(fuelprices.load_settings().__dict__, indent=2))
+    elif args.command == "create-schema":
+        fuelprices.create_schema()
+    elif args.command == "bootstrap":
+        print(json.dumps(fuelprices.bootstrap()))
+    elif args.command == "ingest":
+        day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+        counts = fuelprices.ingest(args.moment, day)
+        print(json.dumps(counts))
+    elif args.command == "partition-facts":
+        print(json.dumps(fuelprices.partition_facts()))
+    elif args.command == "convert-facts":
+        print(json.dumps({"rows": fuelprices.convert_facts(args.layout)}))
+    elif args.command == "rebuild-rollups":
+        since = datetime.strptime(args.since, "%Y-%m-%d").date() if args.since else None
+        print(json.dumps({"rollups": fuelprices.rebuild_rollups(since)}))
+    elif args.command == "classify-brands":
+        print(json.dumps({"stations": fuelprices.classify_brands()}))
+    elif args.command == "archive-facts":
+        print(json.dumps(fuelprices.archive_facts(args.horizon_days, args.vacuum)))
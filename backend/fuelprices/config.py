@@ -0,0 +1,94 @@
+# Libraries
+import os
+
+# Modules
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from etl.regions import resolve_provinces
+from typing import Tuple
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    The configuration of the ingestion, read from the environment (`.env`).
+
+    Attributes:
+        database_name (str): The path of the SQLite database.
+        database_url (str): The SQLAlchemy URL of the database.
+        api_link (str): The URL of the nationwide `EstacionesTerrestres/` endpoint.
+        api_hist_link (str): The URL of the historical `EstacionesTerrestresHist/` endpoint.
+        provinces (Tuple[str, ...]): The province ids to ingest, resolved from a region
+                                     set (e.g., '35,38', 'ccaa:5' or 'all').
+        fetch_mode (str): The fetch mode ('province' or 'stream').
+        snapshot_dir (str): The directory of the raw API snapshots.
+        load_policy (str): The conflict policy for already loaded facts.
+        metrics_path (str): The Prometheus textfile with the metrics of the last ingest.
+        fact_partitioning (str): The fact storage partitioning ('none' or 'province').
+        fact_layout (str): The fact table layout of new databases ('long', 'wide' or
+                           'changes').
+        archive_horizon_days (int): The days of facts kept in SQLite, older ones being
+                                    moved to the Parquet archive.
+        schedule_offset_minutes (int): The minutes the scheduler waits after the start
+                                       of a moment.
+        schedule_jitter_seconds (int): The random delay added to each scheduled run.
+        schedule_max_retries (int): The retries of a failed scheduled run.
+        schedule_retry_seconds (int): The base delay between those retries.
+        scheduler_status (str): The JSON status file of the scheduler.
+        backfill_moment (str): The moment the historical prices are loaded into.
+        backfill_workers (int): The concurrent downloads of a backfill.
+        backfill_rate (float): The maximum requests per second of a backfill.
+    """
+
+    database_name: str
+    database_url: str
+    api_link: str
+    api_hist_link: str
+    provinces: Tuple[str, ...]
+    fetch_mode: str
+    snapshot_dir: str
+    load_policy: str
+    metrics_path: str
+    fact_partitioning: str
+    fact_layout: str
+    archive_horizon_days: int
+    schedule_offset_minutes: int = 5
+    schedule_jitter_seconds: int = 300
+    schedule_max_retries: int = 3
+    schedule_retry_seconds: int = 120
+    scheduler_status: str = "logs/scheduler_status.json"
+    backfill_moment: str = "Madrugada"
+    backfill_workers: int = 4
+    backfill_rate: float = 2.0
+
+
+def load_settings() -> Settings:
+    """
+    Reads the settings from the environment, loading the `.env` file first.
+
+    Returns:
+        Settings: The settings.
+    """
+    load_dotenv()
+    return Settings(
+        database_name=os.getenv("DATABASE_NAME"),
+        database_url=os.getenv("DATABASE_URL"),
+        api_link=os.getenv("API_LINK"),
+        api_hist_link=os.getenv("API_HIST_LINK"),
+        provinces=tuple(resolve_provinces(os.getenv("PROVINCES", "35,38"))),
+        fetch_mode=os.getenv("FETCH_MODE", "province"),
+        snapshot_dir=os.getenv("SNAPSHOT_DIR", "data/snapshots"),
+        load_policy=os.getenv("LOAD_POLICY", "update"),
+        metrics_path=os.getenv("METRICS_TEXTFILE", "logs/fuelprices_ingest.prom"),
+        fact_partitioning=os.getenv("FACT_PARTITIONING", "none"),
+        fact_layout=os.getenv("FACT_LAYOUT", "long"),
+        archive_horizon_days=int(os.getenv("ARCHIVE_HORIZON_DAYS", "90")),
+        schedule_offset_minutes=int(os.getenv("SCHEDULE_OFFSET_MINUTES", "5")),
+        schedule_jitter_seconds=int(os.getenv("SCHEDULE_JITTER_SECONDS", "300")),
+        schedule_max_retries=int(os.getenv("SCHEDULE_MAX_RETRIES", "3")),
+        schedule_retry_seconds=int(os.getenv("SCHEDULE_RETRY_SECONDS", "120")),
+        scheduler_status=os.getenv("SCHEDULER_STATUS", "logs/scheduler_status.json"),
+        backfill_moment=os.getenv("BACKFILL_MOMENT", "Madrugada"),
+        backfill_workers=int(os.getenv("BACKFILL_WORKERS", "4")),
+        backfill_rate=float(os.getenv("BACKFILL_RATE", "2")),
+    )
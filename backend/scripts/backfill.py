@@ -0,0 +1,255 @@
+# Libraries
+import argparse
+import pandas as pd
+import time
+
+# Modules
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from db.engine import get_engine
+from db.migrations import migrate
+from db.models import BackfillProgress
+from db.partitions import FactPartitions, partition_dir
+from etl.fetch import create_session, fetch_historical
+from etl.metrics import Metrics, journal_run
+from etl.pipeline import (
+    date_moment_keys,
+    ensure_dim_dates,
+    ingest_payload,
+    read_dimensions,
+)
+from etl.snapshots import SnapshotStore
+from fuelprices.config import Settings, load_settings
+from logging import Logger
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, List, Optional, Set
+from utils.file_lock import file_lock
+from utils.logger_config import setup_logger
+from utils.rate_limit import RateLimiter
+
+
+# Functions
+def completed_days(engine: Engine, moment_key: int) -> Set[date]:
+    """
+    Retrieves the days already backfilled for a moment.
+
+    Args:
+        engine (Engine): The database engine.
+        moment_key (int): The MomentKey the historical prices are loaded into.
+
+    Returns:
+        Set[date]: The completed days.
+    """
+    table = BackfillProgress.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(select(table.c.Day).where(table.c.MomentKey == moment_key))
+        return {row[0] for row in rows}
+
+
+def mark_completed(
+    engine: Engine, day: date, moment_key: int, stations: int, counts: Dict[str, int]
+) -> None:
+    """
+    Checkpoints a completed day in the progress table.
+
+    Args:
+        engine (Engine): The database engine.
+        day (date): The completed day.
+        moment_key (int): The MomentKey the historical prices were loaded into.
+        stations (int): The number of stations in the payload.
+        counts (Dict[str, int]): The number of 'inserted', 'updated' and 'skipped' facts.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            insert(BackfillProgress.__table__).prefix_with("OR REPLACE"),
+            {
+                "Day": day,
+                "MomentKey": moment_key,
+                "Stations": stations,
+                "Inserted": counts["inserted"],
+                "Updated": counts["updated"],
+                "Skipped": counts["skipped"],
+                "CompletedAt": datetime.now(),
+            },
+        )
+
+
+def backfill(
+    engine: Engine,
+    days: List[date],
+    moment_id: str,
+    workers: int,
+    rate: float,
+    logger: Logger,
+    settings: Optional[Settings] = None,
+) -> Dict[str, Any]:
+    """
+    Fetches and loads historical prices, day by day.
+
+    Days are downloaded by a bounded pool of threads sharing a rate limiter, while the
+    facts are built and loaded in the calling thread (SQLite has a single writer)
+    through the same path as the daily task. Every loaded day is checkpointed, so an
+    interrupted backfill resumes where it stopped.
+
+    Args:
+        engine (Engine): The database engine.
+        days (List[date]): The days to backfill.
+        moment_id (str): The moment the historical prices are loaded into (e.g., 'Noche').
+        workers (int): The maximum number of concurrent downloads.
+        rate (float): The maximum number of requests per second.
+        logger (Logger): The logger of the backfill.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+
+    Returns:
+        Dict[str, Any]: The number of 'days' loaded and 'failed', the 'elapsed' seconds and
+                        the throughput in 'days_per_minute'.
+    """
+    settings = settings or load_settings()
+    database_name = settings.database_name
+    provinces = list(settings.provinces)
+    ensure_dim_dates(engine, min(days), max(days))
+    dimensions = read_dimensions(database_name, logger)
+    _, moment_key = date_moment_keys(dimensions, datetime.now(), moment_id)
+
+    done = completed_days(engine, moment_key)
+    pending = [day for day in days if day not in done]
+    logger.info(f"{len(days) - len(pending)} days already completed, {len(pending)} pending")
+
+    session = create_session(pool_size=workers)
+    limiter = RateLimiter(rate)
+    store = SnapshotStore(settings.snapshot_dir)
+    partitions = (
+        FactPartitions(partition_dir(database_name))
+        if settings.fact_partitioning == "province"
+        else None
+    )
+
+    def fetch_day(day: date) -> Dict[str, Any]:
+        # Each province of the day is one request to the ministry
+        for _ in provinces or [None]:
+            limiter.acquire()
+        return fetch_historical(settings.api_hist_link, day, provinces, session)
+
+    loaded, failed = 0, 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = iter(pending)
+        running = {}
+
+        # Keeping at most twice the workers in flight bounds the memory in use
+        while True:
+            while len(running) < 2 * workers:
+                day = next(queue, None)
+                if day is None:
+                    break
+                running[executor.submit(fetch_day, day)] = day
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                day = running.pop(future)
+                try:
+                    payload = future.result()
+                    snapshot = store.save(payload, day, moment_id, latest=False)
+
+                    # Loads are serialized with the daily ingests
+                    metrics = Metrics()
+                    with file_lock(f"{database_name}.lock"), journal_run(
+                        engine, day, moment_key, "backfill", str(snapshot), metrics
+                    ) as run_key:
+                        counts = ingest_payload(
+                            payload,
+                            dimensions,
+                            engine,
+                            datetime(day.year, day.month, day.day),
+                            moment_id,
+                            logger,
+                            provinces=provinces,
+                            policy=settings.load_policy,
+                            metrics=metrics,
+                            partitions=partitions,
+                            run_key=run_key,
+                        )
+                        mark_completed(
+                            engine,
+                            day,
+                            moment_key,
+                            len(payload["ListaEESSPrecio"]),
+                            counts,
+                        )
+                    loaded += 1
+                except Exception as e:
+                    logger.error(f"Error backfilling {day}: {e}")
+                    failed += 1
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"{loaded}/{len(pending)} days loaded "
+                f"({60 * loaded / elapsed:.1f} days/minute)"
+            )
+
+    elapsed = time.perf_counter() - started
+    return {
+        "days": loaded,
+        "failed": failed,
+        "elapsed": round(elapsed, 3),
+        "days_per_minute": round(60 * loaded / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None, settings: Optional[Settings] = None) -> None:
+    """
+    Backfills the historical prices of a date range.
+
+    Args:
+        argv (Optional[List[str]]): The arguments. Those of the process when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+    """
+    settings = settings or load_settings()
+    parser = argparse.ArgumentParser(
+        description="Loads historical prices from the ministry, resuming interrupted runs."
+    )
+    parser.add_argument("--start", required=True, help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end", required=True, help="Last date (YYYY-MM-DD).")
+    parser.add_argument(
+        "--moment",
+        default=settings.backfill_moment,
+        help="Moment the daily historical prices are loaded into.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.backfill_workers,
+        help="Concurrent downloads.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=settings.backfill_rate,
+        help="Maximum requests per second to the ministry.",
+    )
+    args = parser.parse_args(argv)
+
+    # Logger configuration for this script
+    logger = setup_logger("backfill", "logs/backfill.log")
+
+    engine = get_engine(settings.database_url)
+    migrate(engine)
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date()
+    days = [day.date() for day in pd.date_range(start, end, freq="D")]
+
+    summary = backfill(
+        engine, days, args.moment, args.workers, args.rate, logger, settings
+    )
+    logger.info(
+        f"Backfill finished: {summary['days']} days loaded, {summary['failed']} failed "
+        f"in {summary['elapsed']}s ({summary['days_per_minute']} days/minute)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,212 +3,339 @@ import pandas as pd
 import os
 
 # Modules
-from db.models import DimDate, DimProduct, DimMoment, DimStation
-from sqlmodel import create_engine, Session
-from datetime import datetime, timedelta
+from db.engine import get_engine
+from db.models import DimBrand, DimDate, DimProduct, DimMoment, DimStation
+from etl.brands import OTHER_BRAND, load_brand_rules, station_brand_keys
+from etl.dates import date_key
+from etl.load import DEFAULT_CHUNK_SIZE, compile_driver_sql, driver_rows
+from etl.regions import AC_NAMES
+from etl.stations import (
+    FLOAT_COLS,
+    INT_COLS,
+    STATION_FIELDS,
+    TEXT_COLS,
+    content_hash,
+    normalize_names,
+)
+from sqlalchemy import Table, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from datetime import date, datetime
 from dotenv import load_dotenv
+from logging import Logger
+from typing import Callable, Dict, List
 from utils.logger_config import setup_logger
 
-# Loading env vars
-load_dotenv()
-database_url = os.getenv("DATABASE_URL")
 
-# Logger configuration for this script
-log_path = "logs/initial_bulk.log"
-logger = setup_logger("initial_bulk", log_path)
+BASELINE_PATH = "data/init/baseline_master.csv"
+
+# Dates of the date dimension
+DATE_START = date(2024, 1, 1)
+DATE_DAYS = 5000
+
+# Products (ProductKey 1 to 14 in this order) and moments of the day (MomentKey 1 to 5)
+PRODUCTS = {
+    "Precio Biodiesel": "BIODIÉSEL",
+    "Precio Bioetanol": "BIOETANOL",
+    "Precio Gas Natural Comprimido": "GNC",
+    "Precio Gas Natural Licuado": "GNL",
+    "Precio Gases licuados del petróleo": "GLP",
+    "Precio Gasoleo A": "GASÓLEO A",
+    "Precio Gasoleo B": "GASÓLEO B",
+    "Precio Gasoleo Premium": "GASÓLEO PREMIUM",
+    "Precio Gasolina 95 E10": "GASOLINA 95 E10",
+    "Precio Gasolina 95 E5": "GASOLINA 95 E5",
+    "Precio Gasolina 95 E5 Premium": "GASOLINA 95 PREMIUM",
+    "Precio Gasolina 98 E10": "GASOLINA 98 E10",
+    "Precio Gasolina 98 E5": "GASOLINA 98 E5",
+    "Precio Hidrogeno": "HIDRÓGENO",
+}
+MOMENTS = ["Madrugada", "Mañana", "Mediodía", "Tarde", "Noche"]
 
-# Engine SQLite creation
-engine = create_engine(database_url, echo=True)
+# Island columns of the baseline, optional since the API does not publish them
+ISLAND_FIELDS = {"Isla": "StationIsland", "IdIsla": "StationIslandID"}
 
 
 # Functions
-def massive_load(data):
-
-    with Session(engine) as session:
-        session.bulk_save_objects(data)
-        session.commit()
-
-
-def load_dim_date():
-
-    # Generation data
-    start_date = datetime(2024, 1, 1)
-    date_list = [start_date + timedelta(days=i) for i in range(5000)]
-    dates = [DimDate(DateID=date) for date in date_list]
-
-    # Loading data
-    massive_load(dates)
-
-
-def load_dim_product():
-
-    # Generation data
-    product_ids = [
-        "Precio Biodiesel",
-        "Precio Bioetanol",
-        "Precio Gas Natural Comprimido",
-        "Precio Gas Natural Licuado",
-        "Precio Gases licuados del petróleo",
-        "Precio Gasoleo A",
-        "Precio Gasoleo B",
-        "Precio Gasoleo Premium",
-        "Precio Gasolina 95 E10",
-        "Precio Gasolina 95 E5",
-        "Precio Gasolina 95 E5 Premium",
-        "Precio Gasolina 98 E10",
-        "Precio Gasolina 98 E5",
-        "Precio Hidrogeno",
-    ]
-    product_names = [
-        "BIODIÉSEL",
-        "BIOETANOL",
-        "GNC",
-        "GNL",
-        "GLP",
-        "GASÓLEO A",
-        "GASÓLEO B",
-        "GASÓLEO PREMIUM",
-        "GASOLINA 95 E10",
-        "GASOLINA 95 E5",
-        "GASOLINA 95 PREMIUM",
-        "GASOLINA 98 E10",
-        "GASOLINA 98 E5",
-        "HIDRÓGENO",
-    ]
-    products = [
-        DimProduct(ProductID=product_ids[n], ProductName=product_names[n])
-        for n in range(len(product_names))
-    ]
-
-    # Loading data
-    massive_load(products)
-
-
-def load_dim_moment():
-
-    # Generation data
-    moments_id = ["Madrugada", "Mañana", "Mediodía", "Tarde", "Noche"]
-    moments = [DimMoment(MomentID=moment) for moment in moments_id]
-
-    # Loading data
-    massive_load(moments)
-
-
-def load_dim_station():
-
-    # Baseline data
-    can_prices_ren = pd.read_csv("data/init/baseline_master.csv", sep=";")
-    print(can_prices_ren.head())
-    # Table columns
-    dim_station_cols = [
-        "StationID",
-        "StationName",
-        "StationAddress",
-        "StationPostalCode",
-        "StationLatitude",
-        "StationLongitude",
-        "StationLocation",
-        "StationMunicipality",
-        "StationMunicipalityID",
-        "StationProvince",
-        "StationProvinceID",
-        "StationAC",
-        "StationACID",
-        "StationIsland",
-        "StationIslandID"
-    ]
-
-    # Renaming some columns
-    can_prices_ren = can_prices_ren.rename(
-        columns={
-            "IDEESS": "StationID",
-            "Rótulo": "StationName",
-            "Dirección": "StationAddress",
-            "C.P.": "StationPostalCode",
-            "Latitud": "StationLatitude",
-            "Longitud (WGS84)": "StationLongitude",
-            "Localidad": "StationLocation",
-            "Municipio": "StationMunicipality",
-            "IDMunicipio": "StationMunicipalityID",
-            "Provincia": "StationProvince",
-            "IDProvincia": "StationProvinceID",
-            "IDCCAA": "StationACID",
-            "Isla": "StationIsland",
-            "IdIsla": "StationIslandID"
+def upsert_rows(
+    engine: Engine,
+    table: Table,
+    rows: pd.DataFrame,
+    keys: List[str],
+    update_cols: List[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Inserts rows with chunked `executemany` calls of one Core statement, in one
+    transaction. Rows whose keys already exist get their `update_cols` overwritten, or
+    are left as they are without any.
+
+    Args:
+        engine (Engine): The database engine.
+        table (Table): The table.
+        rows (pd.DataFrame): The rows, with one column per table column.
+        keys (List[str]): The columns of the primary key.
+        update_cols (List[str]): The columns overwritten on existing rows.
+        chunk_size (int): The number of rows per `executemany` call.
+
+    Returns:
+        int: The number of rows inserted or updated.
+    """
+    stmt = sqlite_insert(table)
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys, set_={col: stmt.excluded[col] for col in update_cols}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+
+    written = 0
+    with engine.begin() as conn:
+        sql, params = compile_driver_sql(stmt, conn, list(rows.columns))
+        values = driver_rows(rows, params, conn, table)
+        for start in range(0, len(values), chunk_size):
+            written += conn.exec_driver_sql(sql, values[start : start + chunk_size]).rowcount
+    return written
+
+
+def load_dim_date(engine: Engine, start: date = DATE_START, days: int = DATE_DAYS) -> int:
+    """
+    Loads a range of dates into the date dimension, keeping the dates already there.
+
+    Args:
+        engine (Engine): The database engine.
+        start (date): The first date.
+        days (int): The number of dates.
+
+    Returns:
+        int: The number of inserted dates.
+    """
+    days_range = pd.date_range(start, periods=days, freq="D")
+    dates = pd.DataFrame(
+        {
+            "DateKey": date_key(days_range),
+            "DateID": days_range,
+            "CreatedAt": datetime.now(),
         }
     )
+    return upsert_rows(engine, DimDate.__table__, dates, ["DateKey"], [])
+
 
-    # Normalizing columns
-    for col_name in ["Latitude", "Longitude"]:
-        can_prices_ren[f"Station{col_name}"] = can_prices_ren[
-            f"Station{col_name}"
-        ].str.replace(",", ".")
-    for col_name in [
-        "StationName",
-        "StationAddress",
-        "StationLocation",
-        "StationMunicipality",
-        "StationProvince",
-        "StationIsland"
-    ]:
-        can_prices_ren[col_name] = can_prices_ren[col_name].str.upper()
-    can_prices_ren = can_prices_ren.astype(
+def load_dim_product(engine: Engine) -> int:
+    """
+    Loads the products of the API into the product dimension, with fixed keys.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        int: The number of inserted or updated products.
+    """
+    products = pd.DataFrame(
         {
-            "StationLatitude": "str",
-            "StationLongitude": "str",
-            "StationPostalCode": "str",
+            "ProductKey": range(1, len(PRODUCTS) + 1),
+            "ProductID": list(PRODUCTS),
+            "ProductName": list(PRODUCTS.values()),
+            "CreatedAt": datetime.now(),
         }
     )
+    return upsert_rows(
+        engine, DimProduct.__table__, products, ["ProductKey"], ["ProductID", "ProductName"]
+    )
+
+
+def load_dim_moment(engine: Engine) -> int:
+    """
+    Loads the moments of the day into the moment dimension, with fixed keys.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        int: The number of inserted or updated moments.
+    """
+    moments = pd.DataFrame(
+        {
+            "MomentKey": range(1, len(MOMENTS) + 1),
+            "MomentID": MOMENTS,
+            "CreatedAt": datetime.now(),
+        }
+    )
+    return upsert_rows(engine, DimMoment.__table__, moments, ["MomentKey"], ["MomentID"])
+
+
+def load_dim_brand(engine: Engine) -> int:
+    """
+    Loads the brands of the brand rules (see `etl/brands.py`) into the brand dimension,
+    keeping the brands already there.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        int: The number of inserted brands.
+    """
+    brands = pd.DataFrame(
+        {"BrandName": [*load_brand_rules(), OTHER_BRAND], "CreatedAt": datetime.now()}
+    )
+    return upsert_rows(engine, DimBrand.__table__, brands, ["BrandName"], [])
+
+
+def read_baseline(path: str = BASELINE_PATH) -> pd.DataFrame:
+    """
+    Reads and validates the baseline of the stations, a `;` separated CSV with the API
+    fields of each station (`IDEESS`, `Rótulo`, ...) and optionally its island (`Isla`
+    and `IdIsla`). Names are normalized like the stations of the API payloads.
+
+    Args:
+        path (str): The CSV file.
+
+    Returns:
+        pd.DataFrame: One row per station with the DimStation columns and its content hash.
+
+    Raises:
+        ValueError: If a column is missing, a number or coordinate is invalid, or a
+                    station is repeated.
+    """
+    raw = pd.read_csv(path, sep=";", dtype=str, keep_default_na=False)
+    missing = [field for field in STATION_FIELDS if field not in raw.columns]
+    if missing:
+        raise ValueError(f"The baseline {path} misses the columns: {', '.join(missing)}")
+
+    df = raw[list(STATION_FIELDS)].rename(columns=STATION_FIELDS)
+    for field, col in ISLAND_FIELDS.items():
+        df[col] = raw[field] if field in raw.columns else ""
+
+    # Parsing columns, the decimals use a comma like in the API
+    for col in TEXT_COLS + ["StationIsland"]:
+        df[col] = normalize_names(df[col])
+    for col in FLOAT_COLS:
+        df[col] = pd.to_numeric(df[col].str.replace(",", ".", regex=False), errors="coerce")
+    for col in INT_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["StationIslandID"] = pd.to_numeric(
+        df["StationIslandID"].replace("", "0"), errors="coerce"
+    )
 
-    # Creation of some columns
-    can_prices_ren["StationAC"] = "CANARIAS"
-
-    # Selecting relevant columns
-    df_dim_station = can_prices_ren[dim_station_cols]
-
-    # Creating objects
-    stations = [
-        DimStation(
-            StationID=row["StationID"],
-            StationName=row["StationName"],
-            StationAddress=row["StationAddress"],
-            StationPostalCode=row["StationPostalCode"],
-            StationLatitude=row["StationLatitude"],
-            StationLongitude=row["StationLongitude"],
-            StationLocation=row["StationLocation"],
-            StationMunicipality=row["StationMunicipality"],
-            StationMunicipalityID=row["StationMunicipalityID"],
-            StationProvince=row["StationProvince"],
-            StationProvinceID=row["StationProvinceID"],
-            StationAC=row["StationAC"],
-            StationACID=row["StationACID"],
-            StationIsland=row["StationIsland"],
-            StationIslandID=row["StationIslandID"],
+    # Validating values, reported with their line in the file
+    invalid = df[INT_COLS + FLOAT_COLS + ["StationIslandID"]].isna().any(axis=1)
+    invalid |= ~df["StationLatitude"].between(-90, 90)
+    invalid |= ~df["StationLongitude"].between(-180, 180)
+    if invalid.any():
+        lines = (df.index[invalid] + 2).tolist()
+        raise ValueError(
+            f"The baseline {path} has {len(lines)} rows with invalid numbers "
+            f"(lines {', '.join(map(str, lines[:10]))})"
+        )
+    repeated = df["StationID"].duplicated()
+    if repeated.any():
+        raise ValueError(
+            f"The baseline {path} repeats the stations: "
+            f"{', '.join(map(str, df.loc[repeated, 'StationID'].unique()[:10]))}"
         )
-        for _, row in df_dim_station.iterrows()
-    ]
 
-    # Loading data
-    massive_load(stations)
+    # Derived columns
+    df = df.astype({col: "int64" for col in INT_COLS + ["StationIslandID"]})
+    df["StationAC"] = df["StationACID"].map(AC_NAMES).fillna("")
+    df["ContentHash"] = content_hash(df)
+    return df
+
+
+def load_dim_station(engine: Engine, path: str = BASELINE_PATH) -> int:
+    """
+    Loads the baseline stations into the station dimension, classified into their brand.
+    Stations without a current version are inserted, and the current version of the
+    others is overwritten with the baseline, so loading it again changes nothing.
+
+    Args:
+        engine (Engine): The database engine.
+        path (str): The baseline CSV file (see `read_baseline`).
+
+    Returns:
+        int: The number of inserted or updated stations.
+    """
+    stations = read_baseline(path)
+    table = DimStation.__table__
+
+    # Current versions, matched by StationID
+    with engine.connect() as conn:
+        current = dict(
+            conn.execute(
+                select(table.c.StationID, table.c.StationKey)
+                .where(table.c.EndOfUse.is_(None))
+                .order_by(table.c.StationKey.desc())
+            ).all()
+        )
+    station_keys = stations["StationID"].map(current)
+    stations.insert(
+        0,
+        "StationKey",
+        pd.Series(
+            [None if pd.isna(key) else int(key) for key in station_keys],
+            index=stations.index,
+            dtype=object,
+        ),
+    )
+    with engine.begin() as conn:
+        stations["BrandKey"] = station_brand_keys(stations["StationName"], conn)
+    stations["CreatedAt"] = datetime.now()
+
+    update_cols = [col for col in stations.columns if col not in ["StationKey", "CreatedAt"]]
+    return upsert_rows(engine, table, stations, ["StationKey"], update_cols)
 
 
 # Summarizing functions to establish a pipeline for load
-bulk_funcs = {
+bulk_funcs: Dict[str, Callable[[Engine], int]] = {
     "DimDate": load_dim_date,
     "DimProduct": load_dim_product,
     "DimMoment": load_dim_moment,
+    "DimBrand": load_dim_brand,
     "DimStation": load_dim_station,
 }
 
-# Pipeline
-logger.info("Initial bulk of dimensions")
-for bulk_func in bulk_funcs:
 
-    try:
+def initial_bulk(engine: Engine, logger: Logger) -> Dict[str, int]:
+    """
+    Loads the dimension tables of a new database. It can run again on a loaded
+    database: the dates and brands are kept and the products, moments and stations
+    upserted.
+
+    Args:
+        engine (Engine): The database engine.
+        logger (Logger): The logger of the running task.
+
+    Returns:
+        Dict[str, int]: The number of rows written by table.
+
+    Raises:
+        ValueError: If the baseline of the stations is invalid.
+    """
+    logger.info("Initial bulk of dimensions")
+    counts = {}
+    for bulk_func in bulk_funcs:
+        try:
+            counts[bulk_func] = bulk_funcs[bulk_func](engine)
+            logger.info(f"{bulk_func} loaded ({counts[bulk_func]} rows written)")
+        except Exception as e:
+            logger.error(f"Error during {bulk_func} bulking: {e}")
+            raise
+    return counts
+
+
+def main() -> None:
+    """
+    Loads the dimension tables of the configured database.
+    """
+    # Loading env vars
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+
+    # Logger configuration for this script
+    log_path = "logs/initial_bulk.log"
+    logger = setup_logger("initial_bulk", log_path)
 
-        bulk_funcs[bulk_func]()
-        logger.info(f"{bulk_func} loaded")
+    initial_bulk(get_engine(database_url), logger)
 
-    except Exception as e:
 
-        logger.error(f"Error during {bulk_func} bulking: {e}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Libraries
+import argparse
+
+# Modules
+from datetime import datetime
+from db.engine import get_engine
+from db.partitions import FactPartitions, partition_dir
+from etl.metrics import Metrics, journal_run, unfinished_runs
+from etl.pipeline import date_moment_keys, ingest_payload, read_dimensions
+from etl.snapshots import SnapshotStore
+from etl.transform import key_lookup
+from fuelprices.config import Settings, load_settings
+from pathlib import Path
+from typing import List, Optional
+from utils.logger_config import setup_logger
+
+
+def main(argv: Optional[List[str]] = None, settings: Optional[Settings] = None) -> None:
+    """
+    Rebuilds the facts of a date range, or of the failed runs, from the stored API
+    snapshots.
+
+    Args:
+        argv (Optional[List[str]]): The arguments. Those of the process when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+    """
+    # Logger configuration for this script
+    log_path = "logs/replay.log"
+    logger = setup_logger("replay", log_path)
+
+    # Arguments
+    parser = argparse.ArgumentParser(
+        description="Rebuilds the facts of a date range from the stored API snapshots."
+    )
+    parser.add_argument("--start", help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD). Defaults to --start.")
+    parser.add_argument("--moment", help="Only this moment (e.g., 'Tarde').")
+    parser.add_argument(
+        "--failed",
+        action="store_true",
+        help="Replay the dates and moments whose last run failed or never finished.",
+    )
+    args = parser.parse_args(argv)
+    if not args.failed and not args.start:
+        parser.error("--start is required unless --failed is given")
+
+    # Replaying snapshots, no network access needed
+    settings = settings or load_settings()
+    store = SnapshotStore(settings.snapshot_dir)
+    dimensions = read_dimensions(settings.database_name, logger)
+    engine = get_engine(settings.database_url)
+    partitions = (
+        FactPartitions(partition_dir(settings.database_name))
+        if settings.fact_partitioning == "province"
+        else None
+    )
+
+    if args.failed:
+        moments = key_lookup(dimensions["dimmoment"], "MomentKey", "MomentID")
+        runs = unfinished_runs(engine)
+        runs = runs[runs["Snapshot"].notna() & runs["MomentKey"].isin(moments.index)]
+        snapshots = [
+            (
+                datetime.strptime(str(run.Day)[:10], "%Y-%m-%d").date(),
+                moments[run.MomentKey],
+                Path(run.Snapshot),
+            )
+            for run in runs.itertuples(index=False)
+        ]
+    else:
+        start = datetime.strptime(args.start, "%Y-%m-%d").date()
+        end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else start
+        snapshots = store.iter_snapshots(start, end, args.moment)
+
+    replayed = 0
+    for day, moment_id, path in snapshots:
+
+        try:
+
+            logger.info(f"Replaying {path}")
+            metrics = Metrics()
+            _, moment_key = date_moment_keys(dimensions, day, moment_id)
+            with journal_run(
+                engine, day, moment_key, "replay", str(path), metrics
+            ) as run_key:
+                ingest_payload(
+                    store.load(path),
+                    dimensions,
+                    engine,
+                    datetime(day.year, day.month, day.day),
+                    moment_id,
+                    logger,
+                    provinces=list(settings.provinces),
+                    policy=settings.load_policy,
+                    metrics=metrics,
+                    partitions=partitions,
+                    run_key=run_key,
+                )
+            replayed += 1
+
+        except Exception as e:
+
+            logger.error(f"Error replaying {path}: {e}")
+
+    logger.info(f"{replayed} snapshots replayed")
+
+
+if __name__ == "__main__":
+    main()
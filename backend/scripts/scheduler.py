@@ -0,0 +1,218 @@
+# Libraries
+import argparse
+import json
+import os
+import random
+import signal
+import threading
+
+# Modules
+from datetime import datetime, timedelta
+from etl.ingestor import Ingestor
+from etl.pipeline import ext_mom_id
+from etl.schedule import moment_window, next_run
+from etl.snapshots import write_atomic
+from fuelprices.config import Settings, load_settings
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from utils.logger_config import setup_logger
+
+
+class Scheduler:
+    """
+    A class which ingests the five moments of the day from a resident process.
+
+    Each moment is ingested once per day, shortly after its window (as defined by
+    `ext_mom_id`) starts. Failed runs are retried with a jittered backoff while the
+    window is still open. Runs are sequential, and the next and last runs are
+    published in a JSON status file.
+
+    Attributes:
+        ingestor (Ingestor): The ingestor, whose connections and lookups stay warm.
+        logger (Logger): The logger of the scheduler.
+        status_path (Path): The status file.
+        offset (timedelta): The wait after the start of each moment.
+        jitter (timedelta): The maximum random delay added to each run.
+        max_retries (int): The retries of a failed run.
+        retry_delay (timedelta): The base delay between those retries.
+        status (dict): The current status (state, next run and last run).
+        stop_event (threading.Event): Set to stop the scheduler.
+    """
+
+    def __init__(self, ingestor: Ingestor, logger: Any, settings: Optional[Settings] = None):
+        """
+        Initializes the scheduler, recovering the last run from the status file.
+
+        Args:
+            ingestor (Ingestor): The ingestor running each moment.
+            logger (Any): The logger of the scheduler.
+            settings (Optional[Settings]): The settings of the schedule. Read from the
+                                           environment when None.
+        """
+        settings = settings or load_settings()
+        self.ingestor = ingestor
+        self.logger = logger
+        self.status_path = Path(settings.scheduler_status)
+        self.offset = timedelta(minutes=settings.schedule_offset_minutes)
+        self.jitter = timedelta(seconds=settings.schedule_jitter_seconds)
+        self.max_retries = settings.schedule_max_retries
+        self.retry_delay = timedelta(seconds=settings.schedule_retry_seconds)
+        self.status = read_status(self.status_path)
+        self.status.update({"pid": os.getpid(), "state": "starting"})
+        self.stop_event = threading.Event()
+
+    def save_status(self) -> None:
+        """
+        Publishes the status in the status file.
+        """
+        write_atomic(self.status_path, json.dumps(self.status, indent=2).encode())
+
+    def already_ingested(self, when: datetime) -> bool:
+        """
+        Checks whether the moment containing a datetime was already ingested successfully.
+
+        Args:
+            when (datetime): Any datetime of the moment.
+
+        Returns:
+            bool: True if the last successful run is in the same moment window.
+        """
+        last_success = self.status.get("last_success")
+        if last_success is None:
+            return False
+        start, end = moment_window(when)
+        return start <= datetime.fromisoformat(last_success) < end
+
+    def run_moment(self, when: datetime) -> None:
+        """
+        Ingests a moment, retrying while its window is open.
+
+        Args:
+            when (datetime): The scheduled datetime of the run.
+        """
+        _, window_end = moment_window(when)
+        last_run = {
+            "moment": ext_mom_id(when.hour),
+            "date": when.date().isoformat(),
+            "started_at": datetime.now().isoformat(),
+            "attempts": 0,
+        }
+        self.status.update({"state": "running", "last_run": last_run})
+        self.save_status()
+
+        for attempt in range(1, self.max_retries + 2):
+            last_run["attempts"] = attempt
+            try:
+                counts = self.ingestor.run(datetime.now())
+                last_run.update({"status": "success", "counts": counts, "error": None})
+                self.status["last_success"] = datetime.now().isoformat()
+                break
+            except Exception as e:
+                self.logger.error(f"Error during ingest (attempt {attempt}): {e}")
+                last_run.update({"status": "failed", "error": str(e)})
+
+            # Jittered backoff, only while the moment is still open
+            delay = self.retry_delay * attempt * random.uniform(0.5, 1.5)
+            if attempt > self.max_retries or datetime.now() + delay >= window_end:
+                break
+            self.save_status()
+            if self.stop_event.wait(delay.total_seconds()):
+                break
+
+        last_run["finished_at"] = datetime.now().isoformat()
+        self.save_status()
+
+    def loop(self) -> None:
+        """
+        Runs the scheduler until it is stopped.
+        """
+        now = datetime.now()
+        if not self.already_ingested(now):
+            self.logger.info("Current moment not ingested yet, catching up")
+            self.run_moment(now)
+
+        while not self.stop_event.is_set():
+            run_at, moment_id = next_run(datetime.now(), self.offset, self.jitter)
+            self.status.update(
+                {
+                    "state": "sleeping",
+                    "next_run": {"at": run_at.isoformat(), "moment": moment_id},
+                }
+            )
+            self.save_status()
+            self.logger.info(f"Next run: {moment_id} at {run_at}")
+
+            wait = (run_at - datetime.now()).total_seconds()
+            if self.stop_event.wait(max(wait, 0)):
+                break
+            self.run_moment(run_at)
+
+        self.status.update({"state": "stopped", "next_run": None})
+        self.save_status()
+
+
+def read_status(status_path: Path) -> Dict[str, Any]:
+    """
+    Reads the status file of the scheduler.
+
+    Args:
+        status_path (Path): The status file.
+
+    Returns:
+        Dict[str, Any]: The status, empty if the scheduler never ran.
+    """
+    if not status_path.exists():
+        return {}
+    return json.loads(status_path.read_text())
+
+
+def main(argv: Optional[List[str]] = None, settings: Optional[Settings] = None) -> None:
+    """
+    Starts the scheduler, or prints its status with `--status`.
+
+    Args:
+        argv (Optional[List[str]]): The arguments. Those of the process when None.
+        settings (Optional[Settings]): The settings. Read from the environment when None.
+    """
+    parser = argparse.ArgumentParser(
+        description="Resident service ingesting the five moments of the day."
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="Print the next and last runs and exit."
+    )
+    args = parser.parse_args(argv)
+    settings = settings or load_settings()
+
+    if args.status:
+        status = read_status(Path(settings.scheduler_status))
+        print(json.dumps(status, indent=2, ensure_ascii=False))
+        return
+
+    # Logger configuration for this script
+    logger = setup_logger("scheduler", "logs/scheduler.log")
+
+    ingestor = Ingestor(
+        settings.database_name,
+        settings.database_url,
+        settings.api_link,
+        list(settings.provinces),
+        settings.fetch_mode,
+        settings.snapshot_dir,
+        settings.load_policy,
+        logger,
+        metrics_path=settings.metrics_path,
+        fact_partitioning=settings.fact_partitioning,
+    )
+    scheduler = Scheduler(ingestor, logger, settings)
+
+    # Stopping gracefully
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(sig, lambda *_: scheduler.stop_event.set())
+
+    logger.info("Scheduler started")
+    scheduler.loop()
+    logger.info("Scheduler stopped")
+
+
+if __name__ == "__main__":
+    main()
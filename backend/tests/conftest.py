@@ -0,0 +1,192 @@
+# Libraries
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pytest
+import sqlite3
+import sys
+import threading
+
+# Modules
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.synthetic import create_database  # noqa: E402
+
+# Last date of the synthetic databases
+END_DATE = date(2026, 1, 15)
+
+
+@pytest.fixture(autouse=True)
+def backend_dir(monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Runs every test from the backend folder, whose data paths are relative.
+    """
+    monkeypatch.chdir(BACKEND_DIR)
+    return BACKEND_DIR
+
+
+@pytest.fixture(scope="session")
+def synthetic_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """
+    Creates a small synthetic database once per session: the Canarias stations with
+    two days of prices ending at `END_DATE`.
+    """
+    path = tmp_path_factory.mktemp("template") / "star_schema.db"
+    previous = Path.cwd()
+    try:
+        os.chdir(BACKEND_DIR)
+        create_database(str(path), end=END_DATE, days=2, logger=lambda message: None)
+    finally:
+        os.chdir(previous)
+    return path
+
+
+@pytest.fixture
+def synthetic_db(synthetic_template: Path, tmp_path: Path) -> Path:
+    """
+    Copies the synthetic database for a test, which may modify it. The copy goes
+    through the backup API, the template being in WAL mode.
+    """
+    path = tmp_path / "star_schema.db"
+    source, target = sqlite3.connect(synthetic_template), sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    return path
+
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    """
+    Returns a logger for the ingest steps, which only propagates to pytest.
+    """
+    return logging.getLogger("tests")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers the requests to the stand-in ministry API (see `StandInAPI`).
+    """
+
+    def do_GET(self) -> None:
+        api = self.server
+        with api.lock:
+            failing = api.failures > 0
+            api.failures -= failing
+        if failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            api.log(self.path, 503)
+            return
+
+        document = api.document(self.path)
+        if document is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            api.log(self.path, 404)
+            return
+
+        text = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        etag = f'"{hashlib.md5(text).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            api.log(self.path, 304)
+            return
+
+        body = gzip.compress(text, mtime=0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+        api.log(self.path, 200, len(body))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class StandInAPI(ThreadingHTTPServer):
+    """
+    A local stand-in of the ministry API, serving gzip encoded payloads with an ETag on
+    127.0.0.1: the nationwide and province endpoints of `EstacionesTerrestres/` and
+    the historical ones of `EstacionesTerrestresHist/`.
+
+    Attributes:
+        payload (Optional[Dict[str, Any]]): The current nationwide payload.
+        history (Dict[date, Dict[str, Any]]): The nationwide payload of past dates.
+        failures (int): The next requests answered with a 503 error.
+        requests (List[tuple]): The path, status and compressed body size of each request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.payload = None
+        self.history = {}
+        self.failures = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def log(self, path: str, status: int, size: int = 0) -> None:
+        with self.lock:
+            self.requests.append((path, status, size))
+
+    def sent_bytes(self) -> int:
+        return sum(size for _, _, size in self.requests)
+
+    def document(self, path: str) -> Optional[Dict[str, Any]]:
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        province = None
+        if len(parts) > 1 and parts[1] == "FiltroProvincia":
+            province = parts[-1]
+            parts = [parts[0], *parts[2:-1]]
+        if parts == ["EstacionesTerrestres"]:
+            document = self.payload
+        elif len(parts) == 2 and parts[0] == "EstacionesTerrestresHist":
+            document = self.history.get(datetime.strptime(parts[1], "%d-%m-%Y").date())
+        else:
+            document = None
+        if document is None or province is None:
+            return document
+        stations = [
+            station
+            for station in document["ListaEESSPrecio"]
+            if station["IDProvincia"] == province
+        ]
+        return {**document, "ListaEESSPrecio": stations}
+
+
+@pytest.fixture
+def stand_in_api() -> Iterator[StandInAPI]:
+    """
+    Serves a stand-in ministry API on a free port of 127.0.0.1 during a test.
+    """
+    api = StandInAPI()
+    thread = threading.Thread(target=api.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield api
+    finally:
+        api.shutdown()
+        api.server_close()
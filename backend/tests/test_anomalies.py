@@ -0,0 +1,101 @@
+# Libraries
+import pandas as pd
+import pytest
+import sqlite3
+
+# Modules
+from bench.synthetic import PRODUCTS, PriceModel, make_payload, make_stations
+from datetime import datetime, timedelta
+from db.engine import get_engine
+from db.layouts import FACT_LAYOUTS, convert_facts
+from etl.anomalies import STATS_QUERY, read_price_stats
+from db.models import FLAG_JUMP, FLAG_UNRELIABLE
+from etl.pipeline import date_moment_keys, ingest_payload, read_dimensions
+from tests.conftest import END_DATE
+
+
+def stored_flags(db_path, day, moment_key, station_id, product_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT f.PriceMilli, f.Flags
+            FROM factdata f
+            JOIN dimstation s ON s.StationKey = f.StationKey
+            JOIN dimproduct p ON p.ProductKey = f.ProductKey
+            WHERE f.DateKey = ? AND f.MomentKey = ? AND s.StationID = ? AND p.ProductID = ?
+            """,
+            (day, moment_key, int(station_id), product_id),
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("layout", FACT_LAYOUTS)
+def test_rerun_keeps_the_flags_of_a_rejected_price(synthetic_db, logger, layout):
+    convert_facts(str(synthetic_db), layout)
+    engine = get_engine(f"sqlite:///{synthetic_db}")
+    dimensions = read_dimensions(str(synthetic_db), logger)
+    stations = make_stations(["35", "38"])
+    model = PriceModel(len(stations))
+    day = datetime.combine(END_DATE + timedelta(days=1), datetime.min.time())
+
+    # A first moment gives the statistics of every station and product
+    ingest_payload(make_payload(stations, model, day), dimensions, engine, day, "Madrugada", logger)
+
+    # The next moment has a misplaced comma in one price
+    product = list(PRODUCTS).index("Precio Gasoleo A")
+    station = int(model.offers[:, product].argmax())
+    price = model.prices[station, product]
+    model.prices[station, product] = round(price * 2, 3)
+    payload = make_payload(stations, model, day)
+    day_key, moment_key = date_moment_keys(dimensions, day, "Mañana")
+    ingest_payload(payload, dimensions, engine, day, "Mañana", logger)
+    station_id = stations[station]["IDEESS"]
+    _, flags = stored_flags(synthetic_db, day_key, moment_key, station_id, "Precio Gasoleo A")
+    assert flags == FLAG_JUMP | FLAG_UNRELIABLE
+
+    # A rerun of the moment (e.g., a retry or a replay) keeps the rejection
+    counts = ingest_payload(payload, dimensions, engine, day, "Mañana", logger)
+    assert counts["updated"] == 0
+    _, flags = stored_flags(synthetic_db, day_key, moment_key, station_id, "Precio Gasoleo A")
+    assert flags == FLAG_JUMP | FLAG_UNRELIABLE
+
+    # A corrected price replaces the rejected one and its flags
+    model.prices[station, product] = price
+    payload = make_payload(stations, model, day)
+    counts = ingest_payload(payload, dimensions, engine, day, "Mañana", logger)
+    assert counts["updated"] == 1
+    assert stored_flags(
+        synthetic_db, day_key, moment_key, station_id, "Precio Gasoleo A"
+    ) == (round(price * 1000), 0)
+
+
+def test_only_the_statistics_of_the_batch_are_read(synthetic_db, logger):
+    engine = get_engine(f"sqlite:///{synthetic_db}")
+    dimensions = read_dimensions(str(synthetic_db), logger)
+    stations = make_stations(["35", "38"])
+    day = datetime.combine(END_DATE + timedelta(days=1), datetime.min.time())
+    ingest_payload(
+        make_payload(stations, PriceModel(len(stations)), day),
+        dimensions,
+        engine,
+        day,
+        "Madrugada",
+        logger,
+    )
+
+    conn = sqlite3.connect(synthetic_db)
+    try:
+        stats = conn.execute("SELECT StationKey, ProductKey FROM pricestat").fetchall()
+        batch = pd.DataFrame(stats[:10], columns=["StationKey", "ProductKey"])
+        assert len(read_price_stats(conn, batch)) == 10
+
+        conn.execute(
+            "CREATE TEMP TABLE stat_keys "
+            "(StationKey INTEGER, ProductKey INTEGER, PRIMARY KEY (StationKey, ProductKey))"
+        )
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {STATS_QUERY}")]
+    finally:
+        conn.close()
+    assert "SEARCH pricestat USING PRIMARY KEY (StationKey=? AND ProductKey=?)" in plan
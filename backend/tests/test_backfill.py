@@ -0,0 +1,79 @@
+# Libraries
+import sqlite3
+
+# Modules
+from bench.synthetic import PriceModel, make_payload, make_stations
+from datetime import datetime, timedelta
+from db.engine import get_engine
+from etl import fetch
+from fuelprices.config import Settings
+from scripts.backfill import backfill
+from tenacity import wait_none
+from tests.conftest import END_DATE
+
+PROVINCES = ("35", "38")
+
+
+def test_backfill_resumes_without_fetching_completed_days(
+    stand_in_api, synthetic_db, tmp_path, logger, monkeypatch
+):
+    monkeypatch.setattr(fetch.fetch_json.retry, "wait", wait_none())
+    settings = Settings(
+        database_name=str(synthetic_db),
+        database_url=f"sqlite:///{synthetic_db}",
+        api_link=f"{stand_in_api.url}EstacionesTerrestres/",
+        api_hist_link=f"{stand_in_api.url}EstacionesTerrestresHist/",
+        provinces=PROVINCES,
+        fetch_mode="province",
+        snapshot_dir=str(tmp_path / "snapshots"),
+        load_policy="update",
+        metrics_path=str(tmp_path / "ingest.prom"),
+        fact_partitioning="none",
+        fact_layout="long",
+        archive_horizon_days=90,
+    )
+    stations = make_stations(list(PROVINCES))
+    model = PriceModel(len(stations))
+    days = [END_DATE + timedelta(days=n) for n in range(1, 4)]
+    for day in days:
+        model.next_day()
+        model.next_moment()
+        stand_in_api.history[day] = make_payload(
+            stations, model, datetime(day.year, day.month, day.day, 23, 59)
+        )
+    engine = get_engine(settings.database_url)
+
+    # The last day is not published yet, so the first run stops before it
+    last = stand_in_api.history.pop(days[-1])
+    summary = backfill(engine, days, "Madrugada", 2, 100.0, logger, settings)
+    assert (summary["days"], summary["failed"]) == (2, 1)
+
+    stand_in_api.history[days[-1]] = last
+    stand_in_api.requests.clear()
+    summary = backfill(engine, days, "Madrugada", 2, 100.0, logger, settings)
+    assert (summary["days"], summary["failed"]) == (1, 0)
+    fetched = {path for path, _, _ in stand_in_api.requests}
+    assert fetched == {
+        f"/EstacionesTerrestresHist/FiltroProvincia/{days[-1]:%d-%m-%Y}/{province}"
+        for province in PROVINCES
+    }
+
+    conn = sqlite3.connect(synthetic_db)
+    try:
+        progress = conn.execute(
+            "SELECT Day, Stations, Inserted FROM backfillprogress ORDER BY Day"
+        ).fetchall()
+        loaded = conn.execute(
+            """
+            SELECT f.DateKey, COUNT(*)
+            FROM factdata f JOIN dimmoment m ON m.MomentKey = f.MomentKey
+            WHERE m.MomentID = 'Madrugada' AND f.DateKey > ?
+            GROUP BY f.DateKey
+            """,
+            (int(f"{END_DATE:%Y%m%d}"),),
+        ).fetchall()
+    finally:
+        conn.close()
+    assert [row[0] for row in progress] == [str(day) for day in days]
+    assert all(count == len(stations) for _, count, _ in progress)
+    assert [count for _, count in loaded] == [inserted for _, _, inserted in progress]
@@ -0,0 +1,97 @@
+# Libraries
+import json
+import pytest
+import requests
+
+# Modules
+from bench.synthetic import PriceModel, make_payload, make_stations
+from datetime import datetime
+from etl import fetch
+from etl.fetch import fetch_payload
+from etl.ingestor import Ingestor
+from etl.metrics import Metrics
+from tenacity import wait_none
+
+PROVINCES = ["35", "38"]
+
+
+@pytest.fixture
+def api(stand_in_api):
+    stations = make_stations(PROVINCES)
+    stand_in_api.payload = make_payload(
+        stations, PriceModel(len(stations)), datetime(2026, 1, 15, 13, 30)
+    )
+    return stand_in_api
+
+
+@pytest.fixture
+def no_retry_wait(monkeypatch):
+    for func in [fetch.fetch_province, fetch.stream_stations, fetch.fetch_json]:
+        monkeypatch.setattr(func.retry, "wait", wait_none())
+
+
+def station_ids(payload):
+    return sorted(station["IDEESS"] for station in payload["ListaEESSPrecio"])
+
+
+def test_province_and_stream_modes_return_the_same_stations(api):
+    by_province = fetch_payload(f"{api.url}EstacionesTerrestres/", PROVINCES, "province")
+    streamed = fetch_payload(f"{api.url}EstacionesTerrestres/", PROVINCES, "stream")
+    assert by_province["Fecha"] == streamed["Fecha"] == api.payload["Fecha"]
+    assert station_ids(by_province) == station_ids(streamed) == station_ids(api.payload)
+    key = lambda station: station["IDEESS"]  # noqa: E731
+    assert sorted(by_province["ListaEESSPrecio"], key=key) == sorted(
+        streamed["ListaEESSPrecio"], key=key
+    )
+
+    # The stream keeps the requested provinces only
+    canarias_east = fetch_payload(f"{api.url}EstacionesTerrestres/", ["35"], "stream")
+    assert {s["IDProvincia"] for s in canarias_east["ListaEESSPrecio"]} == {"35"}
+
+
+@pytest.mark.parametrize("mode", ["province", "stream"])
+def test_downloaded_bytes_are_the_compressed_bytes(api, mode):
+    metrics = Metrics()
+    payload = fetch_payload(f"{api.url}EstacionesTerrestres/", PROVINCES, mode, metrics=metrics)
+    assert payload is not None
+    assert metrics.counters["bytes_downloaded"] == api.sent_bytes()
+    text = json.dumps(api.payload, ensure_ascii=False).encode("utf-8")
+    assert metrics.counters["bytes_downloaded"] < len(text) / 3
+
+
+@pytest.mark.parametrize("mode", ["province", "stream"])
+def test_server_errors_are_retried(api, no_retry_wait, mode):
+    api.failures = 2
+    metrics = Metrics()
+    payload = fetch_payload(
+        f"{api.url}EstacionesTerrestres/", PROVINCES, mode, metrics=metrics
+    )
+    assert station_ids(payload) == station_ids(api.payload)
+    assert [status for _, status, _ in api.requests].count(503) == 2
+    assert metrics.counters["bytes_downloaded"] == api.sent_bytes()
+
+
+def test_persistent_server_errors_are_raised(api, no_retry_wait):
+    api.failures = 10
+    with pytest.raises(requests.HTTPError):
+        fetch_payload(f"{api.url}EstacionesTerrestres/", None, "stream")
+    assert len(api.requests) == 4
+
+
+def test_not_modified_response_reuses_the_snapshot(api, synthetic_db, tmp_path, logger):
+    ingestor = Ingestor(
+        str(synthetic_db),
+        f"sqlite:///{synthetic_db}",
+        f"{api.url}EstacionesTerrestres/",
+        PROVINCES,
+        "province",
+        str(tmp_path / "snapshots"),
+        "update",
+        logger,
+    )
+    first = ingestor.fetch(datetime(2026, 1, 15, 13, 30), "Mediodía")
+    second = ingestor.fetch(datetime(2026, 1, 15, 17, 30), "Tarde")
+
+    assert [status for _, status, _ in api.requests] == [200, 200, 304, 304]
+    assert station_ids(second) == station_ids(first)
+    assert ingestor.store.path(datetime(2026, 1, 15).date(), "Tarde").exists()
@@ -0,0 +1,21 @@
+# Libraries
+import pytest
+
+# Modules
+from bench.plans import check_plans, hot_queries
+from bench.run import load_dashboard
+from db.partitions import FactPartitions, partition_dir
+
+QUERIES = list(hot_queries(load_dashboard()))
+
+
+@pytest.fixture(params=["long", "partitioned"])
+def plans(request, synthetic_db):
+    if request.param == "partitioned":
+        FactPartitions(partition_dir(str(synthetic_db))).import_facts(str(synthetic_db))
+    return check_plans(str(synthetic_db))
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_hot_query_reads_no_whole_fact_table(plans, name):
+    assert plans[name]["full_scans"] == [], plans[name]["plan"]
@@ -19,6 +19,10 @@ def setup_logger(logger_name: str, log_file: str, level=logging.INFO) -> Logger:
     logger = logging.getLogger(logger_name)
     logger.setLevel(level)
 
+    # Already configured (e.g., several calls in the same process)
+    if logger.handlers:
+        return logger
+
     # Common format
     formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -0,0 +1,46 @@
+# Libraries
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket limiting how often an action can happen.
+
+    Attributes:
+        rate (float): The sustained number of actions per second.
+        capacity (float): The maximum burst of actions.
+        tokens (float): The actions currently available.
+        updated_at (float): When the bucket was last refilled (monotonic seconds).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): The sustained number of actions per second.
+            capacity (float): The maximum burst of actions.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until an action is allowed.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
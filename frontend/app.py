@@ -9,13 +9,29 @@ import json
 
 from folium import CustomIcon
 from data import geo_data
-from utils import retrieve_data_app, InfoSelect, create_basis_map, add_station_map, ext_mom_key
+from utils import DataCache, InfoSelect, create_basis_map, add_station_map, ext_mom_key, get_map_location
 
 curr_dt = datetime.datetime.now()
 curr_mom_key = ext_mom_key(curr_dt.hour
                            )
-data = retrieve_data_app(curr_mom_key)
-info_select = InfoSelect(data)
+
+
+@st.cache_resource
+def get_data_cache() -> DataCache:
+    # One cache for every session, kept until a new ingest lands in the database
+    return DataCache()
+
+
+data_cache = get_data_cache()
+# One cache read, so the data and its index come from the same ingest
+cube = data_cache.selection_cube(curr_mom_key)
+info_select = InfoSelect(
+    cube.df,
+    data_cache.db_path,
+    curr_mom_key,
+    cache=data_cache,
+    cube=cube,
+)
 
 
 st.set_page_config(
@@ -41,7 +57,7 @@ with st.sidebar:
     info_select.set_geo_ent(selected_geo_ent_lvl)
     info_select.ref_info()
 
-    brand_list = ["TODAS", "BP", "CEPSA", "DISA", "REPSOL", "SHELL", "OTRAS"]
+    brand_list = info_select.get_brands()
     selected_brand = st.selectbox("Selecciona una marca", brand_list, index=0)
 
     info_select.set_brand(selected_brand)
@@ -79,14 +95,14 @@ with col[0]:
     st.header("Localízalas en tu mapa", divider=True)
 
     m = create_basis_map(
-        geo_data[selected_geo_ent_lvl]["latitud"],
-        geo_data[selected_geo_ent_lvl]["longitud"],
-        geo_data[selected_geo_ent_lvl]["zoom"],
+        *get_map_location(
+            info_select.default_df, geo_data, selected_geo_lvl, selected_geo_ent_lvl
+        )
     )
 
     # Mostrar el mapa en Streamlit
     current_stations_df = info_select.current_df[
-        ["StationName", "StationLatitude", "StationLongitude"]
+        ["StationName", "StationBrand", "StationLatitude", "StationLongitude"]
     ].drop_duplicates()
 
     for index, row in current_stations_df.iterrows():
@@ -127,3 +143,8 @@ with col[1]:
             - :orange[**Top 10 más baratas**]: se muestra las 10 gasolineras más baratas en orden ascendente.
             """
         )
+    counters = data_cache.counters()
+    st.caption(
+        f"Caché de datos: {counters['hits']} aciertos, {counters['misses']} fallos, "
+        f"{counters['entries']} consultas en memoria"
+    )
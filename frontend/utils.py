@@ -1,50 +1,63 @@
 # Libraries
 import datetime
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
 import folium
 import os
 import sqlite3
 import json
+import threading
 
 # Modules
+import sys
 from folium import CustomIcon
-from typing import List
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# The dashboard data is read and joined by the backend modules, shared with the ingest
+sys.path.append(str(Path(__file__).resolve().parents[1] / "backend"))
+from etl.dashboard import (  # noqa: E402
+    dashboard_path,
+    data_app_dtypes,
+    retrieve_data_app as retrieve_dashboard_data,
+    retrieve_dimensions_app,
+)
+from etl.dates import date_key  # noqa: E402
+
+# Bit of factdata.Flags marking an unreliable price, left out of the KPIs and the
+# cheapest stations (like in `backend/db/models.py`)
+FLAG_UNRELIABLE = 1
+
+# Brand selections of every brand and of the stations matching no brand rule (the
+# brands are classified by the backend, see `backend/etl/brands.py`)
+ALL_BRANDS = "TODAS"
+OTHER_BRANDS = "OTRAS"
 
 # Utils for map
 dict_imgs = {
     "BP": "icons/BP.png",
     "CEPSA": "icons/CEPSA.png",
-    "REPSOL": "icons/Repsol.png",
+    "REPSOL": "icons/REPSOL.png",
     "SHELL": "icons/SHELL.png",
     "DISA": "icons/DISA.png",
     "OTHER": "icons/OTHER.png",
 }
 
 
-def get_icon(station_name: str) -> CustomIcon:
+def get_icon(station_brand: str) -> CustomIcon:
     """
-    Returns a custom icon based on the station name.
+    Returns a custom icon based on the station brand.
 
     Args:
-        station_name (str): The name of the fuel station.
+        station_brand (str): The brand of the fuel station (e.g., 'BP').
 
     Returns:
         CustomIcon: A CustomIcon object representing the fuel station's icon.
 
     """
-    if "BP" in station_name:
-        icon = CustomIcon(dict_imgs["BP"], icon_size=(15, 15))
-    elif "CEPSA" in station_name:
-        icon = CustomIcon(dict_imgs["CEPSA"], icon_size=(15, 15))
-    elif "REPSOL" in station_name:
-        icon = CustomIcon(dict_imgs["REPSOL"], icon_size=(15, 15))
-    elif "SHELL" in station_name:
-        icon = CustomIcon(dict_imgs["SHELL"], icon_size=(15, 15))
-    elif "DISA" in station_name:
-        icon = CustomIcon(dict_imgs["DISA"], icon_size=(15, 15))
-    else:
-        icon = CustomIcon(dict_imgs["OTHER"], icon_size=(15, 15))
-    return icon
+    return CustomIcon(dict_imgs.get(station_brand, dict_imgs["OTHER"]), icon_size=(15, 15))
 
 
 def create_basis_map(latitude: float, longitude: float, zoom: int) -> folium.Map:
@@ -89,6 +102,7 @@ def add_station_map(row: pd.Series, map: folium.Map) -> None:
         row (pd.Series): A row from a pandas DataFrame containing station data.
                          Required fields:
                          - "StationName" (str): Name of the station.
+                         - "StationBrand" (str): Brand of the station.
                          - "StationLatitude" (float): Latitude of the station.
                          - "StationLongitude" (float): Longitude of the station.
         map (folium.Map): A folium map object to which the marker will be added.
@@ -96,8 +110,7 @@ def add_station_map(row: pd.Series, map: folium.Map) -> None:
     Returns:
         None: The function modifies the map in-place.
     """
-    station_name = row["StationName"]
-    iconito = get_icon(station_name)
+    iconito = get_icon(row["StationBrand"])
     folium.Marker(
         location=[row["StationLatitude"], row["StationLongitude"]],
         popup=row["StationName"],  # Información que aparece al hacer clic
@@ -137,81 +150,534 @@ def ext_mom_key(hour: int) -> str:
         return 1
 
 
-def retrieve_data_app(curr_mom_key: int) -> pd.DataFrame:
+def read_published_data(
+    curr_mom_key: int,
+    db_path: Optional[str] = None,
+    dimensions: Optional[Dict[str, pd.DataFrame]] = None,
+) -> Optional[pd.DataFrame]:
     """
-    Retrieves fuel station data from the database for the last 7 days.
+    Reads the dashboard data of a moment from the Arrow file published by the backend,
+    which builds it with `retrieve_data_app`. The file is memory-mapped read-only and
+    viewed by pandas without copying, so every session and dashboard process shares
+    the pages of one copy. The backend replaces the file atomically, so a mapped file
+    never changes under its readers. A file whose columns or types differ from the ones
+    the dashboard builds (see `data_app_dtypes`), e.g. published by an older backend,
+    is ignored.
+
+    Args:
+        curr_mom_key (int): The moment of the data.
+        db_path (Optional[str]): The SQLite database. The first database found in the
+                                 backend folder when None.
+        dimensions (Optional[Dict[str, pd.DataFrame]]): The dimensions, from
+                                                        `retrieve_dimensions_app`. Read
+                                                        from the database when None.
+
+    Returns:
+        Optional[pd.DataFrame]: The data, None without a file published today for the
+                                moment with the columns of the dashboard.
+    """
+    db_path = db_path or find_db_path()
+    path = dashboard_path(db_path, curr_mom_key)
+    try:
+        table = ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    except FileNotFoundError:
+        return None
+    metadata = table.schema.metadata or {}
+    published = (metadata.get(b"moment_key"), metadata.get(b"window_end"))
+    if published != (str(curr_mom_key).encode(), str(date_key(datetime.date.today())).encode()):
+        return None
+    data = table.to_pandas(split_blocks=True, self_destruct=False)
+    expected = data_app_dtypes(curr_mom_key, dimensions or retrieve_dimensions_app(db_path))
+    if not data.dtypes.astype(str).equals(expected):
+        return None
+    return data
+
+
+def connect_db(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the database with the read settings of the backend engine
+    factory (`backend/db/engine.py`): page cache, memory map and in-memory temporary
+    storage. The WAL journal is enabled by the backend, so the dashboard reads while an
+    ingest writes.
+
+    Args:
+        db_path (str): The SQLite database.
+
+    Returns:
+        sqlite3.Connection: The connection. The caller closes it.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA cache_size = {int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))}")
+    conn.execute(
+        f"PRAGMA mmap_size = {int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))}"
+    )
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def find_db_path() -> str:
+    """
+    Searches the SQLite database of the backend.
+
+    Returns:
+        str: The first database found in the backend folder.
+    """
+    archivos_db = [
+        archivo for archivo in os.listdir("../backend") if archivo.endswith(".db")
+    ]
+    return f"../backend/{archivos_db[0]}"
+
+
+def retrieve_data_app(
+    curr_mom_key: int,
+    db_path: Optional[str] = None,
+    provinces: Optional[Iterable[str]] = None,
+    dimensions: Optional[Dict[str, pd.DataFrame]] = None,
+) -> pd.DataFrame:
+    """
+    Retrieves fuel station data from the database for the last 7 days, with the query
+    and in-memory join of the backend (`retrieve_data_app` in `backend/etl/dashboard.py`),
+    which also publishes this data after each ingest (see `read_published_data`).
 
     Args:
         curr_mom_key (int): The key representing the specific moment to filter data
                             (e.g., time of day or a predefined time category).
+        db_path (Optional[str]): The SQLite database to read. The first database found
+                                 in the backend folder when None.
+        provinces (Optional[Iterable[str]]): The province ids to read (e.g., ['35', '38']).
+                                             Every province when None.
+        dimensions (Optional[Dict[str, pd.DataFrame]]): The dimensions, from
+                                                        `retrieve_dimensions_app`. Read
+                                                        from the database when None.
 
     Returns:
         pd.DataFrame: A DataFrame containing the retrieved data, with columns from the
                       joined tables, including station details, product information,
                       and pricing.
     """
-    # Searching SQLite database
-    archivos_db = [
-        archivo for archivo in os.listdir("../backend") if archivo.endswith(".db")
+    return retrieve_dashboard_data(
+        curr_mom_key, db_path or find_db_path(), provinces, dimensions
+    )
+
+
+def build_kpi_rollup_query(
+    curr_mom_key: int,
+    geo_col: str,
+    geo_ent: str,
+    brand: str,
+    product_group: str,
+    today: Optional[datetime.date] = None,
+) -> Tuple[str, list]:
+    """
+    Builds the query of the price rollups of a selection for the last 7 days, which
+    seeks the primary key of `pricerollup`, whatever the size of the fact table.
+
+    Args:
+        curr_mom_key (int): The key representing the specific moment to filter data.
+        geo_col (str): The geographic level, as a station column (e.g., 'StationAC').
+        geo_ent (str): The geographic entity (e.g., 'CANARIAS').
+        brand (str): The brand, 'TODAS' or 'OTRAS'.
+        product_group (str): The product group (e.g., 'GASOLINA 95').
+        today (Optional[datetime.date]): The last date to read. Today when None.
+
+    Returns:
+        Tuple[str, list]: The query and its parameters.
+    """
+    today = today or datetime.date.today()
+    first_day = today - datetime.timedelta(days=6)
+    query = """
+    SELECT DateKey, MinPrice, MaxPrice, SumPrice, PriceCount
+    FROM pricerollup
+    WHERE GeoLevel = ? AND GeoEntity = ? AND Brand = ? AND ProductGroup = ?
+    AND MomentKey = ? AND DateKey BETWEEN ? AND ?;
+    """
+    params = [
+        geo_col,
+        geo_ent,
+        brand,
+        product_group,
+        curr_mom_key,
+        date_key(first_day),
+        date_key(today),
     ]
-    db_name = archivos_db[0]
-
-    # Connection to database and querying for retrieving data
-    conn = sqlite3.connect(f"../backend/{db_name}")
-    query = f"""
-    SELECT 
-        factdata.DateKey,
-        factdata.StationKey,
-        factdata.ProductKey,
-        factdata.MomentKey,
-        factdata.Price,
-        dimdate.DateID,
-        dimmoment.MomentID,
-        dimproduct.ProductID,
-        dimproduct.ProductName,
-        dimstation.StationID,
-        dimstation.StationName,
-        dimstation.StationAddress,
-        dimstation.StationPostalCode,
-        dimstation.StationLatitude,
-        dimstation.StationLongitude,
-        dimstation.StationLocation,
-        dimstation.StationMunicipality,
-        dimstation.StationMunicipalityID,
-        dimstation.StationProvince,
-        dimstation.StationProvinceID,
-        dimstation.StationAC,
-        dimstation.StationACID,
-        dimstation.StationIsland,
-        dimstation.StationIslandID
-    FROM factdata
-    INNER JOIN dimdate ON factdata.DateKey = dimdate.DateKey
-    INNER JOIN dimmoment ON factdata.MomentKey = dimmoment.MomentKey
-    INNER JOIN dimproduct ON factdata.ProductKey = dimproduct.ProductKey
-    INNER JOIN dimstation ON factdata.StationKey = dimstation.StationKey
-    WHERE dimdate.DateID >= datetime('now', '-7 days')
-    AND factdata.MomentKey = {curr_mom_key};
+    return query, params
+
+
+def retrieve_kpi_rollups(
+    curr_mom_key: int,
+    geo_col: str,
+    geo_ent: str,
+    brand: str,
+    product_group: str,
+    db_path: Optional[str] = None,
+    today: Optional[datetime.date] = None,
+) -> pd.DataFrame:
     """
-    data = pd.read_sql_query(query, conn)
-    conn.close()  # Closing connection
+    Retrieves the price rollups of a selection for the last 7 days, maintained by the
+    backend ingest (`backend/etl/rollups.py`), see `build_kpi_rollup_query`.
 
-    return data
+    Args:
+        curr_mom_key (int): The key representing the specific moment to filter data.
+        geo_col (str): The geographic level, as a station column (e.g., 'StationAC').
+        geo_ent (str): The geographic entity (e.g., 'CANARIAS').
+        brand (str): The brand, 'TODAS' or 'OTRAS'.
+        product_group (str): The product group (e.g., 'GASOLINA 95').
+        db_path (Optional[str]): The SQLite database to read. The first database found
+                                 in the backend folder when None.
+        today (Optional[datetime.date]): The last date to read. Today when None.
+
+    Returns:
+        pd.DataFrame: One row per date (DateKey, MinPrice, MaxPrice, SumPrice,
+                      PriceCount). Empty when the database has no rollups.
+    """
+    query, params = build_kpi_rollup_query(
+        curr_mom_key, geo_col, geo_ent, brand, product_group, today
+    )
+
+    conn = connect_db(db_path or find_db_path())
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    except pd.errors.DatabaseError:
+        # Databases created before the rollups
+        return pd.DataFrame(
+            columns=["DateKey", "MinPrice", "MaxPrice", "SumPrice", "PriceCount"]
+        )
+    finally:
+        conn.close()  # Closing connection
+
+
+def read_watermark(db_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Reads the watermark of the ingests of the database: the number of finished runs of
+    the run journal and the last of them, which change whenever an ingest lands.
+
+    Args:
+        db_path (str): The SQLite database.
+
+    Returns:
+        Optional[Tuple[int, int]]: The watermark, None for databases without the journal.
+    """
+    conn = connect_db(db_path)
+    try:
+        return tuple(
+            conn.execute(
+                "SELECT COUNT(*), MAX(RunKey) FROM ingestrun WHERE Status != 'running'"
+            ).fetchone()
+        )
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()  # Closing connection
+
+
+class DataCache:
+    """
+    A class which keeps the data of the dashboard in memory, shared by every session
+    and rerun, until a new ingest lands in the database.
+
+    Each read first compares the size and modification time of the database files
+    (no database I/O). Only when they changed is the ingest watermark read
+    (`read_watermark`), and only when it changed are the cached entries dropped, so
+    widget interactions read no data and writes other than ingests keep the cache.
+
+    Attributes:
+        db_path (str): The SQLite database.
+        hits (int): The reads served from memory.
+        misses (int): The reads which queried the database.
+        watermark (Optional[Tuple[int, int]]): The ingest watermark of the entries.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            db_path (Optional[str]): The SQLite database. The first database found in
+                                     the backend folder when None.
+        """
+        self.db_path = db_path or find_db_path()
+        self.hits = 0
+        self.misses = 0
+        self.watermark = None
+        self._file_stats = None
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def file_stats(self) -> Tuple:
+        """
+        Reads the size and modification time of the database and its WAL file.
+
+        Returns:
+            Tuple: The stats, None for a missing file.
+        """
+        stats = []
+        for path in [self.db_path, f"{self.db_path}-wal"]:
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def refresh(self) -> None:
+        """
+        Drops the entries when a new ingest landed since they were read.
+        """
+        stats = self.file_stats()
+        if stats == self._file_stats:
+            return
+        watermark = read_watermark(self.db_path)
+        if watermark != self.watermark or watermark is None:
+            self._entries.clear()
+            self.watermark = watermark
+        self._file_stats = stats
+
+    def get(self, key: Tuple, load: Callable[[], Any]) -> Any:
+        """
+        Returns an entry, loading it on a miss.
+
+        Args:
+            key (Tuple): The key of the entry.
+            load (Callable[[], Any]): Reads the entry from the database.
+
+        Returns:
+            Any: The entry.
+        """
+        with self._lock:
+            self.refresh()
+            if key in self._entries:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._entries[key] = load()
+            return self._entries[key]
+
+    def data_app(self, curr_mom_key: int) -> pd.DataFrame:
+        """
+        Retrieves the data of the dashboard, from the file published by the backend
+        ingest (see `read_published_data`) or else the database (see `retrieve_data_app`).
+
+        Args:
+            curr_mom_key (int): The moment of the data.
+
+        Returns:
+            pd.DataFrame: The data, shared by the callers, which must not modify it.
+        """
+        def load() -> pd.DataFrame:
+            data = read_published_data(curr_mom_key, self.db_path, self.dimensions())
+            if data is None:
+                data = retrieve_data_app(
+                    curr_mom_key, self.db_path, dimensions=self.dimensions()
+                )
+            return data
+
+        return self.get(("data", curr_mom_key, datetime.date.today()), load)
+
+    def dimensions(self) -> Dict[str, pd.DataFrame]:
+        """
+        Retrieves the dimensions of the dashboard (see `retrieve_dimensions_app`), read
+        once for every moment.
+
+        Returns:
+            Dict[str, pd.DataFrame]: The dimensions, shared by the callers.
+        """
+        return self.get(("dimensions",), lambda: retrieve_dimensions_app(self.db_path))
+
+    def selection_cube(self, curr_mom_key: int) -> "SelectionCube":
+        """
+        Retrieves the selection index of the data of the dashboard (see `SelectionCube`).
+
+        Args:
+            curr_mom_key (int): The moment of the data.
+
+        Returns:
+            SelectionCube: The index, shared by the callers.
+        """
+        key = ("cube", curr_mom_key, datetime.date.today())
+        return self.get(key, lambda: SelectionCube(self.data_app(curr_mom_key)))
+
+    def kpi_rollups(
+        self, curr_mom_key: int, geo_col: str, geo_ent: str, brand: str, product_group: str
+    ) -> pd.DataFrame:
+        """
+        Retrieves the price rollups of a selection (see `retrieve_kpi_rollups`).
+
+        Args:
+            curr_mom_key (int): The moment of the data.
+            geo_col (str): The geographic level, as a station column (e.g., 'StationAC').
+            geo_ent (str): The geographic entity (e.g., 'CANARIAS').
+            brand (str): The brand, 'TODAS' or 'OTRAS'.
+            product_group (str): The product group (e.g., 'GASOLINA 95').
+
+        Returns:
+            pd.DataFrame: The rollups by date.
+        """
+        selection = (curr_mom_key, geo_col, geo_ent, brand, product_group)
+        return self.get(
+            ("kpis", *selection, datetime.date.today()),
+            lambda: retrieve_kpi_rollups(*selection, db_path=self.db_path),
+        )
+
+    def counters(self) -> Dict[str, int]:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            Dict[str, int]: The 'hits', 'misses' and cached 'entries'.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def get_map_location(
+    df: pd.DataFrame, geo_data: dict, sel_geo_lvl: str, sel_geo_ent: str
+) -> Tuple[float, float, int]:
+    """
+    Retrieves the center and zoom of the map for a geographic entity. Entities without
+    predefined coordinates (e.g., outside Canarias) are centered on their stations.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing fuel station data.
+        geo_data (dict): The predefined 'latitud', 'longitud' and 'zoom' by entity.
+        sel_geo_lvl (str): The selected geographic level (e.g., 'PROVINCIA').
+        sel_geo_ent (str): The selected geographic entity (e.g., 'MADRID').
+
+    Returns:
+        Tuple[float, float, int]: The latitude, longitude and zoom of the map.
+    """
+    if sel_geo_ent in geo_data:
+        location = geo_data[sel_geo_ent]
+        return location["latitud"], location["longitud"], location["zoom"]
+
+    stations = df[df[InfoSelect.geo_col_map[sel_geo_lvl]] == sel_geo_ent]
+    return (
+        float(stations["StationLatitude"].astype(float).mean()),
+        float(stations["StationLongitude"].astype(float).mean()),
+        InfoSelect.geo_zoom_map[sel_geo_lvl],
+    )
 
 
 # Selecting current info in database
+class SelectionCube:
+    """
+    A class which indexes the data of the dashboard once per load, so each selection of
+    `InfoSelect` is an index lookup instead of a scan and copy of the data.
+
+    The rows of every geographic entity are kept as sorted positions, and every row has
+    the code of its product group and brand, so a selection narrows the rows of its
+    entity with two integer comparisons.
+
+    Attributes:
+        df (pd.DataFrame): The data of the dashboard, never modified.
+        geo_rows (Dict[str, Dict[str, np.ndarray]]): The positions of the rows of each
+                                                     entity, by geographic column.
+        geo_ents (Dict[str, List[str]]): The sorted entities of each geographic column.
+        product_codes (np.ndarray): The product group of each row, as its position in
+                                    `InfoSelect.prod_map` (-1 for other products).
+        brands (pd.Index): The sorted brands of the data.
+        brand_codes (np.ndarray): The brand of each row, as its position in `brands`.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Indexes the given data.
+
+        Args:
+            df (pd.DataFrame): The data of the dashboard (see `retrieve_data_app`).
+        """
+        self.df = df
+        self.geo_rows = {}
+        self.geo_ents = {}
+        for col in InfoSelect.geo_col_map.values():
+            # Categories are sorted, and the stable sort keeps each group in row order
+            ents = pd.Categorical(df[col]).remove_unused_categories()
+            codes = ents.codes
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(ents.categories) + 1))
+            self.geo_rows[col] = {
+                ent: order[bounds[i] : bounds[i + 1]] for i, ent in enumerate(ents.categories)
+            }
+            # Stations outside the islands have no ISLA
+            self.geo_ents[col] = [ent for ent in ents.categories if ent != ""]
+
+        product_keys = df["ProductKey"].to_numpy()
+        groups = np.full(max(product_keys.max(initial=0), 14) + 1, -1)
+        for i, keys in enumerate(InfoSelect.prod_map.values()):
+            groups[keys] = i
+        self.product_codes = groups[product_keys]
+
+        brands = pd.Categorical(df["StationBrand"]).remove_unused_categories()
+        self.brands = brands.categories
+        self.brand_codes = brands.codes
+
+        self.date_keys = df["DateKey"].to_numpy()
+        self.prices = df["Price"].to_numpy(dtype=float)
+        if "Flags" in df.columns:
+            self.reliable = (df["Flags"].to_numpy() & FLAG_UNRELIABLE) == 0
+        else:
+            self.reliable = np.ones(len(df), dtype=bool)
+
+    def select(self, geo_col: str, geo_ent: str, brand: str, product_group: str) -> np.ndarray:
+        """
+        Finds the rows of a selection.
+
+        Args:
+            geo_col (str): The geographic level, as a station column (e.g., 'StationAC').
+            geo_ent (str): The geographic entity (e.g., 'CANARIAS').
+            brand (str): The brand, 'TODAS' or 'OTRAS'.
+            product_group (str): The product group (e.g., 'GASOLINA 95').
+
+        Returns:
+            np.ndarray: The sorted positions of the rows.
+        """
+        rows = self.geo_rows[geo_col].get(geo_ent, np.empty(0, dtype=np.intp))
+        keep = self.product_codes[rows] == list(InfoSelect.prod_map).index(product_group)
+        if brand != ALL_BRANDS:
+            # Brands without stations in the data select no row
+            code = self.brands.get_loc(brand) if brand in self.brands else -2
+            keep &= self.brand_codes[rows] == code
+        return rows[keep]
+
+    def cheapest(self, rows: np.ndarray, n: int) -> pd.DataFrame:
+        """
+        Finds the n cheapest reliable prices of the last date of some rows, with a
+        partial selection instead of sorting all of them.
+
+        Args:
+            rows (np.ndarray): The positions of the rows (see `select`).
+            n (int): The number of prices.
+
+        Returns:
+            pd.DataFrame: The rows of the prices, in ascending price order.
+        """
+        if len(rows):
+            dates = self.date_keys[rows]
+            rows = rows[(dates == dates.max()) & self.reliable[rows]]
+        if len(rows) > n:
+            rows = rows[np.argpartition(self.prices[rows], n - 1)[:n]]
+        rows = rows[np.argsort(self.prices[rows], kind="stable")]
+        return self.df.take(rows)
+
+
 class InfoSelect:
     """
     A class which organizes the information to show in dashboard with current selection.
 
     Attributes:
         geo_col_map (dict): Maps geographic levels (e.g., 'COMUNIDAD AUTÓNOMA') to corresponding column names in the DataFrame.
+        geo_zoom_map (dict): Maps geographic levels to the zoom of the map, for entities without predefined coordinates.
         prod_map (dict): Maps product names to lists of product keys for filtering.
         default_df (pd.DataFrame): The original DataFrame containing fuel station data.
+        cube (SelectionCube): The index of the data the selections are looked up in.
+        current_rows (np.ndarray): The positions of the rows of the current selection.
         current_df (pd.DataFrame): The filtered DataFrame based on current selections.
         sel_geo_lvl (str): Selected geographic level (e.g., 'COMUNIDAD AUTÓNOMA').
         sel_geo_ent (str): Selected geographic entity (e.g., 'CANARIAS').
         sel_brand (str): Selected fuel station brand (e.g., 'BP').
         sel_prod (str): Selected product (e.g., 'BIODIÉSEL').
+        db_path (Optional[str]): The SQLite database of the price rollups.
+        curr_mom_key (Optional[int]): The moment of the data, to read its price rollups.
+        cache (Optional[DataCache]): The cache the price rollups are read through.
     """
 
     # Class attributes
@@ -221,6 +687,12 @@ class InfoSelect:
         "ISLA": "StationIsland",
         "MUNICIPIO": "StationMunicipality",
     }
+    geo_zoom_map = {
+        "COMUNIDAD AUTÓNOMA": 7,
+        "PROVINCIA": 8,
+        "ISLA": 9,
+        "MUNICIPIO": 11,
+    }
     prod_map = {
         "BIODIÉSEL": [1],
         "BIOETANOL": [2],
@@ -235,15 +707,39 @@ class InfoSelect:
         "HIDRÓGENO": [14],
     }
 
-    def __init__(self, df: pd.DataFrame):
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        db_path: Optional[str] = None,
+        curr_mom_key: Optional[int] = None,
+        cache: Optional[DataCache] = None,
+        cube: Optional[SelectionCube] = None,
+    ):
         """
         Initializes the InfoSelect class with the given DataFrame and default selections.
 
         Args:
             df (pd.DataFrame): The DataFrame containing fuel station data.
+            db_path (Optional[str]): The SQLite database of the price rollups.
+            curr_mom_key (Optional[int]): The moment of the data. The KPIs are computed
+                                          from the DataFrame when it is None.
+            cache (Optional[DataCache]): The cache the price rollups are read through.
+                                         They are read from the database when None.
+            cube (Optional[SelectionCube]): The index of the DataFrame, built when None.
+
+        Raises:
+            ValueError: If the cube indexes another DataFrame, e.g., one read before a
+                        new ingest, since the selected positions would not match it.
         """
+        if cube is not None and cube.df is not df:
+            raise ValueError("The selection cube indexes another DataFrame")
+        self.cache = cache
+        self.db_path = db_path
+        self.curr_mom_key = curr_mom_key
         self.default_df = df
-        self.current_df = df
+        self.cube = cube or SelectionCube(df)
+        self.current_rows = np.arange(len(df))
+        self._current_df = df
         self.sel_geo_lvl = "COMUNIDAD AUTÓNOMA"
         self.sel_geo_ent = "CANARIAS"
         self.sel_brand = "TODAS"
@@ -260,10 +756,20 @@ class InfoSelect:
             sorted_ent_lst (List[str]): A sorted list of unique geographic entities for the selected level.
         """
         self.sel_geo_lvl = sel_geo_lvl
-        ent_lst = self.default_df[InfoSelect.geo_col_map[sel_geo_lvl]].unique().tolist()
-        sorted_ent_lst = sorted(ent_lst)
+        sorted_ent_lst = list(self.cube.geo_ents[InfoSelect.geo_col_map[sel_geo_lvl]])
         return sorted_ent_lst
 
+    def get_brands(self) -> List[str]:
+        """
+        Retrieves the brands to select: every brand, the brands of the data and the
+        stations of no brand.
+
+        Returns:
+            List[str]: The brands, starting with 'TODAS' and ending with 'OTRAS'.
+        """
+        brands = [brand for brand in self.cube.brands if brand != OTHER_BRANDS]
+        return [ALL_BRANDS, *brands, OTHER_BRANDS]
+
     def set_geo_ent(self, sel_ent: str) -> None:
         """
         Sets the selected geographic entity.
@@ -294,21 +800,40 @@ class InfoSelect:
     def ref_info(self):
         """
         Filters the data based on the current selections for geographic entity, product, and brand.
-        Updates the `current_df` attribute with the filtered data.
+        Updates the `current_rows` attribute with the positions of the filtered data, which
+        `current_df` takes when first read.
         """
-        tmp_df = self.default_df.copy()
-        geo_cond = tmp_df[InfoSelect.geo_col_map[self.sel_geo_lvl]] == self.sel_geo_ent
-        prod_cond = tmp_df["ProductKey"].isin(InfoSelect.prod_map[self.sel_prod])
+        self.current_rows = self.cube.select(
+            InfoSelect.geo_col_map[self.sel_geo_lvl],
+            self.sel_geo_ent,
+            self.sel_brand,
+            self.sel_prod,
+        )
+        self._current_df = None
+
+    @property
+    def current_df(self) -> pd.DataFrame:
+        """
+        The filtered DataFrame based on current selections.
+        """
+        if self._current_df is None:
+            self._current_df = self.default_df.take(self.current_rows)
+        return self._current_df
 
-        if self.sel_brand in ["BP", "CEPSA", "DISA", "REPSOL", "SHELL"]:
-            brand_cond = tmp_df["StationName"].str.contains(self.sel_brand, na=False)
-        elif self.sel_brand == "OTRAS":
-            brand_cond = ~tmp_df["StationName"].str.contains(self.sel_brand, na=False)
-        else:
-            brand_cond = True
+    @staticmethod
+    def reliable_prices(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Leaves out the prices flagged as unreliable by the backend ingest.
 
-        cond = geo_cond & prod_cond & brand_cond
-        self.current_df = tmp_df[cond]
+        Args:
+            df (pd.DataFrame): The DataFrame to filter.
+
+        Returns:
+            pd.DataFrame: The rows without the `FLAG_UNRELIABLE` bit.
+        """
+        if "Flags" not in df.columns:
+            return df
+        return df[(df["Flags"].to_numpy() & FLAG_UNRELIABLE) == 0]
 
     @staticmethod
     def get_metrics(df: pd.DataFrame) -> None:
@@ -319,18 +844,68 @@ class InfoSelect:
             df (pd.DataFrame): The DataFrame to analyze.
 
         Returns:
-            dict: A dictionary with 'max', 'min', and 'mean' fuel prices.
+            dict: A dictionary with 'max', 'min', and 'mean' fuel prices, None without
+                  prices (e.g., no previous day).
         """
+        if df.empty:
+            return {"max": None, "min": None, "mean": None}
         max_value = df["Price"].max()
         min_value = df["Price"].min()
         mean_value = round(df["Price"].mean(), 3)
         output_dict = {"max": max_value, "min": min_value, "mean": mean_value}
         return output_dict
 
+    @staticmethod
+    def get_rollup_metrics(df: pd.DataFrame) -> dict:
+        """
+        Calculates the maximum, minimum, and mean fuel prices from price rollups.
+
+        Args:
+            df (pd.DataFrame): The rollups to combine.
+
+        Returns:
+            dict: A dictionary with 'max', 'min', and 'mean' fuel prices, None without
+                  prices (e.g., no rollups of a previous day).
+        """
+        if df.empty or df["PriceCount"].sum() == 0:
+            return {"max": None, "min": None, "mean": None}
+        max_value = df["MaxPrice"].max()
+        min_value = df["MinPrice"].min()
+        mean_value = round(df["SumPrice"].sum() / df["PriceCount"].sum(), 3)
+        output_dict = {"max": max_value, "min": min_value, "mean": mean_value}
+        return output_dict
+
+    def get_kpi_rollups(self) -> pd.DataFrame:
+        """
+        Retrieves the price rollups of the current selection.
+
+        Returns:
+            pd.DataFrame: The rollups by date. Empty without a moment or rollups.
+        """
+        if self.curr_mom_key is None:
+            return pd.DataFrame()
+        if self.cache is not None:
+            return self.cache.kpi_rollups(
+                self.curr_mom_key,
+                InfoSelect.geo_col_map[self.sel_geo_lvl],
+                self.sel_geo_ent,
+                self.sel_brand,
+                self.sel_prod,
+            )
+        return retrieve_kpi_rollups(
+            self.curr_mom_key,
+            InfoSelect.geo_col_map[self.sel_geo_lvl],
+            self.sel_geo_ent,
+            self.sel_brand,
+            self.sel_prod,
+            db_path=self.db_path,
+        )
+
     @staticmethod
     def get_output_kpis(dict: dict) -> dict:
         """
-        Calculates key performance indicators (KPIs) and their deltas.
+        Calculates key performance indicators (KPIs) and their deltas. A delta is None
+        when either day has no prices, so no delta is shown.
 
         Args:
             dict (dict): A dictionary containing today's and previous metrics.
@@ -340,22 +915,40 @@ class InfoSelect:
         """
         output_dict = {}
         for met_nam in ["max", "min", "mean"]:
-            output_dict[met_nam] = {
-                "value": dict["tdy"][met_nam],
-                "delta": round(dict["tdy"][met_nam] - dict["prev"][met_nam], 3),
-            }
+            tdy_value, prev_value = dict["tdy"][met_nam], dict["prev"][met_nam]
+            delta = None
+            if tdy_value is not None and prev_value is not None:
+                delta = round(tdy_value - prev_value, 3)
+            output_dict[met_nam] = {"value": tdy_value, "delta": delta}
         return output_dict
 
     def get_kpis(self):
         """
         Retrieves KPIs for the current filtered data, comparing today's data with previous days.
+        The unreliable prices are left out (the rollups exclude them too). The KPIs come
+        from the price rollups when they cover every date of the data, and from the data
+        otherwise (e.g., when only the last ingests of a database have rollups).
 
         Returns:
             dict: A dictionary with KPIs and deltas for the filtered data.
         """
-        max_date_avb = self.current_df["DateKey"].max()
-        tdy_df = self.current_df[self.current_df["DateKey"] == max_date_avb]
-        prev_df = self.current_df[self.current_df["DateKey"] != max_date_avb]
+        rollups = self.get_kpi_rollups()
+        rows = self.current_rows[self.cube.reliable[self.current_rows]]
+        dates = np.unique(self.cube.date_keys[rows])
+        if not rollups.empty and np.isin(dates, rollups["DateKey"].to_numpy()).all():
+            max_date_avb = rollups["DateKey"].max()
+            tdy_rol = rollups[rollups["DateKey"] == max_date_avb]
+            prev_rol = rollups[rollups["DateKey"] != max_date_avb]
+            pre_output_dict = {
+                "prev": __class__.get_rollup_metrics(prev_rol),
+                "tdy": __class__.get_rollup_metrics(tdy_rol),
+            }
+            return __class__.get_output_kpis(pre_output_dict)
+
+        reliable_df = __class__.reliable_prices(self.current_df)
+        max_date_avb = reliable_df["DateKey"].max()
+        tdy_df = reliable_df[reliable_df["DateKey"] == max_date_avb]
+        prev_df = reliable_df[reliable_df["DateKey"] != max_date_avb]
 
         prev_metrics = __class__.get_metrics(prev_df)
         tdy_metrics = __class__.get_metrics(tdy_df)
@@ -366,7 +959,8 @@ class InfoSelect:
 
     def get_top_n_cheapest_stat(self, n: int) -> pd.DataFrame:
         """
-        Gets the top N cheapest fuel stations based on price for the most recent date.
+        Gets the top N cheapest fuel stations based on price for the most recent date,
+        leaving out the unreliable prices.
 
         Args:
             n (int): The number of cheapest stations to retrieve.
@@ -374,6 +968,4 @@ class InfoSelect:
         Returns:
             pd.DataFrame: A DataFrame containing the top N cheapest stations.
         """
-        max_date_avb = self.current_df["DateKey"].max()
-        tdy_df = self.current_df[self.current_df["DateKey"] == max_date_avb]
-        return tdy_df.sort_values(by="Price", ascending=True).head(n)
+        return self.cube.cheapest(self.current_rows, n)